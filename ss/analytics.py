@@ -0,0 +1,124 @@
+"""
+Price statistics for tracked products, computed with NumPy.
+
+``update_product_stats`` reads the price history of many products at once,
+sorted by product and time, and computes every statistic for all of them
+with whole-array operations (``reduceat`` over each product's run of rows)
+instead of a Python loop per product. Results are stored in ``ProductStats``
+so pages only read them.
+"""
+import os
+from datetime import datetime
+import numpy as np
+from models import db, PriceHistory, ProductStats, TrackedProduct
+
+PLATFORMS = ('amazon', 'flipkart')
+DAY = 86400.0
+AVERAGE_WINDOWS = (30, 90)
+VOLATILITY_DAYS = 90
+
+# Products whose history is loaded and processed together
+ANALYTICS_CHUNK_PRODUCTS = int(os.environ.get('ANALYTICS_CHUNK_PRODUCTS', 1000))
+
+
+def compute_stats(product_ids, times, prices, now):
+    """Statistics for one platform's price series.
+
+    ``product_ids``, ``times`` (epoch seconds) and ``prices`` are parallel
+    arrays sorted by product, then time; missing prices are NaN. Returns the
+    ids of products with at least one price and a dict of arrays aligned with
+    them.
+    """
+    valid = ~np.isnan(prices)
+    product_ids, times, prices = product_ids[valid], times[valid], prices[valid]
+    if not len(prices):
+        return product_ids, {}
+
+    starts = np.flatnonzero(np.r_[True, product_ids[1:] != product_ids[:-1]])
+    ends = np.r_[starts[1:], len(prices)]
+    counts = ends - starts
+    current = prices[ends - 1]
+    current_each = np.repeat(current, counts)
+
+    stats = {
+        'low': np.minimum.reduceat(prices, starts),
+        'high': np.maximum.reduceat(prices, starts),
+        'percentile': np.add.reduceat((prices <= current_each).astype(np.int64), starts) / counts * 100,
+    }
+
+    for days in AVERAGE_WINDOWS:
+        recent = times >= now - days * DAY
+        total = np.add.reduceat(np.where(recent, prices, 0.0), starts)
+        count = np.add.reduceat(recent.astype(np.int64), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stats[f'avg_{days}d'] = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+    # Relative change from the previous sample of the same product
+    change = np.full(len(prices), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change[1:] = prices[1:] / prices[:-1] - 1
+    change[starts] = np.nan
+    usable = ~np.isnan(change) & np.isfinite(change) & (times >= now - VOLATILITY_DAYS * DAY)
+    change = np.where(usable, change, 0.0)
+    n = np.add.reduceat(usable.astype(np.int64), starts)
+    mean = np.add.reduceat(change, starts) / np.maximum(n, 1)
+    variance = np.add.reduceat(change * change, starts) / np.maximum(n, 1) - mean * mean
+    stats['volatility'] = np.where(n >= 2, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+    # The current price is the lowest since the last strictly lower sample
+    lower_at = np.maximum.reduceat(np.where(prices < current_each, np.arange(len(prices)), -1), starts)
+    since = np.where(lower_at >= 0, times[np.maximum(lower_at, 0)], times[starts])
+    stats['lowest_in_days'] = np.floor((times[ends - 1] - since) / DAY)
+
+    return product_ids[starts], stats
+
+
+def update_product_stats(product_ids=None):
+    """Recompute and store ``ProductStats`` for the given products, or all of them."""
+    if product_ids is None:
+        product_ids = [product_id for product_id, in db.session.query(TrackedProduct.id).order_by(TrackedProduct.id)]
+    product_ids = sorted(set(product_ids))
+    now = datetime.utcnow()
+    now_seconds = np.datetime64(now, 'us').astype(np.int64) / 1e6
+
+    for offset in range(0, len(product_ids), ANALYTICS_CHUNK_PRODUCTS):
+        chunk = product_ids[offset:offset + ANALYTICS_CHUNK_PRODUCTS]
+        rows = db.session.query(
+            PriceHistory.product_id,
+            PriceHistory.recorded_at,
+            PriceHistory.amazon_price,
+            PriceHistory.flipkart_price
+        ).filter(
+            PriceHistory.product_id.in_(chunk),
+            PriceHistory.recorded_at.isnot(None)
+        ).order_by(PriceHistory.product_id, PriceHistory.recorded_at).all()
+
+        columns = list(zip(*rows)) if rows else [(), (), (), ()]
+        ids = np.array(columns[0], dtype=np.int64)
+        times = np.array(columns[1], dtype='datetime64[us]').astype(np.int64) / 1e6
+        samples = dict(zip(*np.unique(ids, return_counts=True)))
+
+        values = {product_id: {} for product_id in chunk}
+        for index, platform in enumerate(PLATFORMS):
+            prices = np.array([np.nan if price is None else price for price in columns[2 + index]], dtype=float)
+            found, stats = compute_stats(ids, times, prices, now_seconds)
+            for name, array in stats.items():
+                for product_id, value in zip(found.tolist(), array.tolist()):
+                    if value != value:  # NaN
+                        value = None
+                    elif name == 'lowest_in_days':
+                        value = int(value)
+                    values[product_id][f'{platform}_{name}'] = value
+
+        existing = {stats.product_id: stats for stats in ProductStats.query.filter(ProductStats.product_id.in_(chunk))}
+        for product_id in chunk:
+            stats = existing.get(product_id)
+            if stats is None:
+                stats = ProductStats(product_id=product_id)
+                db.session.add(stats)
+            for platform in PLATFORMS:
+                for name in ('low', 'high', 'avg_30d', 'avg_90d', 'volatility', 'percentile', 'lowest_in_days'):
+                    setattr(stats, f'{platform}_{name}', values[product_id].get(f'{platform}_{name}'))
+            stats.samples = int(samples.get(product_id, 0))
+            stats.computed_at = now
+        db.session.commit()
@@ -1,13 +1,30 @@
 import os
 import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from email_validator import validate_email, EmailNotValidError
 from apscheduler.schedulers.background import BackgroundScheduler
-from models import db, User, TrackedProduct, PriceHistory, PriceAlert
+from models import db, User, TrackedProduct, PriceHistory, PriceAlert, Listing
 from scraper import ProductScraper, generate_mock_price_history
 from email_service import EmailService
+from refresh_engine import RefreshEngine
+from listings import ListingPlan, record_listing
+from price_events import PriceChangeEvents
+from search_cache import SearchCache
+from price_series import DATE_FORMATS, RESOLUTIONS, load_series, record_prices
+from analytics import update_product_stats
+from batch_writer import PriceWriter
+from migrations import ensure_indexes
+from dashboard_data import load_dashboard
+from cache_policy import CachePolicy, make_etag
+from live_updates import LiveUpdates
+from job_queue import make_job_queue
+from refresh_priority import RefreshScheduler
+import metrics
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
@@ -50,126 +67,552 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
+cache_policy = CachePolicy(app)
+
 scraper = ProductScraper()
 email_service = EmailService()
+refresh_engine = RefreshEngine(scraper)
+price_events = PriceChangeEvents()
+search_cache = SearchCache()
+live_updates = LiveUpdates()
+
+# Buffers refreshed prices and history rows and writes them WRITE_BATCH_SIZE at a time
+price_writer = PriceWriter()
+
+# 'inline' refreshes every product from the scheduler in this process; 'queue'
+# only enqueues per-listing jobs for worker.py processes (see job_queue.py)
+REFRESH_MODE = os.environ.get('REFRESH_MODE', 'inline').lower()
+REFRESH_INTERVAL_HOURS = float(os.environ.get('REFRESH_INTERVAL_HOURS', 6))
+JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', 8))
+job_queue = make_job_queue()
+
+# 'priority' refreshes the listings that are due every REFRESH_TICK_MINUTES,
+# each on its own interval (see refresh_priority.py); 'uniform' refreshes
+# everything every REFRESH_INTERVAL_HOURS
+REFRESH_SCHEDULE = os.environ.get('REFRESH_SCHEDULE', 'priority').lower()
+REFRESH_TICK_MINUTES = float(os.environ.get('REFRESH_TICK_MINUTES', 15))
+refresh_scheduler = RefreshScheduler(scraper)
+
+# Counters of the caches and queues above, served on /metrics
+metrics.REGISTRY.stats_gauge('scraper_response_cache', 'Scraper response cache counters', scraper.response_cache.stats)
+metrics.REGISTRY.stats_gauge('scraper_page_capture', 'Page capture counters', scraper.page_capture.stats)
+metrics.REGISTRY.gauge('scraper_rate_limit', 'Adaptive per-host request rate and its success/throttle counts', lambda: {
+    (host, stat): value
+    for host, state in scraper.rate_limiter.snapshot().items()
+    for stat, value in state.items()
+}, ('host', 'stat'))
+metrics.REGISTRY.stats_gauge('search_cache', 'Search result cache counters', search_cache.stats)
+metrics.REGISTRY.stats_gauge('email_delivery', 'Email delivery queue counters', email_service.delivery.stats)
+metrics.REGISTRY.stats_gauge('live_updates', 'Open product event streams', live_updates.stats)
+metrics.REGISTRY.gauge('price_writer_pending', 'Price updates buffered and not yet written', lambda: price_writer.pending)
+metrics.REGISTRY.stats_gauge('scrape_jobs', 'Listing refresh jobs by state', job_queue.stats)
+metrics.REGISTRY.stats_gauge('refresh_schedule', 'Listings due and picked on the last scheduler tick', refresh_scheduler.stats)
+
+# Default and maximum number of points returned by /api/price-history
+HISTORY_DEFAULT_POINTS = int(os.environ.get('HISTORY_DEFAULT_POINTS', 300))
+HISTORY_MAX_POINTS = int(os.environ.get('HISTORY_MAX_POINTS', 2000))
+
+# Number of triggered alerts read, deactivated and committed per transaction
+ALERT_BATCH_SIZE = int(os.environ.get('ALERT_BATCH_SIZE', 500))
+
+# Interactive lookups (search, track) run their platform fetches concurrently
+# and render whatever arrived within this many seconds
+LOOKUP_DEADLINE_SECONDS = float(os.environ.get('LOOKUP_DEADLINE_SECONDS', 20))
+# A lookup that depends on an earlier one gets at least this long, even when
+# the earlier one used up the deadline
+LOOKUP_MIN_SECONDS = float(os.environ.get('LOOKUP_MIN_SECONDS', 5))
+lookup_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('LOOKUP_WORKERS', 8)),
+    thread_name_prefix='lookup'
+)
 
-def check_price_alerts():
+# Manual refreshes run here instead of in the request; results stream to open
+# product pages through live_updates
+refresh_job_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('REFRESH_JOB_WORKERS', 2)),
+    thread_name_prefix='refresh-job'
+)
+queued_refreshes = set()
+queued_refreshes_lock = threading.Lock()
+
+def run_lookups(lookups, deadline=None, failures=None):
+    """Run independent scraper calls concurrently and return their results by name.
+
+    A call that fails or is still running when the deadline passes comes back
+    as None; it is left to finish in the background. Pass a dict as
+    ``failures`` to learn why: each such name maps to 'skipped' (no time
+    left), 'timeout' or 'error'.
+    """
+    deadline = LOOKUP_DEADLINE_SECONDS if deadline is None else deadline
+    failures = {} if failures is None else failures
+    if deadline <= 0:
+        failures.update(dict.fromkeys(lookups, 'skipped'))
+        return {name: None for name in lookups}
+    
+    futures = {name: lookup_executor.submit(func) for name, func in lookups.items()}
+    done, _ = wait(futures.values(), timeout=deadline)
+    
+    results = {}
+    for name, future in futures.items():
+        results[name] = None
+        if future not in done:
+            print(f"{name} lookup did not finish within {deadline:.1f}s")
+            failures[name] = 'timeout'
+        elif future.exception() is not None:
+            print(f"{name} lookup failed: {future.exception()}")
+            failures[name] = 'error'
+        else:
+            results[name] = future.result()
+    return results
+
+def check_price_alerts(product_ids=None):
+    """Trigger active alerts whose target price is met.
+
+    With ``product_ids`` only the alerts on those products are checked, which
+    is how price change events avoid rescanning the whole alerts table.
+    """
     with app.app_context():
         try:
-            active_alerts = PriceAlert.query.filter_by(is_active=True).all()
+            # Select only the alerts whose target is already met, joined to the
+            # few product and user columns the notification needs
+            amazon_met = db.and_(
+                PriceAlert.platform.in_(('amazon', 'both')),
+                TrackedProduct.amazon_price > 0,
+                TrackedProduct.amazon_price <= PriceAlert.target_price
+            )
+            flipkart_met = db.and_(
+                PriceAlert.platform.in_(('flipkart', 'both')),
+                TrackedProduct.flipkart_price > 0,
+                TrackedProduct.flipkart_price <= PriceAlert.target_price
+            )
+            query = db.session.query(
+                PriceAlert.id,
+                PriceAlert.platform,
+                PriceAlert.target_price,
+                User.email,
+                TrackedProduct.id.label('product_id'),
+                TrackedProduct.product_name,
+                TrackedProduct.product_image,
+                TrackedProduct.amazon_price,
+                TrackedProduct.amazon_url,
+                TrackedProduct.flipkart_price,
+                TrackedProduct.flipkart_url
+            ).join(
+                TrackedProduct, TrackedProduct.id == PriceAlert.product_id
+            ).join(
+                User, User.id == PriceAlert.user_id
+            ).filter(
+                PriceAlert.is_active == True,
+                db.or_(amazon_met, flipkart_met)
+            ).order_by(PriceAlert.id)
             
-            for alert in active_alerts:
-                product = TrackedProduct.query.get(alert.product_id)
-                if not product:
-                    continue
-                
-                user = User.query.get(alert.user_id)
-                if not user:
-                    continue
-                
-                current_price = None
-                product_url = None
-                
-                if alert.platform == 'amazon' and product.amazon_price:
-                    current_price = product.amazon_price
-                    product_url = product.amazon_url
-                elif alert.platform == 'flipkart' and product.flipkart_price:
-                    current_price = product.flipkart_price
-                    product_url = product.flipkart_url
-                elif alert.platform == 'both':
-                    if product.amazon_price and product.amazon_price <= alert.target_price:
-                        current_price = product.amazon_price
-                        product_url = product.amazon_url
-                    elif product.flipkart_price and product.flipkart_price <= alert.target_price:
-                        current_price = product.flipkart_price
-                        product_url = product.flipkart_url
-                
-                if current_price and current_price <= alert.target_price:
-                    email_service.send_price_drop_notification(
-                        user.email,
-                        product.product_name,
-                        current_price,
-                        alert.target_price,
-                        alert.platform if alert.platform != 'both' else ('amazon' if product_url and 'amazon' in product_url else 'flipkart'),
-                        product_url or '',
-                        product.product_image
-                    )
-                    
-                    alert.is_active = False
-                    alert.triggered_at = datetime.utcnow()
-                    db.session.commit()
-                    print(f"Alert triggered for product {product.id}, user {user.email}")
+            if product_ids is None:
+                triggered = _trigger_alerts(query)
+            else:
+                product_ids = sorted(set(product_ids))
+                triggered = 0
+                for start in range(0, len(product_ids), ALERT_BATCH_SIZE):
+                    chunk = product_ids[start:start + ALERT_BATCH_SIZE]
+                    triggered += _trigger_alerts(query.filter(PriceAlert.product_id.in_(chunk)))
+            
+            if triggered:
+                print(f"Triggered {triggered} price alerts")
                     
         except Exception as e:
+            db.session.rollback()
             print(f"Error checking price alerts: {e}")
 
-def refresh_all_product_prices():
+def _trigger_alerts(query):
+    triggered = 0
+    last_id = 0
+    while True:
+        # Walk the matches in primary key order so memory stays bounded
+        batch = query.filter(PriceAlert.id > last_id).limit(ALERT_BATCH_SIZE).all()
+        if not batch:
+            return triggered
+        last_id = batch[-1].id
+        
+        # Workers and the web app check alerts independently; only the
+        # process whose UPDATE deactivates an alert sends its email
+        claimed = _claim_alerts([row.id for row in batch])
+        db.session.commit()
+        
+        for row in batch:
+            if row.id not in claimed:
+                continue
+            # For 'both', Amazon wins when both platforms meet the target
+            if row.platform != 'flipkart' and row.amazon_price and row.amazon_price <= row.target_price:
+                platform, current_price, product_url = 'amazon', row.amazon_price, row.amazon_url
+            else:
+                platform, current_price, product_url = 'flipkart', row.flipkart_price, row.flipkart_url
+            
+            email_service.send_price_drop_notification(
+                row.email,
+                row.product_name,
+                current_price,
+                row.target_price,
+                platform,
+                product_url or '',
+                row.product_image
+            )
+        triggered += len(claimed)
+
+def _claim_alerts(alert_ids):
+    """Deactivate the alerts among ``alert_ids`` that are still active; returns the ids this call changed."""
+    claim = db.update(PriceAlert).where(
+        PriceAlert.is_active == True
+    ).values(
+        is_active=False, triggered_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False)
+    
+    if db.engine.dialect.update_returning:
+        rows = db.session.execute(claim.where(PriceAlert.id.in_(alert_ids)).returning(PriceAlert.id))
+        return {alert_id for alert_id, in rows}
+    
+    # No UPDATE ... RETURNING (MySQL): claim one by one and check the row count
+    return {alert_id for alert_id in alert_ids
+            if db.session.execute(claim.where(PriceAlert.id == alert_id)).rowcount == 1}
+
+# Check a product's alerts as soon as its price changes
+price_events.subscribe(check_price_alerts)
+
+def push_live_prices(product_ids):
+    """Send the current prices and latest history point to pages watching these products."""
+    product_ids = live_updates.watched(product_ids)
+    if not product_ids:
+        return
+    with app.app_context():
+        products = db.session.query(
+            TrackedProduct.id,
+            TrackedProduct.amazon_price,
+            TrackedProduct.flipkart_price,
+            TrackedProduct.updated_at
+        ).filter(TrackedProduct.id.in_(product_ids)).all()
+        for product in products:
+            latest = db.session.query(
+                PriceHistory.recorded_at,
+                PriceHistory.amazon_price,
+                PriceHistory.flipkart_price
+            ).filter(
+                PriceHistory.product_id == product.id
+            ).order_by(PriceHistory.recorded_at.desc()).first()
+            live_updates.publish(product.id, 'price', {
+                'amazon_price': product.amazon_price,
+                'flipkart_price': product.flipkart_price,
+                'updated_at': product.updated_at.strftime('%b %d, %Y at %I:%M %p') if product.updated_at else None,
+                'point': {
+                    'recorded_at': latest.recorded_at.isoformat(),
+                    'date': latest.recorded_at.strftime(DATE_FORMATS['raw']),
+                    'amazon_price': latest.amazon_price,
+                    'flipkart_price': latest.flipkart_price
+                } if latest else None
+            })
+
+# Price changes from the scheduled refresh reach open product pages too
+price_events.subscribe(push_live_prices)
+
+def refresh_all_product_prices(listing_keys=None):
+    """Scrape every listing, or only ``listing_keys``, and write the new prices."""
     with app.app_context():
         try:
-            products = TrackedProduct.query.all()
+            started = time.perf_counter()
+            rows = db.session.query(
+                TrackedProduct.id,
+                TrackedProduct.amazon_url,
+                TrackedProduct.flipkart_url,
+                TrackedProduct.amazon_price,
+                TrackedProduct.flipkart_price
+            ).all()
             
-            for product in products:
-                updated = False
-                
-                if product.amazon_url:
-                    try:
-                        amazon_result = scraper.scrape_amazon(product.amazon_url)
-                        if amazon_result.get('success'):
-                            product.amazon_price = amazon_result['price']
-                            product.amazon_original_price = amazon_result.get('original_price')
-                            updated = True
-                    except Exception as e:
-                        print(f"Error scraping Amazon for product {product.id}: {e}")
-                
-                if product.flipkart_url:
-                    try:
-                        flipkart_result = scraper.scrape_flipkart(product.flipkart_url)
-                        if flipkart_result.get('success'):
-                            product.flipkart_price = flipkart_result['price']
-                            product.flipkart_original_price = flipkart_result.get('original_price')
-                            updated = True
-                    except Exception as e:
-                        print(f"Error scraping Flipkart for product {product.id}: {e}")
+            # Products tracking the same page share one listing, scraped once per cycle
+            plan = ListingPlan(scraper, listing_keys)
+            prices = {}
+            for product_id, amazon_url, flipkart_url, amazon_price, flipkart_price in rows:
+                plan.add_product(product_id, amazon_url, flipkart_url)
+                prices[product_id] = {'amazon': amazon_price, 'flipkart': flipkart_price}
+            known_listings = {listing.listing_key: listing for listing in Listing.query.all()}
+            
+            updated_ids = set()
+            changed_ids = set()
+            write_seconds = [0.0]
+            metrics.REFRESH_PHASE_SECONDS.observe(time.perf_counter() - started, phase='plan')
+            
+            def flush():
+                flush_started = time.perf_counter()
+                price_writer.flush()
+                write_seconds[0] += time.perf_counter() - flush_started
+                price_events.publish(changed_ids)
+                changed_ids.clear()
+            
+            def apply_result(key, results):
+                listing = plan.listings[key]
+                platform = listing['platform']
+                result = results[platform]
+                known_listings[key] = record_listing(key, platform, listing['url'], result, known_listings.get(key))
                 
-                if updated:
-                    product.updated_at = datetime.utcnow()
+                for product_id in plan.product_ids(key):
+                    current = prices[product_id]
+                    if result.get('success'):
+                        if result['price'] != current[platform]:
+                            changed_ids.add(product_id)
+                        current[platform] = result['price']
+                        price_writer.update_product(product_id, **{
+                            f'{platform}_price': result['price'],
+                            f'{platform}_original_price': result.get('original_price'),
+                            'updated_at': datetime.utcnow()
+                        })
+                        updated_ids.add(product_id)
                     
-                    history = PriceHistory(
-                        product_id=product.id,
-                        amazon_price=product.amazon_price,
-                        flipkart_price=product.flipkart_price
-                    )
-                    db.session.add(history)
-                    db.session.commit()
-                    print(f"Updated prices for product {product.id}")
+                    # Write history once every listing of the product is in
+                    if plan.complete(key, product_id) and product_id in updated_ids:
+                        price_writer.add_history(product_id, current['amazon'], current['flipkart'])
+                        print(f"Updated prices for product {product_id}")
+                
+                if price_writer.full:
+                    flush()
             
-            check_price_alerts()
+            summary = refresh_engine.run(plan.jobs(), apply_result)
+            flush()
+            print(f"Refreshed {plan.product_count} products from {summary['jobs']} listings "
+                  f"({summary['failed']} failed) in {summary['elapsed']:.1f}s")
+            # Flushes run on this thread while scraping continues, so split them out
+            metrics.REFRESH_PHASE_SECONDS.observe(max(summary['elapsed'] - write_seconds[0], 0), phase='scrape')
+            metrics.REFRESH_PHASE_SECONDS.observe(write_seconds[0], phase='write')
+            
+            stats_started = time.perf_counter()
+            update_product_stats(None if listing_keys is None else sorted(updated_ids))
+            metrics.REFRESH_PHASE_SECONDS.observe(time.perf_counter() - stats_started, phase='stats')
+            metrics.REFRESH_PHASE_SECONDS.observe(time.perf_counter() - started, phase='total')
             
         except Exception as e:
+            db.session.rollback()
             print(f"Error refreshing product prices: {e}")
 
+def enqueue_refresh_jobs(listing_keys=None):
+    """Queue one refresh job per listing (or per ``listing_keys``) for the scrape workers (REFRESH_MODE=queue)."""
+    with app.app_context():
+        try:
+            rows = db.session.query(
+                TrackedProduct.id,
+                TrackedProduct.amazon_url,
+                TrackedProduct.flipkart_url
+            ).all()
+            plan = ListingPlan(scraper, listing_keys)
+            for product_id, amazon_url, flipkart_url in rows:
+                plan.add_product(product_id, amazon_url, flipkart_url)
+            
+            queued = job_queue.enqueue([{
+                'listing_key': key,
+                'platform': listing['platform'],
+                'url': listing['url'],
+                'product_ids': listing['product_ids']
+            } for key, listing in plan.listings.items()])
+            job_queue.purge()
+            print(f"Queued {queued} of {len(plan.listings)} listings for refresh")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error queueing refresh jobs: {e}")
+
+def process_refresh_jobs(worker, limit=None):
+    """Lease a batch of listing jobs, scrape them and write the results.
+
+    Runs in worker.py. Returns the number of jobs leased, 0 when the queue
+    had nothing ready.
+    """
+    with app.app_context():
+        try:
+            jobs = job_queue.lease(worker, limit or JOB_BATCH_SIZE)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error leasing refresh jobs: {e}")
+            return 0
+        if not jobs:
+            return 0
+        
+        jobs_by_id = {job.id: job for job in jobs}
+        # This batch's own buffer: when its write fails the jobs are retried,
+        # so the prices must not also be left behind for another flush
+        writer = PriceWriter()
+        errors = {}
+        updated_ids = set()
+        changed_ids = set()
+        try:
+            product_ids = sorted({product_id for job in jobs for product_id in job.product_ids})
+            prices = {
+                product_id: {'amazon': amazon_price, 'flipkart': flipkart_price}
+                for product_id, amazon_price, flipkart_price in db.session.query(
+                    TrackedProduct.id,
+                    TrackedProduct.amazon_price,
+                    TrackedProduct.flipkart_price
+                ).filter(TrackedProduct.id.in_(product_ids))
+            }
+            known_listings = {listing.listing_key: listing for listing in Listing.query.filter(
+                Listing.listing_key.in_([job.listing_key for job in jobs])
+            )}
+            
+            def apply_result(job_id, results):
+                job = jobs_by_id[job_id]
+                result = results[job.platform]
+                known_listings[job.listing_key] = record_listing(
+                    job.listing_key, job.platform, job.url, result, known_listings.get(job.listing_key)
+                )
+                if not result.get('success'):
+                    errors[job_id] = result.get('error') or 'Could not extract a price'
+                    return
+                
+                for product_id in job.product_ids:
+                    current = prices.get(product_id)
+                    if current is None:
+                        continue  # deleted since the job was queued
+                    if result['price'] != current[job.platform]:
+                        changed_ids.add(product_id)
+                    current[job.platform] = result['price']
+                    writer.update_product(product_id, **{
+                        f'{job.platform}_price': result['price'],
+                        f'{job.platform}_original_price': result.get('original_price'),
+                        'updated_at': datetime.utcnow()
+                    })
+                    updated_ids.add(product_id)
+            
+            summary = refresh_engine.run([(job.id, {job.platform: job.url}) for job in jobs], apply_result)
+            writer.flush()
+            db.session.commit()
+            print(f"Worker {worker} refreshed {len(jobs)} listings ({summary['failed']} failed) "
+                  f"in {summary['elapsed']:.1f}s")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error processing refresh jobs: {e}")
+            errors = {job.id: str(e) for job in jobs}
+            updated_ids.clear()
+            changed_ids.clear()
+        
+        settled_ids = set()
+        for job in jobs:
+            try:
+                if job.id in errors:
+                    outcome = job_queue.fail(job, errors[job.id])
+                    if outcome == 'dead':
+                        print(f"Giving up on {job.url} after {job.attempts} attempts: {errors[job.id]}")
+                else:
+                    outcome = 'done' if job_queue.complete(job) else None
+                if outcome in ('done', 'dead'):
+                    settled_ids.update(job.product_ids)
+                metrics.SCRAPE_JOBS.inc(outcome=outcome or 'lease_lost')
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error finishing refresh job {job.id}: {e}")
+        
+        if settled_ids:
+            try:
+                record_settled_history(sorted(settled_ids))
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error writing price history: {e}")
+        price_events.publish(changed_ids)
+        if updated_ids:
+            try:
+                update_product_stats(sorted(updated_ids))
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error updating product stats: {e}")
+        return len(jobs)
+
+def record_settled_history(product_ids):
+    """Write a history row for each product whose listing jobs have all finished.
+
+    A product's listings can be leased in different batches, even by different
+    workers, so its row waits until none of them is queued or leased and then
+    holds both platform prices. Products with no price update since their last
+    row are skipped, so the batch that finishes last writes it once.
+    """
+    rows = db.session.query(
+        TrackedProduct.id,
+        TrackedProduct.amazon_url,
+        TrackedProduct.flipkart_url,
+        TrackedProduct.amazon_price,
+        TrackedProduct.flipkart_price,
+        TrackedProduct.updated_at
+    ).filter(TrackedProduct.id.in_(product_ids)).all()
+    listing_keys = {row.id: {scraper.listing_key(url) for url in (row.amazon_url, row.flipkart_url) if url}
+                    for row in rows}
+    unfinished = job_queue.unfinished(set().union(*listing_keys.values()))
+    last_recorded = dict(db.session.query(
+        PriceHistory.product_id,
+        db.func.max(PriceHistory.recorded_at)
+    ).filter(PriceHistory.product_id.in_(product_ids)).group_by(PriceHistory.product_id))
+    
+    writer = PriceWriter()
+    for row in rows:
+        if listing_keys[row.id] & unfinished:
+            continue
+        recorded_at = last_recorded.get(row.id)
+        if recorded_at is not None and row.updated_at is not None and recorded_at >= row.updated_at:
+            continue
+        writer.add_history(row.id, row.amazon_price, row.flipkart_price)
+    writer.flush()
+    db.session.commit()
+
+def refresh_due_listings():
+    """Refresh the listings the priority scheduler picks, inline or through the job queue."""
+    with app.app_context():
+        try:
+            listing_keys = refresh_scheduler.due()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error picking listings to refresh: {e}")
+            return
+        stats = refresh_scheduler.stats()
+        print(f"{stats['due']} listings due for refresh, refreshing {stats['picked']}")
+    if not listing_keys:
+        return
+    if REFRESH_MODE == 'queue':
+        enqueue_refresh_jobs(listing_keys)
+    else:
+        refresh_all_product_prices(listing_keys)
+
 scheduler = BackgroundScheduler()
-scheduler.add_job(func=refresh_all_product_prices, trigger="interval", hours=6)
+if REFRESH_SCHEDULE == 'uniform':
+    scheduler.add_job(
+        func=enqueue_refresh_jobs if REFRESH_MODE == 'queue' else refresh_all_product_prices,
+        trigger="interval",
+        hours=REFRESH_INTERVAL_HOURS
+    )
+else:
+    # max_instances=1: a tick that is still scraping makes the next one skip
+    scheduler.add_job(func=refresh_due_listings, trigger="interval", minutes=REFRESH_TICK_MINUTES, max_instances=1)
 
 # Ensure the scheduler is only started once, even when Flask's debug reloader
 # spawns a second process. Without this guard, the job can be registered and
-# executed multiple times in parallel, causing inconsistent behaviour.
-if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+# executed multiple times in parallel, causing inconsistent behaviour. In queue
+# mode a second scheduler only re-queues listings that already have a job.
+# worker.py sets RUN_SCHEDULER=false; so can extra web nodes.
+run_scheduler = os.environ.get('RUN_SCHEDULER', 'true').lower() == 'true'
+if run_scheduler and (not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
     scheduler.start()
     # Don't block on shutdown; this avoids hangs when the process exits.
     atexit.register(lambda: scheduler.shutdown(wait=False))
 
+# Give queued emails a few seconds to go out before the process exits
+atexit.register(email_service.close)
+
+def flush_price_writes():
+    # Write out prices buffered by a refresh that was interrupted by shutdown
+    with app.app_context():
+        try:
+            written = price_writer.flush()
+            if written:
+                print(f"Flushed {written} buffered price writes on shutdown")
+        except Exception as e:
+            print(f"Error flushing buffered price writes: {e}")
+
+atexit.register(flush_price_writes)
+# Keep the per-site selector hit rates for the next start
+atexit.register(scraper.selector_stats.save)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-@app.after_request
-def add_cache_control(response):
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
-
 @app.route('/')
 def index():
     if current_user.is_authenticated:
@@ -256,8 +699,13 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    products = TrackedProduct.query.filter_by(user_id=current_user.id).order_by(TrackedProduct.created_at.desc()).all()
-    return render_template('dashboard.html', products=products)
+    cursor = request.args.get('cursor')
+    try:
+        page = load_dashboard(current_user.id, cursor)
+    except ValueError:
+        return redirect(url_for('dashboard'))
+    return render_template('dashboard.html', products=page['products'], summary=page['summary'],
+                           next_cursor=page['next_cursor'], paged=bool(cursor))
 
 @app.route('/track-product', methods=['GET', 'POST'])
 @login_required
@@ -274,12 +722,30 @@ def track_product():
             flash('Please enter a valid Amazon or Flipkart product URL.', 'danger')
             return render_template('track_product.html')
         
+        started = time.monotonic()
         result, platform = scraper.scrape_product(url)
         
         if not result or not result.get('success'):
             flash('Could not fetch product details. Please check the URL and try again.', 'danger')
             return render_template('track_product.html')
         
+        # The cross-platform search needs the scraped name, so it gets whatever
+        # is left of the lookup deadline, but never less than LOOKUP_MIN_SECONDS
+        other_platform = 'flipkart' if platform == 'amazon' else 'amazon'
+        find_other = scraper.search_flipkart_for_product if platform == 'amazon' else scraper.search_amazon_for_product
+        failures = {}
+        other_result = run_lookups(
+            {other_platform: lambda: find_other(result['name'])},
+            max(LOOKUP_DEADLINE_SECONDS - (time.monotonic() - started), LOOKUP_MIN_SECONDS),
+            failures
+        )[other_platform]
+        if failures.get(other_platform) == 'timeout':
+            flash(f'{other_platform.capitalize()} did not respond in time, so this product is '
+                  f'tracked on {platform.capitalize()} only.', 'warning')
+        elif other_platform in failures:
+            flash(f'Searching {other_platform.capitalize()} failed, so this product is '
+                  f'tracked on {platform.capitalize()} only.', 'warning')
+        
         product = TrackedProduct(
             user_id=current_user.id,
             product_name=result['name'],
@@ -291,36 +757,36 @@ def track_product():
             product.amazon_price = result['price']
             product.amazon_original_price = result.get('original_price')
             
-            flipkart_result = scraper.search_flipkart_for_product(result['name'])
-            if flipkart_result and flipkart_result.get('success'):
-                product.flipkart_url = flipkart_result['url']
-                product.flipkart_price = flipkart_result['price']
-                product.flipkart_original_price = flipkart_result.get('original_price')
-                if not product.product_image and flipkart_result.get('image'):
-                    product.product_image = flipkart_result['image']
+            if other_result and other_result.get('success'):
+                product.flipkart_url = other_result['url']
+                product.flipkart_price = other_result['price']
+                product.flipkart_original_price = other_result.get('original_price')
+                if not product.product_image and other_result.get('image'):
+                    product.product_image = other_result['image']
         else:
             product.flipkart_url = url
             product.flipkart_price = result['price']
             product.flipkart_original_price = result.get('original_price')
             
-            amazon_result = scraper.search_amazon_for_product(result['name'])
-            if amazon_result and amazon_result.get('success'):
-                product.amazon_url = amazon_result['url']
-                product.amazon_price = amazon_result['price']
-                product.amazon_original_price = amazon_result.get('original_price')
-                if not product.product_image and amazon_result.get('image'):
-                    product.product_image = amazon_result['image']
+            if other_result and other_result.get('success'):
+                product.amazon_url = other_result['url']
+                product.amazon_price = other_result['price']
+                product.amazon_original_price = other_result.get('original_price')
+                if not product.product_image and other_result.get('image'):
+                    product.product_image = other_result['image']
         
         db.session.add(product)
-        db.session.commit()
         
-        initial_history = PriceHistory(
-            product_id=product.id,
-            amazon_price=product.amazon_price,
-            flipkart_price=product.flipkart_price
-        )
-        db.session.add(initial_history)
+        # Register the shared listing rows for the pages this product now tracks
+        record_listing(scraper.listing_key(url), platform, url, result)
+        if other_result and other_result.get('success'):
+            record_listing(scraper.listing_key(other_result['url']), other_platform, other_result['url'], other_result)
+        
+        # Product, listings and initial history go out in one transaction
+        db.session.flush()
+        record_prices([(product.id, product.amazon_price, product.flipkart_price)])
         db.session.commit()
+        update_product_stats([product.id])
         
         flash('Product added successfully!', 'success')
         return redirect(url_for('product_detail', product_id=product.id))
@@ -339,11 +805,23 @@ def search_products():
         if not query:
             flash('Please enter a product name.', 'danger')
         else:
-            # Fetch more results from both platforms for a richer comparison view
-            amazon_results = scraper.search_amazon_products(query, max_results=20)
-            flipkart_results = scraper.search_flipkart_products(query, max_results=20)
+            # Fetch more results from both platforms for a richer comparison view,
+            # querying them at the same time; repeated queries come from the cache
+            failures = {}
+            results = run_lookups({
+                'amazon': lambda: search_cache.get('amazon', query, 20, scraper.search_amazon_products),
+                'flipkart': lambda: search_cache.get('flipkart', query, 20, scraper.search_flipkart_products),
+            }, failures=failures)
+            amazon_results = results['amazon'] or []
+            flipkart_results = results['flipkart'] or []
             
-            if not amazon_results and not flipkart_results:
+            timed_out = [name.capitalize() for name, reason in failures.items() if reason == 'timeout']
+            failed = [name.capitalize() for name, reason in failures.items() if reason != 'timeout']
+            if timed_out:
+                flash(f"{' and '.join(timed_out)} did not respond in time; showing partial results.", 'warning')
+            if failed:
+                flash(f"Searching {' and '.join(failed)} failed; showing partial results.", 'warning')
+            if not failures and not amazon_results and not flipkart_results:
                 flash('No products found. Try a different product name.', 'warning')
     
     return render_template(
@@ -363,24 +841,57 @@ def product_detail(product_id):
 @app.route('/api/price-history/<int:product_id>')
 @login_required
 def get_price_history(product_id):
+    """Chart points for a product.
+
+    Query parameters: ``resolution`` (auto, raw, hour or day), ``from`` and
+    ``to`` (ISO dates or datetimes; a bare ``to`` date includes that day) and
+    ``points`` (how many points the chart can show).
+    """
     product = TrackedProduct.query.filter_by(id=product_id, user_id=current_user.id).first_or_404()
     
-    history = PriceHistory.query.filter_by(product_id=product_id).order_by(PriceHistory.recorded_at).all()
+    resolution = request.args.get('resolution', 'auto')
+    if resolution not in RESOLUTIONS:
+        return jsonify({'error': f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+    try:
+        start = parse_history_bound(request.args.get('from'))
+        end = parse_history_bound(request.args.get('to'), inclusive_day=True)
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates, e.g. 2024-01-31'}), 400
+    points = min(max(request.args.get('points', HISTORY_DEFAULT_POINTS, type=int), 10), HISTORY_MAX_POINTS)
     
-    if len(history) < 10:
-        mock_history = generate_mock_price_history(
-            product_id, 
-            product.amazon_price, 
-            product.flipkart_price,
-            days=90
-        )
-        return jsonify(mock_history)
+    # The series only changes when a sample is recorded (or, for the mock
+    # series and open-ended ranges, when the day changes)
+    latest = db.session.query(db.func.max(PriceHistory.recorded_at)).filter(
+        PriceHistory.product_id == product_id
+    ).scalar()
+    etag = make_etag(product_id, latest, product.amazon_price, product.flipkart_price,
+                     datetime.utcnow().date(), resolution, start, end, points)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        # Products with little real history get an illustrative series instead
+        if db.session.query(PriceHistory.id).filter_by(product_id=product_id).limit(10).count() < 10:
+            series = generate_mock_price_history(
+                product_id, 
+                product.amazon_price, 
+                product.flipkart_price,
+                days=90
+            )
+        else:
+            series = load_series(product_id, resolution, start, end, points)
+        response = jsonify(series)
     
-    return jsonify([{
-        'date': h.recorded_at.strftime('%Y-%m-%d'),
-        'amazon_price': h.amazon_price,
-        'flipkart_price': h.flipkart_price
-    } for h in history])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def parse_history_bound(value, inclusive_day=False):
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if inclusive_day and len(value) == 10:
+        moment += timedelta(days=1)
+    return moment
 
 @app.route('/set-alert', methods=['POST'])
 @login_required
@@ -428,6 +939,9 @@ def set_alert():
         product.product_image
     )
     
+    # The target may already be met by the current price
+    price_events.publish([product_id])
+    
     return redirect(url_for('product_detail', product_id=product_id))
 
 @app.route('/delete-alert/<int:alert_id>', methods=['POST'])
@@ -457,50 +971,106 @@ def delete_product(product_id):
     
     return redirect(url_for('dashboard'))
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format; set METRICS_TOKEN to require ``Authorization: Bearer <token>``."""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4',
+                    headers={'Cache-Control': 'no-store'})
+
 @app.route('/refresh-prices/<int:product_id>', methods=['POST'])
 @login_required
 def refresh_prices(product_id):
+    """Queue a scrape of the product; results arrive on its event stream."""
     product = TrackedProduct.query.filter_by(id=product_id, user_id=current_user.id).first()
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
-    updated = False
-    
-    if product.amazon_url:
-        amazon_result = scraper.scrape_amazon(product.amazon_url)
-        if amazon_result.get('success'):
-            product.amazon_price = amazon_result['price']
-            product.amazon_original_price = amazon_result.get('original_price')
-            updated = True
-    
-    if product.flipkart_url:
-        flipkart_result = scraper.scrape_flipkart(product.flipkart_url)
-        if flipkart_result.get('success'):
-            product.flipkart_price = flipkart_result['price']
-            product.flipkart_original_price = flipkart_result.get('original_price')
-            updated = True
-    
-    if updated:
-        product.updated_at = datetime.utcnow()
-        
-        history = PriceHistory(
-            product_id=product.id,
-            amazon_price=product.amazon_price,
-            flipkart_price=product.flipkart_price
-        )
-        db.session.add(history)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'amazon_price': product.amazon_price,
-            'flipkart_price': product.flipkart_price
-        })
+    with queued_refreshes_lock:
+        already_queued = product_id in queued_refreshes
+        queued_refreshes.add(product_id)
+    if not already_queued:
+        live_updates.publish(product_id, 'refresh', {'status': 'queued'})
+        refresh_job_executor.submit(run_refresh_job, product_id)
     
-    return jsonify({'error': 'Could not refresh prices'}), 500
+    return jsonify({'queued': True, 'already_queued': already_queued}), 202
+
+def run_refresh_job(product_id):
+    with app.app_context():
+        try:
+            live_updates.publish(product_id, 'refresh', {'status': 'running'})
+            product = db.session.get(TrackedProduct, product_id)
+            if not product:
+                return
+            
+            updated = False
+            previous_prices = (product.amazon_price, product.flipkart_price)
+            
+            # Scrape in this thread, without the interactive lookup deadline or
+            # pool: nobody is waiting on the response, and a slow site must not
+            # crowd out search and track lookups
+            results = {}
+            for platform, url, scrape in (('amazon', product.amazon_url, scraper.scrape_amazon),
+                                          ('flipkart', product.flipkart_url, scraper.scrape_flipkart)):
+                if not url:
+                    continue
+                try:
+                    results[platform] = scrape(url)
+                except Exception as e:
+                    print(f"{platform} refresh of product {product_id} failed: {e}")
+            
+            amazon_result = results.get('amazon')
+            if amazon_result and amazon_result.get('success'):
+                product.amazon_price = amazon_result['price']
+                product.amazon_original_price = amazon_result.get('original_price')
+                updated = True
+            
+            flipkart_result = results.get('flipkart')
+            if flipkart_result and flipkart_result.get('success'):
+                product.flipkart_price = flipkart_result['price']
+                product.flipkart_original_price = flipkart_result.get('original_price')
+                updated = True
+            
+            if not updated:
+                live_updates.publish(product_id, 'refresh', {'status': 'failed', 'error': 'Could not refresh prices'})
+                return
+            
+            product.updated_at = datetime.utcnow()
+            record_prices([(product.id, product.amazon_price, product.flipkart_price)])
+            db.session.commit()
+            update_product_stats([product.id])
+            
+            push_live_prices([product_id])
+            live_updates.publish(product_id, 'refresh', {'status': 'done'})
+            if (product.amazon_price, product.flipkart_price) != previous_prices:
+                price_events.publish([product_id])
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error refreshing product {product_id}: {e}")
+            live_updates.publish(product_id, 'refresh', {'status': 'failed', 'error': 'Could not refresh prices'})
+        finally:
+            with queued_refreshes_lock:
+                queued_refreshes.discard(product_id)
+
+@app.route('/api/products/<int:product_id>/events')
+@login_required
+def product_events(product_id):
+    """Server-sent events: ``refresh`` job status and ``price`` updates for one product."""
+    TrackedProduct.query.filter_by(id=product_id, user_id=current_user.id).first_or_404()
+    db.session.remove()  # don't hold a connection for the life of the stream
+    return Response(live_updates.stream(product_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 with app.app_context():
     db.create_all()
+    # create_all skips tables that already exist, so add newer indexes explicitly.
+    # Set AUTO_CREATE_INDEXES=false to build them by hand (see migrations.py).
+    if os.environ.get('AUTO_CREATE_INDEXES', 'true').lower() == 'true':
+        ensure_indexes(db.engine)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,101 @@
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import DBAPIError, OperationalError
+from models import db, TrackedProduct
+from price_series import record_prices
+
+
+class PriceWriter:
+    """Buffers product price updates and history samples and writes them in bulk.
+
+    ``flush`` sends all buffered updates as executemany UPDATEs by primary key
+    and all samples through ``record_prices`` (multi-row INSERTs), then
+    commits once. Items for products deleted since they were buffered are
+    skipped. If the write fails with a transient database error (lost
+    connection, lock timeout) the buffers are restored and the next flush
+    retries, up to ``max_retries`` times in a row; any other failure, or one
+    that keeps recurring, drops the items so later flushes are not blocked.
+    Callers check ``full`` to flush every ``batch_size`` items, and flush once
+    more when they are done or the process exits.
+    """
+
+    def __init__(self, batch_size=None, max_retries=None):
+        self.batch_size = batch_size or int(os.environ.get('WRITE_BATCH_SIZE', 500))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('WRITE_MAX_RETRIES', 3))
+        self._updates = {}
+        self._history = []
+        self._lock = threading.Lock()
+        self._failures = 0
+        self.dropped = 0
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._updates) + len(self._history)
+
+    @property
+    def full(self):
+        return self.pending >= self.batch_size
+
+    def update_product(self, product_id, **values):
+        """Buffer column changes for one product; later values win."""
+        with self._lock:
+            self._updates.setdefault(product_id, {}).update(values)
+
+    def add_history(self, product_id, amazon_price, flipkart_price, recorded_at=None):
+        with self._lock:
+            self._history.append((product_id, amazon_price, flipkart_price, recorded_at or datetime.utcnow()))
+
+    def flush(self):
+        """Write and commit everything buffered; returns the number of items written."""
+        with self._lock:
+            updates, self._updates = self._updates, {}
+            history, self._history = self._history, []
+        if not updates and not history:
+            return 0
+
+        # Products deleted since their items were buffered would make the
+        # UPDATE by primary key fail, and their history would be orphaned
+        product_ids = sorted(set(updates) | {item[0] for item in history})
+        existing = set()
+        for start in range(0, len(product_ids), self.batch_size):
+            existing.update(product_id for product_id, in db.session.query(TrackedProduct.id).filter(
+                TrackedProduct.id.in_(product_ids[start:start + self.batch_size])
+            ))
+        if len(existing) < len(product_ids):
+            updates = {product_id: values for product_id, values in updates.items() if product_id in existing}
+            history = [item for item in history if item[0] in existing]
+            print(f"Skipping buffered prices of {len(product_ids) - len(existing)} deleted products")
+        if not updates and not history:
+            return 0
+
+        try:
+            # executemany needs the same columns in every row, so group by column set
+            groups = {}
+            for product_id, values in updates.items():
+                groups.setdefault(tuple(sorted(values)), []).append({'id': product_id, **values})
+            for rows in groups.values():
+                db.session.execute(update(TrackedProduct), rows)
+            record_prices(history)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            transient = isinstance(e, OperationalError) or (
+                isinstance(e, DBAPIError) and e.connection_invalidated)
+            with self._lock:
+                self._failures += 1
+                if transient and self._failures <= self.max_retries:
+                    for product_id, values in updates.items():
+                        self._updates[product_id] = {**values, **self._updates.get(product_id, {})}
+                    self._history[:0] = history
+                else:
+                    self.dropped += len(updates) + len(history)
+                    print(f"Dropping {len(updates)} price updates and {len(history)} history samples "
+                          f"after a failed write: {e}")
+            raise
+        with self._lock:
+            self._failures = 0
+        return len(updates) + len(history)
+
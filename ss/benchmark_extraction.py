@@ -0,0 +1,212 @@
+"""
+Benchmark the single-pass Amazon extraction engine against the old
+multi-sweep find_all approach, using saved product pages.
+
+Usage:
+    python benchmark_extraction.py [page.html|page.html.gz|directory ...] [--runs N]
+
+Defaults to the checked-in debug_amazon.html. Directories such as
+SCRAPER_CAPTURE_DIR are expanded to their Amazon pages. Both implementations must
+produce the same result for every page, otherwise the script exits non-zero.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+from bs4 import BeautifulSoup
+from extraction import SelectorStats
+from page_capture import iter_pages
+from scraper import ProductScraper
+
+
+def legacy_parse_amazon(scraper, soup):
+    """The pre-engine Amazon extraction: one full find_all sweep per selector."""
+    result = {'name': None, 'price': None, 'original_price': None, 'image': None}
+
+    title_selectors = [
+        ('span', {'id': 'productTitle'}),
+        ('h1', {'id': 'title'}),
+        ('span', {'class': 'product-title-word-break'}),
+        ('h1', {'class': 'a-size-large'}),
+        ('span', {'class': 'a-size-large product-title-word-break'}),
+        ('div', {'id': 'titleSection'}),
+        ('div', {'id': 'title_feature_div'}),
+    ]
+    for tag, attrs in title_selectors:
+        if result['name']:
+            break
+        for elem in soup.find_all(tag, attrs):
+            name = elem.get_text().strip()
+            if name and len(name) > 5 and len(name) < 500:
+                result['name'] = name
+                break
+    if not result['name']:
+        for h1 in soup.find_all('h1'):
+            text = h1.get_text().strip()
+            if text and len(text) > 10 and len(text) < 300:
+                result['name'] = text
+                break
+    if not result['name']:
+        meta_title = soup.find('meta', {'name': 'title'})
+        if meta_title and meta_title.get('content'):
+            result['name'] = meta_title['content'].strip()
+        else:
+            og_title = soup.find('meta', {'property': 'og:title'})
+            if og_title and og_title.get('content'):
+                result['name'] = og_title['content'].strip()
+
+    for div in soup.find_all('div', {'id': re.compile(r'price', re.I)}):
+        if result['price']:
+            break
+        for span in div.find_all('span', class_=re.compile(r'a-price-whole|a-offscreen')):
+            extracted = scraper.extract_price(span.get_text())
+            if extracted and extracted > 0:
+                result['price'] = extracted
+                break
+    if not result['price']:
+        price_selectors = [
+            ('span', {'class': 'a-price-whole'}),
+            ('span', {'id': 'priceblock_ourprice'}),
+            ('span', {'id': 'priceblock_dealprice'}),
+            ('span', {'id': 'priceblock_saleprice'}),
+            ('span', {'class': 'a-offscreen'}),
+            ('span', {'class': 'a-price aok-align-center reinventPricePriceToPayMargin priceToPay'}),
+            ('span', {'id': 'tp_price_block_total_price_ww'}),
+            ('td', {'class': 'a-span12 a-color-price a-size-base'}),
+        ]
+        for tag, attrs in price_selectors:
+            if result['price']:
+                break
+            for elem in soup.find_all(tag, attrs):
+                extracted = scraper.extract_price(elem.get_text())
+                if extracted and extracted > 0:
+                    result['price'] = extracted
+                    break
+    if not result['price']:
+        for span in soup.find_all('span', class_=re.compile(r'a-price')):
+            whole = span.find('span', class_='a-price-whole')
+            if whole:
+                extracted = scraper.extract_price(whole.get_text())
+                if extracted and extracted > 0:
+                    result['price'] = extracted
+                    break
+    if not result['price']:
+        for span in soup.find_all('span'):
+            text = span.get_text()
+            if '₹' in text or 'Rs' in text:
+                extracted = scraper.extract_price(text)
+                if extracted and extracted > 10:
+                    result['price'] = extracted
+                    break
+
+    for elem in soup.find_all('span', {'class': re.compile(r'a-text-price')}):
+        orig_span = elem.find('span', {'class': 'a-offscreen'})
+        if orig_span:
+            extracted = scraper.extract_price(orig_span.get_text())
+            if extracted and extracted > 0:
+                result['original_price'] = extracted
+                break
+
+    img_selectors = [
+        ('img', {'id': 'landingImage'}),
+        ('img', {'id': 'imgBlkFront'}),
+        ('img', {'id': 'ebooksImgBlkFront'}),
+        ('img', {'class': re.compile(r'a-dynamic-image')}),
+        ('div', {'id': 'imgTagWrapperId'}),
+        ('div', {'id': 'main-image-container'}),
+    ]
+    for tag, attrs in img_selectors:
+        if result['image']:
+            break
+        elem = soup.find(tag, attrs)
+        if not elem:
+            continue
+        if elem.name == 'img':
+            if elem.get('data-old-hires'):
+                result['image'] = elem['data-old-hires']
+            elif elem.get('data-a-dynamic-image'):
+                try:
+                    img_data = json.loads(elem.get('data-a-dynamic-image'))
+                    if img_data:
+                        result['image'] = list(img_data.keys())[0]
+                except ValueError:
+                    pass
+            elif elem.get('src'):
+                src = elem['src']
+                if 'images-amazon' in src or 'ssl-images-amazon' in src:
+                    result['image'] = src
+        elif elem.name == 'div':
+            img = elem.find('img')
+            if img:
+                if img.get('data-old-hires'):
+                    result['image'] = img['data-old-hires']
+                elif img.get('src'):
+                    result['image'] = img['src']
+    if not result['image']:
+        og_image = soup.find('meta', {'property': 'og:image'})
+        if og_image and og_image.get('content'):
+            result['image'] = og_image['content']
+
+    result['success'] = bool(result['name'] and result['price'])
+    return result
+
+
+def engine_parse_amazon(scraper, soup):
+    result = {'name': None, 'price': None, 'original_price': None, 'image': None, 'success': False}
+    return scraper.parse_amazon(soup, result)
+
+
+def time_runs(func, runs):
+    timings = []
+    value = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            value = func()
+        timings.append(time.perf_counter() - started)
+    return value, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', default=['debug_amazon.html'])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    scraper = ProductScraper()
+    mismatches = 0
+
+    for path, html in iter_pages(args.pages):
+        if 'flipkart' in os.path.basename(path).lower():
+            continue
+        soup = BeautifulSoup(html, 'html.parser')
+        # Fresh in-memory selector stats per page, so the engine tries selectors
+        # in the same order as the legacy code and nothing is written to disk
+        scraper.selector_stats = SelectorStats('')
+
+        legacy, legacy_times = time_runs(lambda: legacy_parse_amazon(scraper, soup), args.runs)
+        engine, engine_times = time_runs(lambda: engine_parse_amazon(scraper, soup), args.runs)
+
+        legacy_ms = statistics.median(legacy_times) * 1000
+        engine_ms = statistics.median(engine_times) * 1000
+        print(f"{path} ({len(html) / 1024:.0f} KB)")
+        print(f"  multi-sweep find_all : {legacy_ms:8.1f} ms")
+        print(f"  single-pass engine   : {engine_ms:8.1f} ms  ({legacy_ms / engine_ms:.1f}x)")
+
+        if legacy != engine:
+            mismatches += 1
+            print(f"  MISMATCH\n    legacy: {legacy}\n    engine: {engine}")
+        else:
+            print(f"  results match: {engine['name'][:40] if engine['name'] else None!r}, price={engine['price']}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Check that every installed HTML parser backend extracts the same product
+details from saved pages, and compare how long each takes to parse them.
+
+Usage:
+    python benchmark_parsers.py [page.html|page.html.gz|directory ...] [--runs N]
+
+Defaults to the checked-in debug_amazon.html. Directories such as
+SCRAPER_CAPTURE_DIR are expanded to the pages inside. Pages whose file name
+contains "flipkart" are run through parse_flipkart, everything else through
+parse_amazon. Results are compared against html.parser, and captured pages
+also against the result recorded when they were captured; the script exits
+non-zero on any difference.
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+from extraction import SelectorStats
+from html_parsers import DEFAULT_BACKEND, available_backends, make_soup
+from page_capture import iter_pages, read_capture_meta
+from scraper import ProductScraper
+
+
+def extract(scraper, platform, soup):
+    result = {'name': None, 'price': None, 'original_price': None, 'image': None, 'success': False}
+    with contextlib.redirect_stdout(io.StringIO()):
+        if platform == 'flipkart':
+            return scraper.parse_flipkart(soup, result)
+        return scraper.parse_amazon(soup, result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', default=['debug_amazon.html'])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    scraper = ProductScraper(selector_stats=SelectorStats(''))
+    backends = available_backends()
+    print(f"Backends: {', '.join(backends)}")
+    mismatches = 0
+
+    for path, html in iter_pages(args.pages):
+        platform = 'flipkart' if 'flipkart' in os.path.basename(path).lower() else 'amazon'
+        expected = extract(scraper, platform, make_soup(html, DEFAULT_BACKEND))
+        print(f"{path} ({platform}, {len(html) / 1024:.0f} KB)")
+
+        # Captured pages record what extraction returned when they were scraped
+        meta = read_capture_meta(path)
+        if meta is not None:
+            recorded = meta['result']
+            if (recorded.get('name'), recorded.get('price')) != (expected['name'], expected['price']):
+                mismatches += 1
+                print(f"  CHANGED since capture: name={recorded.get('name')!r} price={recorded.get('price')} "
+                      f"-> name={expected['name']!r} price={expected['price']}")
+
+        for backend in backends:
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                soup = make_soup(html, backend)
+                timings.append(time.perf_counter() - started)
+            result = extract(scraper, platform, soup)
+
+            status = 'ok'
+            if result != expected:
+                mismatches += 1
+                status = 'MISMATCH'
+            print(f"  {backend:12} parse {statistics.median(timings) * 1000:8.1f} ms  {status}")
+            if status != 'ok':
+                for key in expected:
+                    if result.get(key) != expected[key]:
+                        print(f"    {key}: {expected[key]!r} != {result.get(key)!r}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Seed a database with a large synthetic dataset and time the queries each
+route runs, reporting p50/p99 latency per route.
+
+Usage:
+    python benchmark_queries.py [--database-url URL] [--users N]
+        [--products-per-user N] [--days N] [--samples-per-day N]
+        [--runs N] [--without-indexes]
+
+Defaults to a fresh SQLite file in the temp directory and about 1.2 million
+price history rows (1000 users x 20 products x 60 days). An existing database
+at --database-url is reused as is when it already holds products, so the
+slow seeding step only runs once. --without-indexes drops the secondary
+indexes declared on the models first, to compare against an unindexed schema;
+run migrations.py afterwards to restore them.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import and_, insert, inspect, or_
+
+from dashboard_data import load_dashboard
+from migrations import ensure_indexes
+from models import db, User, TrackedProduct, PriceHistory, PriceAlert
+from price_series import load_series
+from scraper import generate_mock_history_rows
+
+INSERT_CHUNK = 50000
+
+
+def seed(users, products_per_user, days, samples_per_day):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    db.session.execute(insert(User), [
+        {'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+         'password_hash': 'x', 'created_at': now}
+        for user_id in range(1, users + 1)
+    ])
+
+    products, alerts = [], []
+    for user_id in range(1, users + 1):
+        for n in range(products_per_user):
+            product_id = len(products) + 1
+            amazon = round(rng.uniform(500, 50000), 2)
+            flipkart = round(amazon * rng.uniform(0.9, 1.1), 2)
+            products.append({
+                'id': product_id, 'user_id': user_id, 'product_name': f'Product {product_id}',
+                'amazon_url': f'https://www.amazon.in/dp/B{product_id:09d}', 'amazon_price': amazon,
+                'flipkart_url': f'https://www.flipkart.com/p/itm{product_id:012d}', 'flipkart_price': flipkart,
+                'created_at': now - timedelta(minutes=rng.randrange(days * 1440)), 'updated_at': now,
+            })
+            for platform in rng.sample(('amazon', 'flipkart', 'both'), 2):
+                alerts.append({
+                    'user_id': user_id, 'product_id': product_id, 'platform': platform,
+                    'target_price': round(amazon * rng.uniform(0.7, 0.95), 2),
+                    'is_active': rng.random() < 0.8, 'created_at': now,
+                })
+    for offset in range(0, len(products), INSERT_CHUNK):
+        db.session.execute(insert(TrackedProduct), products[offset:offset + INSERT_CHUNK])
+    for offset in range(0, len(alerts), INSERT_CHUNK):
+        db.session.execute(insert(PriceAlert), alerts[offset:offset + INSERT_CHUNK])
+    db.session.commit()
+
+    history = 0
+    batch = []
+    for product in products:
+        batch.append((product['id'], product['amazon_price'], product['flipkart_price']))
+        if len(batch) * days * samples_per_day >= INSERT_CHUNK:
+            history += _insert_history(batch, days, now, samples_per_day)
+            batch = []
+    if batch:
+        history += _insert_history(batch, days, now, samples_per_day)
+
+    print(f"Seeded {users} users, {len(products)} products, {len(alerts)} alerts and "
+          f"{history} history rows in {time.perf_counter() - started:.1f}s")
+
+
+def _insert_history(batch, days, now, samples_per_day):
+    rows = generate_mock_history_rows(batch, days, end=now, samples_per_day=samples_per_day)
+    db.session.execute(insert(PriceHistory), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def drop_indexes():
+    existing = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        names = {index['name'] for index in existing.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in names:
+                index.drop(db.engine)
+                print(f"Dropped index {index.name}")
+
+
+# The queries each route runs, mirroring app.py
+
+def dashboard(user_id, product_id):
+    load_dashboard(user_id)
+
+
+def product_detail(user_id, product_id):
+    TrackedProduct.query.filter_by(id=product_id, user_id=user_id).first()
+    PriceAlert.query.filter_by(product_id=product_id, user_id=user_id, is_active=True).all()
+
+
+def price_history(user_id, product_id):
+    TrackedProduct.query.filter_by(id=product_id, user_id=user_id).first()
+    db.session.query(PriceHistory.id).filter_by(product_id=product_id).limit(10).count()
+    load_series(product_id, 'raw', datetime.utcnow() - timedelta(days=30), None, 300)
+
+
+def set_alert(user_id, product_id):
+    TrackedProduct.query.filter_by(id=product_id, user_id=user_id).first()
+    PriceAlert.query.filter_by(product_id=product_id, user_id=user_id, platform='both', is_active=True).first()
+
+
+def alert_check(user_id, product_id):
+    # check_price_alerts after a price change of one product
+    amazon_met = and_(
+        PriceAlert.platform.in_(('amazon', 'both')),
+        TrackedProduct.amazon_price.isnot(None),
+        TrackedProduct.amazon_price <= PriceAlert.target_price
+    )
+    flipkart_met = and_(
+        PriceAlert.platform.in_(('flipkart', 'both')),
+        TrackedProduct.flipkart_price.isnot(None),
+        TrackedProduct.flipkart_price <= PriceAlert.target_price
+    )
+    db.session.query(PriceAlert.id, PriceAlert.target_price, User.email).join(
+        TrackedProduct, PriceAlert.product_id == TrackedProduct.id
+    ).join(User, PriceAlert.user_id == User.id).filter(
+        PriceAlert.product_id.in_([product_id]),
+        PriceAlert.is_active.is_(True),
+        or_(amazon_met, flipkart_met)
+    ).order_by(PriceAlert.id).limit(500).all()
+
+
+ROUTES = [
+    ('dashboard', dashboard),
+    ('product_detail', product_detail),
+    ('price_history', price_history),
+    ('set_alert', set_alert),
+    ('alert_check', alert_check),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--products-per-user', type=int, default=20)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--samples-per-day', type=int, default=1)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--without-indexes', action='store_true')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'benchmark_queries.db')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        if args.without_indexes:
+            drop_indexes()
+        else:
+            ensure_indexes(db.engine)
+
+        if TrackedProduct.query.first() is None:
+            seed(args.users, args.products_per_user, args.days, args.samples_per_day)
+        else:
+            print(f"Reusing the data in {database_url}")
+
+        products = db.session.query(TrackedProduct.id, TrackedProduct.user_id).all()
+        if not products:
+            print("No products to query")
+            return 1
+        rng = random.Random(7)
+
+        print(f"\n{'route':<16}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, run in ROUTES:
+            timings = []
+            for _ in range(args.runs):
+                product_id, user_id = rng.choice(products)
+                started = time.perf_counter()
+                run(user_id, product_id)
+                timings.append((time.perf_counter() - started) * 1000)
+                db.session.rollback()
+            percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+            print(f"{name:<16}{percentiles[49]:>10.2f}{percentiles[98]:>10.2f}{max(timings):>10.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+HTTP caching rules for every response.
+
+- Static files: ``url_for('static', ...)`` adds ``?v=<content hash>``, and
+  requests carrying the current hash are served with a year-long
+  ``immutable`` max-age. Editing a file changes its URL, so browsers never
+  see stale assets. Requests without the hash revalidate on every use.
+- Views that set their own ``Cache-Control`` (e.g. the price history API,
+  which answers ``If-None-Match`` with 304) keep it.
+- HTML for logged-in users is ``no-store``: it holds personal data and must
+  not survive logout in the browser cache. Everything else is revalidated
+  (``no-cache``), which still lets conditional requests skip the body.
+"""
+import hashlib
+import os
+import threading
+from flask import request
+from flask_login import current_user
+
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600))
+
+
+class CachePolicy:
+    def __init__(self, app=None):
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        app.url_defaults(self._add_static_version)
+        app.after_request(self.apply)
+
+    def fingerprint(self, filename):
+        """Short hash of a static file's contents, cached until its mtime changes."""
+        path = os.path.join(self.static_folder, filename)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._fingerprints.get(filename)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.md5(f.read()).hexdigest()[:12]
+        with self._lock:
+            self._fingerprints[filename] = (mtime, digest)
+        return digest
+
+    def _add_static_version(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = self.fingerprint(values['filename'])
+            if version:
+                values['v'] = version
+
+    def apply(self, response):
+        if request.endpoint == 'static':
+            version = request.args.get('v')
+            if version and version == self.fingerprint(request.view_args.get('filename', '')):
+                response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+            else:
+                response.headers['Cache-Control'] = 'public, no-cache'
+            return response
+
+        if 'Cache-Control' in response.headers:
+            return response
+
+        if response.mimetype == 'text/html' and current_user.is_authenticated:
+            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+            response.headers['Pragma'] = 'no-cache'
+            response.headers['Expires'] = '0'
+        else:
+            response.headers['Cache-Control'] = 'private, no-cache' if current_user.is_authenticated else 'no-cache'
+        return response
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
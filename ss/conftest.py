@@ -0,0 +1,34 @@
+import pytest
+from flask import Flask
+from models import db, User, TrackedProduct
+
+
+@pytest.fixture
+def app():
+    """An app on a fresh in-memory database, with its context pushed."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='tester', email='tester@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def make_product(user):
+    """Adds a product for the test user; keyword arguments go to ``TrackedProduct``."""
+    def make_product(name='product', **fields):
+        product = TrackedProduct(user_id=user.id, product_name=name, **fields)
+        db.session.add(product)
+        db.session.commit()
+        return product
+    return make_product
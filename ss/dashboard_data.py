@@ -0,0 +1,122 @@
+"""
+Read model for the dashboard.
+
+The dashboard shows one page of a user's products, newest first. Pages are
+addressed by a keyset cursor, ``<created_at>~<id>`` of the last product on the
+previous page, so every page is one range read of the (user_id, created_at)
+index no matter how deep it is. Only the columns dashboard.html renders are
+selected, and the per-product extras (active alert count, last price change)
+and the summary counts each come from a single aggregated query, so rendering
+never touches a lazy relationship.
+"""
+import os
+from datetime import datetime
+from sqlalchemy import and_, case, func, or_
+from models import db, TrackedProduct, PriceHistory, PriceAlert, ProductStats
+
+DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 24))
+
+
+def encode_cursor(created_at, product_id):
+    return f"{created_at.isoformat()}~{product_id}"
+
+
+def decode_cursor(cursor):
+    """``(created_at, id)`` from a cursor; raises ValueError when it is malformed."""
+    created_at, product_id = cursor.rsplit('~', 1)
+    return datetime.fromisoformat(created_at), int(product_id)
+
+
+def load_dashboard(user_id, cursor=None, page_size=None):
+    """One page of the user's products plus the summary counts.
+
+    Returns a dict with ``products`` (dicts with the rendered columns,
+    ``active_alerts``, ``last_change_at`` and ``lowest_in_days``), ``summary``
+    (``total``, ``amazon`` and ``flipkart`` product counts) and
+    ``next_cursor`` (None on the last page).
+    """
+    page_size = page_size or DASHBOARD_PAGE_SIZE
+    created_at = TrackedProduct.created_at
+    query = db.session.query(
+        TrackedProduct.id,
+        TrackedProduct.product_name,
+        TrackedProduct.product_image,
+        TrackedProduct.amazon_price,
+        TrackedProduct.flipkart_price,
+        TrackedProduct.created_at,
+        TrackedProduct.updated_at,
+        ProductStats.amazon_lowest_in_days,
+        ProductStats.flipkart_lowest_in_days
+    ).outerjoin(
+        ProductStats, ProductStats.product_id == TrackedProduct.id
+    ).filter(TrackedProduct.user_id == user_id)
+
+    if cursor:
+        after_created, after_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            created_at < after_created,
+            and_(created_at == after_created, TrackedProduct.id < after_id)
+        ))
+    rows = query.order_by(created_at.desc(), TrackedProduct.id.desc()).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    product_ids = [row.id for row in rows]
+    alert_counts = active_alert_counts(product_ids)
+    changes = last_price_changes(product_ids)
+
+    products = []
+    for row in rows:
+        product = dict(row._mapping)
+        product['lowest_in_days'] = max(product.pop('amazon_lowest_in_days') or 0,
+                                        product.pop('flipkart_lowest_in_days') or 0)
+        product['active_alerts'] = alert_counts.get(row.id, 0)
+        product['last_change_at'] = changes.get(row.id)
+        products.append(product)
+
+    return {'products': products, 'summary': product_summary(user_id), 'next_cursor': next_cursor}
+
+
+def product_summary(user_id):
+    """How many products the user tracks in total and on each platform."""
+    has_url = lambda column: func.sum(case((and_(column.isnot(None), column != ''), 1), else_=0))
+    total, amazon, flipkart = db.session.query(
+        func.count(TrackedProduct.id),
+        has_url(TrackedProduct.amazon_url),
+        has_url(TrackedProduct.flipkart_url)
+    ).filter(TrackedProduct.user_id == user_id).one()
+    return {'total': total, 'amazon': amazon or 0, 'flipkart': flipkart or 0}
+
+
+def active_alert_counts(product_ids):
+    if not product_ids:
+        return {}
+    rows = db.session.query(PriceAlert.product_id, func.count(PriceAlert.id)).filter(
+        PriceAlert.product_id.in_(product_ids),
+        PriceAlert.is_active.is_(True)
+    ).group_by(PriceAlert.product_id)
+    return dict(rows.all())
+
+
+def last_price_changes(product_ids):
+    """When each product's price last changed.
+
+    That is the latest history sample whose prices differ from the product's
+    current ones; the change happened within one refresh interval after it.
+    Products whose price never changed are left out.
+    """
+    if not product_ids:
+        return {}
+    differs = lambda history, current: func.coalesce(history, -1) != func.coalesce(current, -1)
+    rows = db.session.query(PriceHistory.product_id, func.max(PriceHistory.recorded_at)).join(
+        TrackedProduct, TrackedProduct.id == PriceHistory.product_id
+    ).filter(
+        PriceHistory.product_id.in_(product_ids),
+        or_(differs(PriceHistory.amazon_price, TrackedProduct.amazon_price),
+            differs(PriceHistory.flipkart_price, TrackedProduct.flipkart_price))
+    ).group_by(PriceHistory.product_id)
+    return dict(rows.all())
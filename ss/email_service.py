@@ -3,6 +3,7 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
+from mail_queue import EmailDeliveryQueue
 
 class EmailService:
     def __init__(self):
@@ -17,6 +18,13 @@ class EmailService:
         self.smtp_username = os.environ.get('SMTP_USERNAME', 'your-email@gmail.com')  # Replace with your email
         self.smtp_password = os.environ.get('SMTP_PASSWORD', 'your-app-password')  # Replace with your app password
         self.from_email = os.environ.get('FROM_EMAIL', self.smtp_username)
+        
+        # Set SMTP_USE_TLS=false for local stub servers such as aiosmtpd
+        self.use_tls = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
+        self.smtp_timeout = float(os.environ.get('SMTP_TIMEOUT', 30))
+        
+        # Messages are delivered by background workers over reused connections
+        self.delivery = EmailDeliveryQueue(self._connect)
     
     def is_configured(self):
         return bool(self.smtp_username and self.smtp_password)
@@ -153,7 +161,24 @@ class EmailService:
         
         return self._send_email(to_email, subject, html_content)
     
+    def _connect(self):
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.smtp_timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            server.ehlo()
+            if server.has_extn('auth'):
+                server.login(self.smtp_username, self.smtp_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+    
+    def close(self, timeout=None):
+        self.delivery.close(timeout)
+    
     def _send_email(self, to_email, subject, html_content):
+        """Queue a message for background delivery; True once it is queued."""
         try:
             msg = MIMEMultipart('alternative')
             msg['Subject'] = subject
@@ -163,14 +188,8 @@ class EmailService:
             html_part = MIMEText(html_content, 'html')
             msg.attach(html_part)
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.sendmail(self.from_email, to_email, msg.as_string())
-            
-            print(f"Email sent successfully to {to_email}")
-            return True
+            return self.delivery.enqueue(self.from_email, to_email, msg.as_string())
             
         except Exception as e:
-            print(f"Failed to send email: {e}")
+            print(f"Failed to queue email: {e}")
             return False
@@ -0,0 +1,255 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+def _compile_check(name, expected):
+    """Build a predicate over an element's attribute dict for one attrs entry."""
+    if expected is True:
+        return lambda attrs: name in attrs
+
+    if isinstance(expected, str):
+        joined_only = ' ' in expected
+
+        def check(attrs):
+            value = attrs.get(name)
+            if value is None:
+                return False
+            if isinstance(value, list):
+                if joined_only:
+                    return ' '.join(value) == expected
+                return expected in value
+            return value == expected
+        return check
+
+    search = expected.search
+
+    def check(attrs):
+        value = attrs.get(name)
+        if value is None:
+            return False
+        if isinstance(value, list):
+            for item in value:
+                if search(item):
+                    return True
+            return len(value) > 1 and search(' '.join(value)) is not None
+        return search(value) is not None
+    return check
+
+
+class Selector:
+    """A ``(tag, attrs)`` pair as passed to BeautifulSoup's ``find_all``.
+
+    Attribute values follow BeautifulSoup's rules: a string must equal the
+    value (or one of the classes, or the whole class string), a compiled regex
+    must match it, and ``True`` only requires the attribute to be present.
+    """
+
+    def __init__(self, tag, attrs=None, within=None, first_only=False):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.within = within
+        self.first_only = first_only
+        self._checks = [_compile_check(name, expected) for name, expected in self.attrs.items()]
+
+    def __repr__(self):
+        return f"{self.tag} {self.attrs}"
+
+    def matches(self, elem):
+        attrs = elem.attrs
+        for check in self._checks:
+            if not check(attrs):
+                return False
+        return True
+
+
+class ExtractionPlan:
+    """A set of selectors that are all evaluated in a single document traversal.
+
+    Register selectors with ``add`` once at import time, then call ``collect``
+    per page. Priority between selectors is left to the caller, which walks the
+    collected candidates in the same order it used to run ``find_all`` calls.
+    """
+
+    def __init__(self):
+        self._selectors = []
+        self._by_tag = defaultdict(list)
+
+    def add(self, tag, attrs=None, within=None, first_only=False):
+        """Register a selector and return it as the lookup key for ``collect`` results.
+
+        ``within`` restricts matches to descendants of elements matched by
+        another selector of this plan, like calling ``find_all`` on each of
+        them. ``first_only`` keeps only the first match, like ``find``.
+        """
+        if within is not None and (within not in self._selectors or within.within is not None):
+            raise ValueError(f"{within!r} must be a top-level selector of this plan")
+        selector = Selector(tag, attrs, within, first_only)
+        self._selectors.append(selector)
+        self._by_tag[tag].append(selector)
+        return selector
+
+    def collect(self, soup):
+        """Walk ``soup`` once and return the matches of every selector."""
+        found = Candidates(self._selectors)
+        by_tag = self._by_tag
+
+        for elem in soup.descendants:
+            selectors = by_tag.get(elem.name)
+            if not selectors:
+                continue
+            for selector in selectors:
+                if selector.within is None:
+                    if selector.first_only and found._matches[selector]:
+                        continue
+                    if selector.matches(elem):
+                        found._matches[selector].append(elem)
+                elif selector.matches(elem):
+                    found._add_nested(selector, elem)
+
+        return found
+
+
+class Candidates:
+    """Matches collected by ``ExtractionPlan.collect``, in document order."""
+
+    def __init__(self, selectors):
+        self._matches = {selector: [] for selector in selectors if selector.within is None}
+        self._nested = {selector: {} for selector in selectors if selector.within is not None}
+
+    def __getitem__(self, selector):
+        """Elements matched by a top-level selector."""
+        return self._matches[selector]
+
+    def first(self, selector):
+        matches = self._matches[selector]
+        return matches[0] if matches else None
+
+    def within(self, selector):
+        """``(ancestor, elements)`` pairs for a nested selector, in ancestor order.
+
+        Ancestors without a matching descendant are skipped.
+        """
+        groups = self._nested[selector]
+        return [(ancestor, groups[id(ancestor)]) for ancestor in self._matches[selector.within]
+                if id(ancestor) in groups]
+
+    def _add_nested(self, selector, elem):
+        groups = self._nested[selector]
+        outer = selector.within
+        parent = elem.parent
+        while parent is not None:
+            if parent.name == outer.tag and outer.matches(parent):
+                group = groups.setdefault(id(parent), [])
+                if not (selector.first_only and group):
+                    group.append(elem)
+            parent = parent.parent
+
+
+class SelectorStats:
+    """Per-site record of which alternative selectors find a field.
+
+    The selectors of a priority list are not equivalent: later ones match
+    more loosely. So ``ordered`` keeps the default priority and only moves a
+    selector behind the others once it keeps missing on a site (decayed
+    misses of at least ``demote_after`` and more than its hits). A site whose
+    markup dropped the preferred selectors then costs one lookup again, while
+    one odd page changes nothing. A hit clears a selector's misses, and every
+    ``probe_every``th page of a site uses the default order, so a demoted
+    selector that matches again gets its place back.
+
+    Parsers pass the order they walked and the winning selector (or None) to
+    ``record``; every selector tried before the winner counts as a miss.
+    Scores are kept in memory, and in the JSON file ``path``
+    (SCRAPER_SELECTOR_STATS_FILE, unset by default) if one is given, saved at
+    most every ``save_interval`` seconds and by ``save()``.
+    """
+
+    def __init__(self, path=None, decay=None, demote_after=None, probe_every=None, save_interval=None):
+        self.path = path if path is not None else os.environ.get('SCRAPER_SELECTOR_STATS_FILE', '')
+        self.decay = decay or float(os.environ.get('SCRAPER_SELECTOR_DECAY', 0.95))
+        self.demote_after = demote_after or float(os.environ.get('SCRAPER_SELECTOR_DEMOTE_AFTER', 3))
+        self.probe_every = probe_every or int(os.environ.get('SCRAPER_SELECTOR_PROBE_EVERY', 20))
+        self.save_interval = save_interval if save_interval is not None else float(
+            os.environ.get('SCRAPER_SELECTOR_SAVE_INTERVAL', 60))
+        # {domain: {field: {repr(selector): [hits, misses]}}}, both decayed
+        self._scores = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._load()
+
+    def _demoted(self, score):
+        hits, misses = score
+        return misses >= self.demote_after and misses > hits
+
+    def ordered(self, domain, field, selectors):
+        with self._lock:
+            scores = self._scores.get(domain, {}).get(field)
+            if not scores:
+                return selectors
+            key = (domain, field)
+            self._pages[key] = self._pages.get(key, 0) + 1
+            if self._pages[key] % self.probe_every == 0:
+                return selectors
+            # Stable sort: demoted selectors go last, everything else keeps its priority
+            return sorted(selectors, key=lambda selector: self._demoted(scores.get(repr(selector), (0.0, 0.0))))
+
+    def record(self, domain, field, tried, winner=None):
+        """Count a hit for ``winner`` and a miss for each selector of ``tried`` before it (all of them when None)."""
+        with self._lock:
+            scores = self._scores.setdefault(domain, {}).setdefault(field, {})
+            for score in scores.values():
+                score[0] *= self.decay
+                score[1] *= self.decay
+            for selector in tried:
+                score = scores.setdefault(repr(selector), [0.0, 0.0])
+                if selector is winner:
+                    score[0] += 1.0
+                    score[1] = 0.0
+                    break
+                score[1] += 1.0
+            self._dirty = True
+            due = self.path and time.monotonic() - self._saved_at >= self.save_interval
+        if due:
+            self.save()
+
+    def demoted(self):
+        """``{domain: {field: [selector, ...]}}`` of the selectors currently tried last."""
+        with self._lock:
+            return {domain: {field: [key for key, score in scores.items() if self._demoted(score)]
+                             for field, scores in fields.items()}
+                    for domain, fields in self._scores.items()}
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            # Skip entries not in the [hits, misses] form
+            self._scores = {domain: {field: {key: score for key, score in scores.items()
+                                             if isinstance(score, list) and len(score) == 2}
+                                     for field, scores in fields.items()}
+                            for domain, fields in data.items()}
+        except (OSError, ValueError) as e:
+            print(f"Could not load selector stats from {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._scores, indent=2, sort_keys=True)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            print(f"Could not save selector stats to {self.path}: {e}")
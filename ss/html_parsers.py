@@ -0,0 +1,99 @@
+"""
+HTML parser backends for the scraper.
+
+Every backend produces a regular BeautifulSoup tree, so the extraction code
+in scraper.py runs unchanged on all of them; only the tokenizer differs.
+Select one with the SCRAPER_HTML_PARSER environment variable:
+
+    auto         lxml if installed, otherwise html.parser (default)
+    lxml         libxml2 via lxml
+    html.parser  Python's pure-Python parser
+    html5lib     spec-compliant but slowest
+    selectolax   the lexbor engine via selectolax
+"""
+import os
+from bs4 import BeautifulSoup, Comment
+from bs4.builder import HTMLTreeBuilder, builder_registry
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax is optional
+    LexborHTMLParser = None
+
+PARSER_BACKENDS = ('lxml', 'html.parser', 'html5lib', 'selectolax')
+DEFAULT_BACKEND = 'html.parser'
+
+
+class SelectolaxTreeBuilder(HTMLTreeBuilder):
+    """BeautifulSoup tree builder that tokenizes with lexbor instead of Python."""
+
+    NAME = 'selectolax'
+    ALTERNATE_NAMES = ['lexbor']
+    features = [NAME] + ALTERNATE_NAMES + ['html', 'fast']
+    is_xml = False
+    picklable = True
+
+    def prepare_markup(self, markup, user_specified_encoding=None,
+                       document_declared_encoding=None, exclude_encodings=None):
+        if isinstance(markup, bytes):
+            markup = markup.decode(user_specified_encoding or 'utf-8', errors='replace')
+        yield markup, None, None, False
+
+    def feed(self, markup):
+        soup = self.soup
+        root = LexborHTMLParser(markup).root
+        if root is None:
+            return
+
+        # Replay lexbor's tree as start/data/end events, iteratively so deeply
+        # nested pages cannot hit the recursion limit.
+        stack = [(root, False)]
+        while stack:
+            node, closing = stack.pop()
+            if closing:
+                soup.endData()
+                soup.handle_endtag(node.tag)
+            elif node.is_text_node:
+                soup.handle_data(node.text_content)
+            elif node.is_comment_node:
+                soup.endData()
+                soup.handle_data(node.comment_content or '')
+                soup.endData(Comment)
+            elif node.is_element_node:
+                attrs = {name: value if value is not None else '' for name, value in node.attributes.items()}
+                soup.handle_starttag(node.tag, None, None, attrs)
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(list(node.iter(include_text=True))))
+
+    def test_fragment_to_document(self, fragment):
+        return fragment
+
+
+def is_available(backend):
+    if backend == 'selectolax':
+        return LexborHTMLParser is not None
+    return builder_registry.lookup(backend) is not None
+
+
+def available_backends():
+    return [backend for backend in PARSER_BACKENDS if is_available(backend)]
+
+
+def resolve_backend(backend=None):
+    """Return the backend to use, falling back to html.parser if it is not installed."""
+    backend = (backend or os.environ.get('SCRAPER_HTML_PARSER', 'auto')).lower()
+    if backend == 'auto':
+        return 'lxml' if is_available('lxml') else DEFAULT_BACKEND
+    if backend not in PARSER_BACKENDS:
+        print(f"Unknown HTML parser backend '{backend}', using {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    if not is_available(backend):
+        print(f"HTML parser backend '{backend}' is not installed, using {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    return backend
+
+
+def make_soup(markup, backend=DEFAULT_BACKEND):
+    if backend == 'selectolax':
+        return BeautifulSoup(markup, builder=SelectolaxTreeBuilder)
+    return BeautifulSoup(markup, backend)
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from and never change the page
+TRACKING_PARAMS = ('utm_', 'ref', 'ref_', 'tag', 'pf_rd_', 'pd_rd_', 'qid', 'sr', 'sprefix', 'crid', 'spla',
+                   'otracker', 'otracker1', 'fm', 'iid', 'ppt', 'ppn', 'ssid', 'srno')
+
+
+def cache_key(url):
+    """Normalize a URL so that equivalent product links share one cache entry."""
+    parsed = urlparse(url)
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not any(name == p or (p.endswith('_') and name.startswith(p)) for p in TRACKING_PARAMS)
+    )
+    return urlunparse((
+        (parsed.scheme or 'https').lower(),
+        parsed.netloc.lower(),
+        parsed.path.rstrip('/') or '/',
+        '',
+        urlencode(query),
+        '',
+    ))
+
+
+class CachedResponse:
+    def __init__(self, url, text, etag=None, last_modified=None, ttl=0):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = len(text.encode('utf-8'))
+        self.refresh(ttl)
+
+    def refresh(self, ttl):
+        self.expires_at = time.monotonic() + ttl
+
+    def is_fresh(self):
+        return time.monotonic() < self.expires_at
+
+    def has_validators(self):
+        return bool(self.etag or self.last_modified)
+
+
+class ResponseCache:
+    """Bounded in-memory cache of fetched pages, with TTL and LRU eviction.
+
+    Fresh entries are served without touching the network. Expired entries
+    are kept (until evicted) so they can be revalidated with If-None-Match /
+    If-Modified-Since; a 304 then costs a round trip but no page download.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, max_bytes=None):
+        self.ttl = ttl if ttl is not None else float(os.environ.get('SCRAPER_CACHE_TTL', 300))
+        self.max_entries = max_entries or int(os.environ.get('SCRAPER_CACHE_MAX_ENTRIES', 512))
+        self.max_bytes = max_bytes or int(os.environ.get('SCRAPER_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.bytes_saved = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def lookup(self, url):
+        """Return ``(entry, fresh)`` for ``url``; ``entry`` is None on a miss.
+
+        A fresh entry counts as a hit. A stale entry is returned only if it can
+        be revalidated, and counts as a miss until the server answers 304.
+        """
+        if not self.enabled:
+            return None, False
+        key = cache_key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.is_fresh():
+                    self.hits += 1
+                    self.bytes_saved += entry.size
+                    return entry, True
+                if not entry.has_validators():
+                    self._remove(key)
+                    entry = None
+            self.misses += 1
+            return entry, False
+
+    def store(self, url, text, etag=None, last_modified=None):
+        if not self.enabled:
+            return
+        entry = CachedResponse(url, text, etag, last_modified, self.ttl)
+        if entry.size > self.max_bytes:
+            return
+        key = cache_key(url)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def revalidated(self, entry):
+        """Record a 304 for ``entry`` and extend its lifetime."""
+        with self._lock:
+            entry.refresh(self.ttl)
+            self.revalidations += 1
+            self.bytes_saved += entry.size
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'hit_rate': (self.hits + self.revalidations) / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
@@ -0,0 +1,374 @@
+"""
+Queue of per-listing refresh jobs, shared by the web app and scrape workers.
+
+With REFRESH_MODE=queue the scheduler only plans a refresh cycle: it enqueues
+one job per listing (``enqueue_refresh_jobs`` in app.py) and any number of
+``python worker.py`` processes, on any host that reaches the same database or
+Redis, lease jobs in batches, scrape them and write the results.
+
+A leased job belongs to its worker for JOB_LEASE_SECONDS. If the worker dies,
+the lease runs out and another worker picks the job up. A failed job is
+retried after JOB_RETRY_BACKOFF * 2^(attempt - 1) seconds; after
+JOB_MAX_ATTEMPTS attempts it is dead-lettered (status 'dead') and left for
+inspection. ``worker.py --requeue-dead`` puts those jobs back in the queue.
+Enqueueing skips listings that already have an unfinished job, so several
+schedulers (or a reloaded dev server) cannot pile up duplicate work. In the
+database this is a unique index on ``ScrapeJob.unfinished_key``, so even
+concurrent enqueues cannot both insert a job for the same listing.
+
+Jobs live in the app database (``ScrapeJob``, SQLite/PostgreSQL/MySQL), or in
+Redis (or anything speaking its protocol) when JOB_QUEUE_URL is set.
+"""
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import db, ScrapeJob
+
+try:
+    import redis
+except ImportError:  # redis is optional
+    redis = None
+
+
+class Job:
+    """A leased job; hand it back to ``complete`` or ``fail``."""
+
+    def __init__(self, id, listing_key, platform, url, product_ids, attempts, token):
+        self.id = id
+        self.listing_key = listing_key
+        self.platform = platform
+        self.url = url
+        self.product_ids = product_ids
+        self.attempts = attempts
+        self.token = token
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.listing_key} attempt {self.attempts}>"
+
+
+class _QueueSettings:
+    def __init__(self, lease_seconds=None, max_attempts=None, retry_backoff=None):
+        self.lease_seconds = lease_seconds or float(os.environ.get('JOB_LEASE_SECONDS', 600))
+        self.max_attempts = max_attempts or int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+        self.retry_backoff = retry_backoff if retry_backoff is not None else float(
+            os.environ.get('JOB_RETRY_BACKOFF', 60))
+
+    def retry_delay(self, attempts):
+        return self.retry_backoff * 2 ** (attempts - 1)
+
+
+class SqlJobQueue(_QueueSettings):
+    """Jobs as ``ScrapeJob`` rows; call it inside an app context.
+
+    Workers claim jobs by stamping a fresh lease token on them with a
+    conditional UPDATE, so two workers never hold the same job even on
+    SQLite. On PostgreSQL and MySQL the candidate SELECT also uses
+    ``FOR UPDATE SKIP LOCKED`` so concurrent workers don't contend for the
+    same rows.
+    """
+
+    def __init__(self, lease_seconds=None, max_attempts=None, retry_backoff=None, retention_hours=None):
+        super().__init__(lease_seconds, max_attempts, retry_backoff)
+        self.retention_hours = retention_hours or float(os.environ.get('JOB_RETENTION_HOURS', 24))
+
+    def enqueue(self, jobs):
+        """Queue ``jobs`` (dicts with listing_key, platform, url, product_ids); returns how many were new."""
+        now = datetime.utcnow()
+        rows = [{
+            'listing_key': job['listing_key'],
+            'unfinished_key': job['listing_key'],
+            'platform': job['platform'],
+            'url': job['url'],
+            'product_ids': json.dumps(job['product_ids']),
+            'available_at': now
+        } for job in jobs]
+        if not rows:
+            return 0
+
+        # The unique unfinished_key rejects a listing that already has a queued
+        # or leased job, even one another scheduler inserted a moment ago
+        table = ScrapeJob.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            statement = (postgresql if dialect == 'postgresql' else sqlite).insert(table).on_conflict_do_nothing()
+        elif dialect in ('mysql', 'mariadb'):
+            statement = insert(table).prefix_with('IGNORE')
+        else:
+            queued = 0
+            for row in rows:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(table), row)
+                    queued += 1
+                except IntegrityError:
+                    pass
+            db.session.commit()
+            return queued
+        queued = db.session.execute(statement, rows).rowcount
+        db.session.commit()
+        return queued
+
+    def lease(self, worker, limit):
+        now = datetime.utcnow()
+        expired = db.and_(ScrapeJob.status == 'leased', ScrapeJob.leased_until < now)
+
+        # A job whose workers keep dying without reporting back is dead-lettered too
+        db.session.execute(update(ScrapeJob).where(
+            expired, ScrapeJob.attempts >= self.max_attempts
+        ).values(
+            status='dead', unfinished_key=None, lease_token=None, finished_at=now, last_error='lease expired'
+        ).execution_options(synchronize_session=False))
+
+        available = db.or_(db.and_(ScrapeJob.status == 'queued', ScrapeJob.available_at <= now), expired)
+        ids = [job_id for job_id, in db.session.query(ScrapeJob.id).filter(available).order_by(
+            ScrapeJob.available_at, ScrapeJob.id
+        ).limit(limit).with_for_update(skip_locked=True)]
+        if not ids:
+            db.session.commit()
+            return []
+
+        token = uuid.uuid4().hex
+        db.session.execute(update(ScrapeJob).where(ScrapeJob.id.in_(ids), available).values(
+            status='leased',
+            lease_token=token,
+            leased_until=now + timedelta(seconds=self.lease_seconds),
+            worker=worker,
+            attempts=ScrapeJob.attempts + 1
+        ).execution_options(synchronize_session=False))
+        db.session.commit()
+
+        rows = ScrapeJob.query.filter_by(lease_token=token).order_by(ScrapeJob.id).all()
+        return [Job(row.id, row.listing_key, row.platform, row.url, json.loads(row.product_ids),
+                    row.attempts, token) for row in rows]
+
+    def complete(self, job):
+        """Mark ``job`` done; False if its lease was lost to another worker."""
+        return self._finish(job, status='done', unfinished_key=None, lease_token=None, finished_at=datetime.utcnow(),
+                            last_error=None)
+
+    def fail(self, job, error):
+        """Schedule a retry of ``job``, or dead-letter it; returns 'retry', 'dead' or None if the lease was lost."""
+        now = datetime.utcnow()
+        if job.attempts >= self.max_attempts:
+            finished = self._finish(job, status='dead', unfinished_key=None, lease_token=None, finished_at=now,
+                                    last_error=str(error))
+            return 'dead' if finished else None
+        finished = self._finish(job, status='queued', lease_token=None, leased_until=None, last_error=str(error),
+                                available_at=now + timedelta(seconds=self.retry_delay(job.attempts)))
+        return 'retry' if finished else None
+
+    def _finish(self, job, **values):
+        result = db.session.execute(update(ScrapeJob).where(
+            ScrapeJob.id == job.id, ScrapeJob.lease_token == job.token
+        ).values(**values).execution_options(synchronize_session=False))
+        db.session.commit()
+        return result.rowcount == 1
+
+    def unfinished(self, listing_keys):
+        """The subset of ``listing_keys`` that have a queued or leased job."""
+        keys = list(listing_keys)
+        unfinished = set()
+        for start in range(0, len(keys), 500):
+            unfinished.update(key for key, in db.session.query(ScrapeJob.unfinished_key).filter(
+                ScrapeJob.unfinished_key.in_(keys[start:start + 500])))
+        return unfinished
+
+    def requeue_dead(self):
+        """Requeue the latest dead job of every listing that has no unfinished job."""
+        ids = [job_id for job_id, in db.session.query(db.func.max(ScrapeJob.id)).filter(
+            ScrapeJob.status == 'dead',
+            ScrapeJob.listing_key.notin_(
+                db.session.query(ScrapeJob.unfinished_key).filter(ScrapeJob.unfinished_key.isnot(None)))
+        ).group_by(ScrapeJob.listing_key)]
+        requeued = 0
+        for start in range(0, len(ids), 500):
+            result = db.session.execute(update(ScrapeJob).where(
+                ScrapeJob.id.in_(ids[start:start + 500]), ScrapeJob.status == 'dead'
+            ).values(
+                status='queued', unfinished_key=ScrapeJob.listing_key, attempts=0,
+                available_at=datetime.utcnow(), finished_at=None
+            ).execution_options(synchronize_session=False))
+            requeued += result.rowcount
+        db.session.commit()
+        return requeued
+
+    def purge(self):
+        """Delete finished jobs older than JOB_RETENTION_HOURS; dead jobs are kept."""
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        deleted = ScrapeJob.query.filter(
+            ScrapeJob.status == 'done', ScrapeJob.finished_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def stats(self):
+        counts = dict(db.session.query(ScrapeJob.status, db.func.count(ScrapeJob.id)).group_by(ScrapeJob.status))
+        ready = db.session.query(db.func.count(ScrapeJob.id)).filter(
+            ScrapeJob.status == 'queued', ScrapeJob.available_at <= datetime.utcnow()
+        ).scalar()
+        return {
+            'queued': counts.get('queued', 0),
+            'ready': ready,
+            'leased': counts.get('leased', 0),
+            'done': counts.get('done', 0),
+            'dead': counts.get('dead', 0),
+        }
+
+
+class RedisJobQueue(_QueueSettings):
+    """Jobs in Redis, keyed by listing so a listing has at most one job.
+
+    ``ready`` and ``leased`` are sorted sets scored by when the job becomes
+    available and when its lease runs out; ``dead`` is scored by when the job
+    was given up. A worker owns a job once its ZREM from ``ready`` succeeds,
+    so only one of several competing workers gets it. A worker that dies
+    between that ZREM and recording the lease loses the job until the next
+    refresh cycle queues it again.
+    """
+
+    def __init__(self, client, lease_seconds=None, max_attempts=None, retry_backoff=None, prefix='jobs:'):
+        super().__init__(lease_seconds, max_attempts, retry_backoff)
+        self.client = client
+        self.prefix = prefix
+        self.ready = prefix + 'ready'
+        self.leased = prefix + 'leased'
+        self.dead = prefix + 'dead'
+        self.done = prefix + 'done'
+
+    def _data_key(self, job_id):
+        return f"{self.prefix}job:{job_id}"
+
+    def _load(self, job_id):
+        raw = self.client.get(self._data_key(job_id))
+        return json.loads(raw) if raw is not None else None
+
+    def enqueue(self, jobs):
+        now = time.time()
+        queued = 0
+        for job in jobs:
+            job_id = job['listing_key']
+            if self.client.zscore(self.leased, job_id) is not None:
+                continue
+            data = {key: job[key] for key in ('listing_key', 'platform', 'url', 'product_ids')}
+            data.update(attempts=0, token=None, error=None)
+            if self.client.zadd(self.ready, {job_id: now}, nx=True):
+                pipe = self.client.pipeline()
+                pipe.set(self._data_key(job_id), json.dumps(data))
+                pipe.zrem(self.dead, job_id)
+                pipe.execute()
+                queued += 1
+        return queued
+
+    def lease(self, worker, limit):
+        now = time.time()
+        for job_id in self.client.zrangebyscore(self.leased, '-inf', now):
+            if self.client.zrem(self.leased, job_id):
+                self.client.zadd(self.ready, {job_id: now})
+
+        jobs = []
+        for job_id in self.client.zrangebyscore(self.ready, '-inf', now, start=0, num=limit):
+            if not self.client.zrem(self.ready, job_id):
+                continue  # another worker got it first
+            job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+            data = self._load(job_id)
+            if data is None:
+                continue
+            if data['token'] is not None and data['attempts'] >= self.max_attempts:
+                # Its last lease ran out without the worker reporting back
+                self._bury(job_id, data, 'lease expired')
+                continue
+            data.update(attempts=data['attempts'] + 1, token=uuid.uuid4().hex, worker=worker)
+            pipe = self.client.pipeline()
+            pipe.set(self._data_key(job_id), json.dumps(data))
+            pipe.zadd(self.leased, {job_id: now + self.lease_seconds})
+            pipe.execute()
+            jobs.append(Job(job_id, data['listing_key'], data['platform'], data['url'], data['product_ids'],
+                            data['attempts'], data['token']))
+        return jobs
+
+    def _owned(self, job):
+        data = self._load(job.id)
+        if data is None or data['token'] != job.token or self.client.zscore(self.leased, job.id) is None:
+            return None
+        return data
+
+    def complete(self, job):
+        if self._owned(job) is None:
+            return False
+        pipe = self.client.pipeline()
+        pipe.zrem(self.leased, job.id)
+        pipe.delete(self._data_key(job.id))
+        pipe.incr(self.done)
+        pipe.execute()
+        return True
+
+    def fail(self, job, error):
+        data = self._owned(job)
+        if data is None:
+            return None
+        if job.attempts >= self.max_attempts:
+            self._bury(job.id, data, str(error))
+            return 'dead'
+        data.update(token=None, error=str(error))
+        pipe = self.client.pipeline()
+        pipe.zrem(self.leased, job.id)
+        pipe.set(self._data_key(job.id), json.dumps(data))
+        pipe.zadd(self.ready, {job.id: time.time() + self.retry_delay(job.attempts)})
+        pipe.execute()
+        return 'retry'
+
+    def _bury(self, job_id, data, error):
+        data.update(token=None, error=error)
+        pipe = self.client.pipeline()
+        pipe.zrem(self.leased, job_id)
+        pipe.set(self._data_key(job_id), json.dumps(data))
+        pipe.zadd(self.dead, {job_id: time.time()})
+        pipe.execute()
+
+    def unfinished(self, listing_keys):
+        return {key for key in listing_keys
+                if self.client.zscore(self.ready, key) is not None or self.client.zscore(self.leased, key) is not None}
+
+    def requeue_dead(self):
+        requeued = 0
+        for job_id in self.client.zrange(self.dead, 0, -1):
+            job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+            data = self._load(job_id)
+            if data is None or not self.client.zrem(self.dead, job_id):
+                continue
+            data.update(attempts=0, token=None)
+            self.client.set(self._data_key(job_id), json.dumps(data))
+            self.client.zadd(self.ready, {job_id: time.time()})
+            requeued += 1
+        return requeued
+
+    def purge(self):
+        # Done jobs are deleted as they complete
+        return 0
+
+    def stats(self):
+        return {
+            'queued': self.client.zcard(self.ready),
+            'ready': self.client.zcount(self.ready, '-inf', time.time()),
+            'leased': self.client.zcard(self.leased),
+            'done': int(self.client.get(self.done) or 0),
+            'dead': self.client.zcard(self.dead),
+        }
+
+
+def make_job_queue(url=None, client=None):
+    """The Redis queue when JOB_QUEUE_URL (or ``client``) is given, else the database queue."""
+    url = url or os.environ.get('JOB_QUEUE_URL')
+    if client is None and url:
+        if redis is None:
+            print("JOB_QUEUE_URL is set but the redis package is not installed, using the database queue")
+        else:
+            client = redis.Redis.from_url(url)
+    if client is not None:
+        return RedisJobQueue(client)
+    return SqlJobQueue()
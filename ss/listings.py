@@ -0,0 +1,60 @@
+from datetime import datetime
+from models import db, Listing
+
+
+class ListingPlan:
+    """Groups tracked products by canonical listing for one refresh cycle.
+
+    Each listing is scraped once no matter how many products reference it.
+    ``complete`` tells the caller when all listings of a product are done, so
+    it can write the product's history row with both platform prices. With
+    ``keys``, only those listings are planned.
+    """
+
+    def __init__(self, scraper, keys=None):
+        self.scraper = scraper
+        self.keys = set(keys) if keys is not None else None
+        self.listings = {}
+        self._pending = {}
+
+    def add_product(self, product_id, amazon_url=None, flipkart_url=None):
+        for platform, url in (('amazon', amazon_url), ('flipkart', flipkart_url)):
+            if not url:
+                continue
+            key = self.scraper.listing_key(url)
+            if self.keys is not None and key not in self.keys:
+                continue
+            listing = self.listings.setdefault(key, {'platform': platform, 'url': url, 'product_ids': []})
+            listing['product_ids'].append(product_id)
+            self._pending[product_id] = self._pending.get(product_id, 0) + 1
+
+    def jobs(self):
+        """``(listing_key, {platform: url})`` pairs for ``RefreshEngine.run``."""
+        return [(key, {listing['platform']: listing['url']}) for key, listing in self.listings.items()]
+
+    @property
+    def product_count(self):
+        return len(self._pending)
+
+    def product_ids(self, key):
+        return self.listings[key]['product_ids']
+
+    def complete(self, key, product_id):
+        """Mark ``key`` done for ``product_id``; True once the product has no listings left."""
+        self._pending[product_id] -= 1
+        return self._pending[product_id] == 0
+
+
+def record_listing(key, platform, url, result, listing=None):
+    """Create or update the shared ``Listing`` row for a scrape result (no commit)."""
+    if listing is None:
+        listing = Listing.query.filter_by(listing_key=key).first()
+    if listing is None:
+        listing = Listing(listing_key=key, platform=platform, url=url)
+        db.session.add(listing)
+    
+    if result and result.get('success'):
+        listing.price = result['price']
+        listing.original_price = result.get('original_price')
+        listing.last_scraped_at = datetime.utcnow()
+    return listing
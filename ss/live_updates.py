@@ -0,0 +1,71 @@
+"""
+Server-sent event streams of product updates for open product pages.
+
+Each open page holds one ``stream(product_id)`` generator, served as
+``text/event-stream``. ``publish`` hands an event to every stream watching
+that product without blocking: each stream has a small queue, and events for
+a client too slow to drain it are dropped (it catches up on reload). Streams
+send a comment every LIVE_HEARTBEAT_SECONDS so proxies keep the connection
+open and a closed client is noticed and unregistered.
+
+Streams live in process memory, so an event only reaches pages connected to
+the process that published it.
+"""
+import json
+import os
+import queue
+import threading
+
+LIVE_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', 15))
+
+
+class LiveUpdates:
+    def __init__(self, heartbeat=None, max_queue=100):
+        self.heartbeat = heartbeat or LIVE_HEARTBEAT_SECONDS
+        self.max_queue = max_queue
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def watched(self, product_ids):
+        """The subset of ``product_ids`` that at least one stream is watching."""
+        with self._lock:
+            return {product_id for product_id in product_ids if self._listeners.get(product_id)}
+
+    def publish(self, product_id, event, data):
+        with self._lock:
+            listeners = list(self._listeners.get(product_id, ()))
+        for listener in listeners:
+            try:
+                listener.put_nowait((event, data))
+            except queue.Full:
+                pass
+
+    def stream(self, product_id):
+        """Yield SSE frames for ``product_id`` until the client goes away."""
+        listener = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._listeners.setdefault(product_id, set()).add(listener)
+        try:
+            # Ask the browser to reconnect after 5s if the connection drops
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = listener.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            with self._lock:
+                listeners = self._listeners.get(product_id)
+                if listeners is not None:
+                    listeners.discard(listener)
+                    if not listeners:
+                        del self._listeners[product_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'products': len(self._listeners),
+                'streams': sum(len(listeners) for listeners in self._listeners.values()),
+            }
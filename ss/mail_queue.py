@@ -0,0 +1,174 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+
+# Errors that concern one message; the connection itself is still usable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class OutgoingEmail:
+    def __init__(self, from_email, to_email, message):
+        self.from_email = from_email
+        self.to_email = to_email
+        self.message = message
+        self.attempts = 0
+
+
+class EmailDeliveryQueue:
+    """Sends queued mail from background threads over reused SMTP connections.
+
+    Each worker keeps one connection open and sends up to ``batch_size``
+    messages over it per wake-up, so STARTTLS and login are paid once per
+    connection instead of once per message. Idle connections are closed
+    after ``idle_timeout`` seconds. Failures other than a permanent (5xx)
+    rejection are retried with exponential backoff, on a fresh connection.
+
+    ``connect`` is a callable returning a ready-to-use ``smtplib.SMTP``.
+    """
+
+    def __init__(self, connect, workers=None, batch_size=None, max_retries=None,
+                 retry_backoff=None, idle_timeout=None):
+        self.connect = connect
+        self.workers = workers or int(os.environ.get('EMAIL_WORKERS', 2))
+        self.batch_size = batch_size or int(os.environ.get('EMAIL_BATCH_SIZE', 20))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('EMAIL_MAX_RETRIES', 3))
+        self.retry_backoff = retry_backoff if retry_backoff is not None else float(os.environ.get('EMAIL_RETRY_BACKOFF', 2.0))
+        self.idle_timeout = idle_timeout or float(os.environ.get('EMAIL_IDLE_TIMEOUT', 30))
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._unfinished = 0
+        self._closed = False
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.connections_opened = 0
+
+    def enqueue(self, from_email, to_email, message):
+        with self._lock:
+            if self._closed:
+                return False
+            self._unfinished += 1
+            if not self._threads:
+                for number in range(self.workers):
+                    thread = threading.Thread(target=self._work, name=f'email-{number}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        self._queue.put(OutgoingEmail(from_email, to_email, message))
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every queued message was sent or given up on; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._unfinished:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Stop accepting mail, deliver what is queued and close the connections."""
+        timeout = timeout if timeout is not None else float(os.environ.get('EMAIL_SHUTDOWN_TIMEOUT', 10))
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+        if not self.flush(timeout):
+            print(f"Email queue closed with {self._unfinished} messages undelivered")
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._unfinished,
+                'sent': self.sent,
+                'failed': self.failed,
+                'retried': self.retried,
+                'connections_opened': self.connections_opened,
+            }
+
+    def _work(self):
+        connection = None
+        last_used = 0.0
+        while True:
+            try:
+                email = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                connection = self._disconnect(connection)
+                continue
+            if email is None:
+                self._disconnect(connection)
+                return
+
+            batch = [email]
+            while len(batch) < self.batch_size:
+                try:
+                    email = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if email is None:
+                    # Put the stop marker back for after this batch
+                    self._queue.put(None)
+                    break
+                batch.append(email)
+
+            for email in batch:
+                if connection is not None and time.monotonic() - last_used > self.idle_timeout:
+                    connection = self._disconnect(connection)
+                try:
+                    if connection is None:
+                        connection = self.connect()
+                        with self._lock:
+                            self.connections_opened += 1
+                    connection.sendmail(email.from_email, [email.to_email], email.message)
+                    self._finish(email, sent=True)
+                    print(f"Email sent successfully to {email.to_email}")
+                except Exception as e:
+                    if not isinstance(e, MESSAGE_ERRORS):
+                        connection = self._disconnect(connection)
+                    self._retry_or_drop(email, e)
+                # A rejected message still used the connection
+                last_used = time.monotonic()
+
+    def _retry_or_drop(self, email, error):
+        email.attempts += 1
+        permanent = isinstance(error, smtplib.SMTPRecipientsRefused) or (
+            isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+        )
+        if permanent or email.attempts > self.max_retries:
+            print(f"Failed to send email to {email.to_email}: {error}")
+            self._finish(email, sent=False)
+            return
+
+        delay = self.retry_backoff * 2 ** (email.attempts - 1)
+        print(f"Email to {email.to_email} failed ({error}), retrying in {delay:g}s")
+        with self._lock:
+            self.retried += 1
+        timer = threading.Timer(delay, self._queue.put, (email,))
+        timer.daemon = True
+        timer.start()
+
+    def _finish(self, email, sent):
+        with self._idle:
+            if sent:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._unfinished -= 1
+            if not self._unfinished:
+                self._idle.notify_all()
+
+    def _disconnect(self, connection):
+        if connection is not None:
+            try:
+                connection.quit()
+            except Exception:
+                connection.close()
+        return None
@@ -0,0 +1,212 @@
+"""
+Process-local metrics in the Prometheus text exposition format.
+
+A small dependency-free stand-in for prometheus_client: counters and
+histograms with labels, plus gauges read from a callback when the metrics
+are rendered (used for the stats() of the caches and queues). ``/metrics``
+in app.py serves ``REGISTRY.render()``. Values are per process; with several
+app or worker processes, scrape each of them.
+"""
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}' for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labels, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """A gauge whose values come from ``callback()`` at render time.
+
+    ``callback`` returns a number, or a dict mapping label value tuples to
+    numbers when the gauge has labels. None values are skipped.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help, callback, labels=()):
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def _samples(self):
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Metric {self.name} failed: {e}")
+            return []
+        if not self.labels:
+            values = {(): values}
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+                for key, value in sorted(values.items()) if value is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, callback, labels=()):
+        """Register (or replace) a callback gauge."""
+        metric = CallbackGauge(name, help, callback, labels)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def stats_gauge(self, name, help, stats):
+        """Expose the numeric entries of a ``stats()`` dict as ``name{stat="..."}``."""
+        def callback():
+            return {(key,): int(value) if isinstance(value, bool) else value
+                    for key, value in stats().items() if isinstance(value, (int, float))}
+        return self.gauge(name, help, callback, ('stat',))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Scraper hot path
+FETCH_SECONDS = REGISTRY.histogram(
+    'scraper_fetch_seconds', 'Time to fetch a page, by platform and HTTP status class',
+    ('platform', 'status'))
+FETCH_BYTES = REGISTRY.counter(
+    'scraper_fetch_bytes_total', 'Bytes of page text downloaded', ('platform',))
+CACHED_FETCHES = REGISTRY.counter(
+    'scraper_cached_fetches_total', 'Fetches answered from the response cache without a request', ('platform',))
+PARSE_SECONDS = REGISTRY.histogram(
+    'scraper_parse_seconds', 'Time to parse a product page and extract its fields', ('platform',))
+PAGES = REGISTRY.counter(
+    'scraper_pages_total', 'Product pages scraped, by outcome (success, failed, blocked, error)',
+    ('platform', 'outcome'))
+CAPTCHAS = REGISTRY.counter(
+    'scraper_captcha_total', 'Responses that were a CAPTCHA / robot check page', ('platform',))
+RETRIES = REGISTRY.counter(
+    'scraper_retries_total', 'Fetches retried, by reason', ('platform', 'reason'))
+SELECTOR_TIERS = REGISTRY.counter(
+    'scraper_selector_tier_total', 'Which extraction tier produced a field (none when nothing matched)',
+    ('platform', 'field', 'tier'))
+
+# Refresh cycle
+REFRESH_PHASE_SECONDS = REGISTRY.histogram(
+    'refresh_phase_seconds', 'Time spent per refresh cycle phase', ('phase',),
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+SCRAPE_JOBS = REGISTRY.counter(
+    'scrape_jobs_total', 'Listing refresh jobs finished by this worker, by outcome (done, retry, dead, lease_lost)',
+    ('outcome',))
+
+
+def platform_for_host(host):
+    host = (host or '').lower()
+    if 'amazon' in host or 'amzn' in host:
+        return 'amazon'
+    if 'flipkart' in host or 'fkrt' in host:
+        return 'flipkart'
+    return 'other'
+
+
+def status_class(status_code):
+    return f'{status_code // 100}xx' if status_code else 'error'
@@ -0,0 +1,67 @@
+"""
+Schema upgrades for existing databases.
+
+``db.create_all()`` creates missing tables, but it never touches tables that
+already exist, so indexes added to the models later are missing on older
+deployments. ``ensure_indexes`` compares the indexes declared on every model
+with the ones the database reports and creates the missing ones. It works the
+same on SQLite, MySQL and PostgreSQL and is safe to run on every start.
+
+Creating an index on a large table can lock it for a while. To build them
+yourself instead (e.g. ``CREATE INDEX CONCURRENTLY`` on PostgreSQL), start the
+app with AUTO_CREATE_INDEXES=false, print the statements for the missing
+indexes and run them by hand:
+
+    python migrations.py --sql
+"""
+import os
+import sys
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex
+from models import db
+
+
+def missing_indexes(engine):
+    """Indexes declared on the models that the database doesn't have yet."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def ensure_indexes(engine):
+    """Create missing indexes; returns the names of the ones created."""
+    created = []
+    for index in missing_indexes(engine):
+        print(f"Creating index {index.name} on {index.table.name}...")
+        try:
+            index.create(engine, checkfirst=True)
+            created.append(index.name)
+        except Exception as e:
+            # Another process may have created it meanwhile; keep starting up
+            print(f"Could not create index {index.name}: {e}")
+    return created
+
+
+def index_statements(engine):
+    return [str(CreateIndex(index).compile(dialect=engine.dialect)).strip() + ';'
+            for index in missing_indexes(engine)]
+
+
+if __name__ == '__main__':
+    # Keep app startup from creating the indexes before we look at them
+    os.environ['AUTO_CREATE_INDEXES'] = 'false'
+    from app import app
+
+    with app.app_context():
+        if '--sql' in sys.argv:
+            for statement in index_statements(db.engine):
+                print(statement)
+        else:
+            created = ensure_indexes(db.engine)
+            print(f"Created {len(created)} index(es)")
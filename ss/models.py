@@ -26,6 +26,10 @@ class User(UserMixin, db.Model):
 
 class TrackedProduct(db.Model):
     __tablename__ = 'tracked_products'
+    __table_args__ = (
+        # Serves the dashboard: a user's products, newest first
+        db.Index('ix_tracked_products_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -44,10 +48,16 @@ class TrackedProduct(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     price_history = db.relationship('PriceHistory', backref='product', lazy=True, cascade='all, delete-orphan')
+    price_rollups = db.relationship('PriceRollup', backref='product', lazy=True, cascade='all, delete-orphan')
+    stats = db.relationship('ProductStats', backref='product', uselist=False, lazy=True, cascade='all, delete-orphan')
     alerts = db.relationship('PriceAlert', backref='product', lazy=True, cascade='all, delete-orphan')
 
 class PriceHistory(db.Model):
     __tablename__ = 'price_history'
+    __table_args__ = (
+        # Serves time-range reads of one product's history
+        db.Index('ix_price_history_product_recorded', 'product_id', 'recorded_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('tracked_products.id'), nullable=False)
@@ -55,8 +65,76 @@ class PriceHistory(db.Model):
     flipkart_price = db.Column(db.Float)
     recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class PriceRollup(db.Model):
+    """Min/max/close of a product's prices over one hour or one day.
+
+    Maintained by ``price_series.record_prices`` alongside the raw
+    ``PriceHistory`` rows, so long ranges can be charted without reading
+    every sample.
+    """
+    __tablename__ = 'price_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'resolution', 'bucket_start', name='uq_price_rollups_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('tracked_products.id'), nullable=False)
+    resolution = db.Column(db.String(10), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    close_at = db.Column(db.DateTime)
+    
+    amazon_min = db.Column(db.Float)
+    amazon_max = db.Column(db.Float)
+    amazon_close = db.Column(db.Float)
+    
+    flipkart_min = db.Column(db.Float)
+    flipkart_max = db.Column(db.Float)
+    flipkart_close = db.Column(db.Float)
+
+class ProductStats(db.Model):
+    """Price statistics of one product, recomputed by ``analytics.update_product_stats``.
+
+    Volatility is the standard deviation of the relative change between
+    consecutive samples over the last 90 days. The percentile is the share of
+    samples at or below the current price. ``*_lowest_in_days`` is how many
+    days the current price has been the lowest seen.
+    """
+    __tablename__ = 'product_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('tracked_products.id'), unique=True, nullable=False)
+    samples = db.Column(db.Integer, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    amazon_low = db.Column(db.Float)
+    amazon_high = db.Column(db.Float)
+    amazon_avg_30d = db.Column(db.Float)
+    amazon_avg_90d = db.Column(db.Float)
+    amazon_volatility = db.Column(db.Float)
+    amazon_percentile = db.Column(db.Float)
+    amazon_lowest_in_days = db.Column(db.Integer)
+    
+    flipkart_low = db.Column(db.Float)
+    flipkart_high = db.Column(db.Float)
+    flipkart_avg_30d = db.Column(db.Float)
+    flipkart_avg_90d = db.Column(db.Float)
+    flipkart_volatility = db.Column(db.Float)
+    flipkart_percentile = db.Column(db.Float)
+    flipkart_lowest_in_days = db.Column(db.Integer)
+    
+    def lowest_in_days(self):
+        """The longer of the two platforms' lowest-price streaks, in days."""
+        return max(self.amazon_lowest_in_days or 0, self.flipkart_lowest_in_days or 0)
+
 class PriceAlert(db.Model):
     __tablename__ = 'price_alerts'
+    __table_args__ = (
+        # Serves per-product alert checks after a price change
+        db.Index('ix_price_alerts_product_active_target', 'product_id', 'is_active', 'target_price'),
+        # Serves a user's alerts on one product (product page, set-alert lookup)
+        db.Index('ix_price_alerts_product_user_platform_active', 'product_id', 'user_id', 'platform', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -66,3 +144,53 @@ class PriceAlert(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     triggered_at = db.Column(db.DateTime)
+
+class Listing(db.Model):
+    """One product page on one platform, shared by every user tracking it.
+
+    Rows are keyed by ``ProductScraper.listing_key`` so the refresh cycle can
+    scrape each page once and fan the result out to all matching
+    ``TrackedProduct`` rows.
+    """
+    __tablename__ = 'listings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    listing_key = db.Column(db.String(100), unique=True, nullable=False)
+    platform = db.Column(db.String(20), nullable=False)  # 'amazon' or 'flipkart'
+    url = db.Column(db.String(2000), nullable=False)
+    price = db.Column(db.Float)
+    original_price = db.Column(db.Float)
+    last_scraped_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ScrapeJob(db.Model):
+    """A queued refresh of one listing, consumed by worker.py (see job_queue.py).
+
+    ``status`` moves from 'queued' to 'leased' while a worker holds it, then
+    to 'done', back to 'queued' for a retry, or to 'dead' once it has used up
+    its attempts. ``product_ids`` is a JSON list of the products to update.
+    ``unfinished_key`` repeats ``listing_key`` while the job is queued or
+    leased and is cleared when it finishes, so its unique index allows one
+    unfinished job per listing.
+    """
+    __tablename__ = 'scrape_jobs'
+    __table_args__ = (
+        # Leasing scans for available jobs in this order
+        db.Index('ix_scrape_jobs_status_available', 'status', 'available_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    listing_key = db.Column(db.String(100), nullable=False, index=True)
+    unfinished_key = db.Column(db.String(100), unique=True)
+    platform = db.Column(db.String(20), nullable=False)
+    url = db.Column(db.String(2000), nullable=False)
+    product_ids = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    lease_token = db.Column(db.String(32), index=True)
+    leased_until = db.Column(db.DateTime)
+    worker = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,167 @@
+"""
+Opt-in capture of scraped pages, for debugging and as parser fixtures.
+
+When SCRAPER_CAPTURE_DIR is set, a page is captured when extraction fails
+(SCRAPER_CAPTURE_FAILURES, on by default) or with probability
+SCRAPER_CAPTURE_SAMPLE_RATE (default 0) otherwise. The scraper only queues
+the page; one background thread gzips it into
+``<platform>-<timestamp>-<ok|fail>-<hash>.html.gz`` next to a ``.json`` file
+holding the URL and the extraction result. The oldest captures are deleted
+once there are more than SCRAPER_CAPTURE_MAX_FILES pages or they take more
+than SCRAPER_CAPTURE_MAX_BYTES.
+
+``iter_pages`` reads captures back (plain .html files too), which is how the
+benchmark scripts use them as regression fixtures.
+"""
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+from datetime import datetime
+
+CAPTURE_SUFFIX = '.html.gz'
+
+
+class PageCapture:
+    def __init__(self, directory=None, sample_rate=None, capture_failures=None,
+                 max_files=None, max_bytes=None, max_pending=50):
+        self.directory = directory or os.environ.get('SCRAPER_CAPTURE_DIR') or None
+        self.sample_rate = sample_rate if sample_rate is not None else float(
+            os.environ.get('SCRAPER_CAPTURE_SAMPLE_RATE', 0))
+        self.capture_failures = capture_failures if capture_failures is not None else (
+            os.environ.get('SCRAPER_CAPTURE_FAILURES', 'true').lower() == 'true')
+        self.max_files = max_files or int(os.environ.get('SCRAPER_CAPTURE_MAX_FILES', 200))
+        self.max_bytes = max_bytes or int(os.environ.get('SCRAPER_CAPTURE_MAX_BYTES', 50 * 1024 * 1024))
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.captured = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def should_capture(self, success):
+        if not self.enabled:
+            return False
+        if not success and self.capture_failures:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def capture(self, platform, url, html, result):
+        """Queue ``html`` for capture if the failure/sampling rules pick it; never blocks."""
+        success = bool(result.get('success'))
+        if not html or not self.should_capture(success):
+            return False
+        meta = {
+            'platform': platform,
+            'url': url,
+            'captured_at': datetime.utcnow().isoformat(),
+            'success': success,
+            'result': {key: result.get(key) for key in ('name', 'price', 'original_price', 'image', 'error')},
+        }
+        try:
+            self._queue.put_nowait((meta, html))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name='page-capture', daemon=True)
+                self._thread.start()
+        return True
+
+    def _write_loop(self):
+        while True:
+            meta, html = self._queue.get()
+            try:
+                self._write(meta, html)
+                self._rotate()
+                with self._lock:
+                    self.captured += 1
+            except Exception as e:
+                print(f"Page capture failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, meta, html):
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha1(html.encode('utf-8', 'replace')).hexdigest()[:10]
+        stamp = meta['captured_at'].replace(':', '').replace('-', '').replace('.', '')
+        stem = f"{meta['platform']}-{stamp}-{'ok' if meta['success'] else 'fail'}-{digest}"
+        path = os.path.join(self.directory, stem + CAPTURE_SUFFIX)
+
+        # Write under a temporary name so readers never see a partial file
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            f.write(html)
+        os.replace(path + '.tmp', path)
+        with open(os.path.join(self.directory, stem + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    def _rotate(self):
+        pages = []
+        for name in os.listdir(self.directory):
+            if name.endswith(CAPTURE_SUFFIX):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                pages.append((stat.st_mtime, name, stat.st_size))
+        pages.sort()
+        total = sum(size for _, _, size in pages)
+        while pages and (len(pages) > self.max_files or total > self.max_bytes):
+            _, name, size = pages.pop(0)
+            total -= size
+            for path in (name, name[:-len(CAPTURE_SUFFIX)] + '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, path))
+                except OSError:
+                    pass
+
+    def flush(self):
+        """Wait until every queued page is written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'captured': self.captured,
+                'dropped': self.dropped,
+                'pending': self._queue.qsize(),
+            }
+
+
+def read_page(path):
+    """The HTML of a saved page, gzip-compressed or not."""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return f.read()
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def read_capture_meta(path):
+    """The ``.json`` metadata saved next to a captured page, or None."""
+    if not path.endswith(CAPTURE_SUFFIX):
+        return None
+    try:
+        with open(path[:-len(CAPTURE_SUFFIX)] + '.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def iter_pages(paths):
+    """Yield ``(path, html)`` for each page file; directories yield the pages inside them, sorted."""
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.endswith(('.html', CAPTURE_SUFFIX)))
+            for name in names:
+                yield os.path.join(path, name), read_page(os.path.join(path, name))
+        else:
+            yield path, read_page(path)
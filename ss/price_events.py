@@ -0,0 +1,50 @@
+import threading
+
+
+class PriceChangeEvents:
+    """In-process publish/subscribe channel for product price changes.
+
+    ``publish`` only records the product ids and returns, so it is safe to
+    call from request handlers and the refresh loop. Subscribers run on one
+    background thread; ids published while they are busy are coalesced into
+    the next call, so a burst of updates costs one call per batch rather
+    than one per product.
+    """
+
+    def __init__(self):
+        self._handlers = []
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self, handler):
+        """Register ``handler(product_ids)``, called with a sorted list of ids."""
+        self._handlers.append(handler)
+        return handler
+
+    def publish(self, product_ids):
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        with self._lock:
+            self._pending |= product_ids
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name='price-events', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _dispatch(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                self._wakeup.clear()
+                product_ids, self._pending = self._pending, set()
+            if not product_ids:
+                continue
+            product_ids = sorted(product_ids)
+            for handler in self._handlers:
+                try:
+                    handler(product_ids)
+                except Exception as e:
+                    print(f"Error handling price change for {len(product_ids)} products: {e}")
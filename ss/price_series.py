@@ -0,0 +1,293 @@
+"""
+Price history storage and chart queries.
+
+Every refresh appends one raw ``PriceHistory`` row per product. Alongside it,
+``record_prices`` folds the sample into hourly and daily ``PriceRollup``
+buckets (min, max and closing price per platform), so a chart over months or
+years reads one row per bucket instead of every sample.
+
+``load_series`` answers range queries at a given resolution ('raw', 'hour',
+'day', or 'auto' to pick the finest one that fits the requested number of
+points) and merges neighbouring buckets when even daily data is too dense.
+"""
+import math
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, insert, or_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import db, PriceHistory, PriceRollup
+
+PLATFORMS = ('amazon', 'flipkart')
+ROLLUP_RESOLUTIONS = ('hour', 'day')
+RESOLUTIONS = ('auto', 'raw') + ROLLUP_RESOLUTIONS
+BUCKET_SIZES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+DATE_FORMATS = {'raw': '%Y-%m-%d %H:%M', 'hour': '%Y-%m-%d %H:%M', 'day': '%Y-%m-%d'}
+
+
+def bucket_start(moment, resolution):
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+ROLLUP_COLUMNS = ('samples', 'close_at', 'amazon_min', 'amazon_max', 'amazon_close',
+                  'flipkart_min', 'flipkart_max', 'flipkart_close')
+
+
+def record_prices(points):
+    """Append price samples to the raw history and the rollups.
+
+    ``points`` is an iterable of ``(product_id, amazon_price, flipkart_price)``
+    tuples, optionally with a fourth ``recorded_at`` item. History rows are
+    written with one multi-row INSERT. The batch is folded into one partial
+    rollup per bucket, which is upserted (``ON CONFLICT`` / ``ON DUPLICATE
+    KEY``) and merged into an existing bucket row in SQL, so concurrent
+    writers touching the same bucket neither collide on the unique
+    constraint nor lose each other's min/max. The caller commits.
+    """
+    now = datetime.utcnow()
+    points = [(point[0], point[1], point[2], point[3] if len(point) > 3 else now) for point in points]
+    if not points:
+        return
+
+    db.session.execute(insert(PriceHistory), [
+        {'product_id': product_id, 'amazon_price': amazon_price,
+         'flipkart_price': flipkart_price, 'recorded_at': recorded_at}
+        for product_id, amazon_price, flipkart_price, recorded_at in points
+    ])
+
+    points.sort(key=lambda point: point[3])
+    for resolution in ROLLUP_RESOLUTIONS:
+        rollups = {}
+        for product_id, amazon_price, flipkart_price, recorded_at in points:
+            key = (product_id, bucket_start(recorded_at, resolution))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = _new_rollup(product_id, resolution, key[1])
+            _fold(rollup, recorded_at, amazon_price, flipkart_price)
+        _merge_rollups(resolution, list(rollups.values()))
+
+
+def _merged_values(table, new):
+    """Column values for folding the partial rollup ``new`` into the existing row ``table``.
+
+    Ordered so that ``close_at`` is assigned last: MySQL evaluates ON DUPLICATE
+    KEY UPDATE assignments left to right against the already updated row.
+    """
+    values = [('samples', table.samples + new.samples)]
+    for platform in PLATFORMS:
+        for bound, better in (('min', lambda a, b: a < b), ('max', lambda a, b: a > b)):
+            old_value = getattr(table, f'{platform}_{bound}')
+            new_value = getattr(new, f'{platform}_{bound}')
+            values.append((f'{platform}_{bound}', case(
+                (old_value.is_(None), new_value),
+                (new_value.is_(None), old_value),
+                (better(new_value, old_value), new_value),
+                else_=old_value
+            )))
+    newer = or_(table.close_at.is_(None), new.close_at >= table.close_at)
+    for column in ('amazon_close', 'flipkart_close', 'close_at'):
+        values.append((column, case((newer, getattr(new, column)), else_=getattr(table, column))))
+    return values
+
+
+def _merge_rollups(resolution, rollups):
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        statement = (postgresql if dialect == 'postgresql' else sqlite).insert(PriceRollup)
+        statement = statement.on_conflict_do_update(
+            index_elements=['product_id', 'resolution', 'bucket_start'],
+            set_=dict(_merged_values(PriceRollup.__table__.c, statement.excluded))
+        )
+        db.session.execute(statement, rollups)
+        return
+    if dialect in ('mysql', 'mariadb'):
+        statement = mysql.insert(PriceRollup)
+        statement = statement.on_duplicate_key_update(_merged_values(PriceRollup.__table__.c, statement.inserted))
+        db.session.execute(statement, rollups)
+        return
+
+    # No upsert support: read the touched buckets and fold in Python
+    existing = db.session.query(
+        PriceRollup.id,
+        PriceRollup.product_id,
+        PriceRollup.bucket_start,
+        *[getattr(PriceRollup, column) for column in ROLLUP_COLUMNS]
+    ).filter(
+        PriceRollup.resolution == resolution,
+        PriceRollup.product_id.in_({rollup['product_id'] for rollup in rollups}),
+        PriceRollup.bucket_start.in_({rollup['bucket_start'] for rollup in rollups})
+    )
+    existing = {(row.product_id, row.bucket_start): dict(row._mapping) for row in existing}
+    updates = []
+    inserts = []
+    for rollup in rollups:
+        current = existing.get((rollup['product_id'], rollup['bucket_start']))
+        if current is None:
+            inserts.append(rollup)
+            continue
+        for platform in PLATFORMS:
+            for bound, pick in (('min', min), ('max', max)):
+                column = f'{platform}_{bound}'
+                values = [value for value in (current[column], rollup[column]) if value is not None]
+                current[column] = pick(values) if values else None
+        if current['close_at'] is None or rollup['close_at'] >= current['close_at']:
+            for column in ('amazon_close', 'flipkart_close', 'close_at'):
+                current[column] = rollup[column]
+        current['samples'] = (current['samples'] or 0) + rollup['samples']
+        updates.append(current)
+    if updates:
+        db.session.execute(update(PriceRollup), [
+            {'id': rollup['id'], **{column: rollup[column] for column in ROLLUP_COLUMNS}} for rollup in updates
+        ])
+    if inserts:
+        db.session.execute(insert(PriceRollup), inserts)
+
+
+def _new_rollup(product_id, resolution, start):
+    rollup = dict.fromkeys(ROLLUP_COLUMNS)
+    rollup.update(product_id=product_id, resolution=resolution, bucket_start=start, samples=0)
+    return rollup
+
+
+def _fold(rollup, recorded_at, amazon_price, flipkart_price):
+    for platform, price in (('amazon', amazon_price), ('flipkart', flipkart_price)):
+        if price is None:
+            continue
+        low = rollup[f'{platform}_min']
+        high = rollup[f'{platform}_max']
+        if low is None or price < low:
+            rollup[f'{platform}_min'] = price
+        if high is None or price > high:
+            rollup[f'{platform}_max'] = price
+    if rollup['close_at'] is None or recorded_at >= rollup['close_at']:
+        rollup['close_at'] = recorded_at
+        rollup['amazon_close'] = amazon_price
+        rollup['flipkart_close'] = flipkart_price
+    rollup['samples'] = (rollup['samples'] or 0) + 1
+
+
+def rebuild_rollups(product_id):
+    """Recompute a product's rollups from its raw history, e.g. for rows written before rollups existed."""
+    PriceRollup.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+    rows = db.session.query(
+        PriceHistory.recorded_at,
+        PriceHistory.amazon_price,
+        PriceHistory.flipkart_price
+    ).filter(
+        PriceHistory.product_id == product_id,
+        PriceHistory.recorded_at.isnot(None)
+    ).order_by(PriceHistory.recorded_at)
+
+    rollups = {}
+    for recorded_at, amazon_price, flipkart_price in rows:
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (resolution, bucket_start(recorded_at, resolution))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = _new_rollup(product_id, resolution, key[1])
+            _fold(rollup, recorded_at, amazon_price, flipkart_price)
+    if rollups:
+        db.session.execute(insert(PriceRollup), list(rollups.values()))
+    return len(rollups)
+
+
+def pick_resolution(product_id, start, end, points):
+    """The finest resolution whose point count over ``start``..``end`` fits ``points``."""
+    query = db.session.query(PriceHistory.recorded_at).filter(PriceHistory.product_id == product_id)
+    if start is not None:
+        query = query.filter(PriceHistory.recorded_at >= start)
+    if end is not None:
+        query = query.filter(PriceHistory.recorded_at < end)
+    if query.limit(points + 1).count() <= points:
+        return 'raw'
+
+    if start is None:
+        start = db.session.query(func.min(PriceHistory.recorded_at)).filter(
+            PriceHistory.product_id == product_id
+        ).scalar()
+    span = (end or datetime.utcnow()) - start
+    return 'hour' if span / BUCKET_SIZES['hour'] <= points else 'day'
+
+
+def load_series(product_id, resolution='auto', start=None, end=None, points=300):
+    """Chart points for ``product_id`` between ``start`` (inclusive) and ``end`` (exclusive).
+
+    Each point has ``date``, ``amazon_price`` and ``flipkart_price``; rolled-up
+    points also carry the bucket's ``*_min`` and ``*_max``. At most ``points``
+    points are returned.
+    """
+    if resolution == 'auto':
+        resolution = pick_resolution(product_id, start, end, points)
+
+    if resolution == 'raw':
+        query = db.session.query(
+            PriceHistory.recorded_at,
+            PriceHistory.amazon_price,
+            PriceHistory.flipkart_price
+        ).filter(PriceHistory.product_id == product_id)
+        if start is not None:
+            query = query.filter(PriceHistory.recorded_at >= start)
+        if end is not None:
+            query = query.filter(PriceHistory.recorded_at < end)
+        # Keep the most recent samples when the range holds more than fit
+        rows = query.order_by(PriceHistory.recorded_at.desc()).limit(points).all()
+        rows.reverse()
+        return [{
+            'date': recorded_at.strftime(DATE_FORMATS['raw']),
+            'amazon_price': amazon_price,
+            'flipkart_price': flipkart_price
+        } for recorded_at, amazon_price, flipkart_price in rows]
+
+    if _rollups_behind(product_id):
+        rebuild_rollups(product_id)
+        db.session.commit()
+    rows = _load_rollups(product_id, resolution, start, end)
+
+    # Merge runs of neighbouring buckets when there are still too many
+    size = max(1, math.ceil(len(rows) / points))
+    series = []
+    for offset in range(0, len(rows), size):
+        group = rows[offset:offset + size]
+        point = {'date': group[0]['bucket_start'].strftime(DATE_FORMATS[resolution])}
+        for platform in PLATFORMS:
+            lows = [row[f'{platform}_min'] for row in group if row[f'{platform}_min'] is not None]
+            highs = [row[f'{platform}_max'] for row in group if row[f'{platform}_max'] is not None]
+            point[f'{platform}_price'] = group[-1][f'{platform}_close']
+            point[f'{platform}_min'] = min(lows) if lows else None
+            point[f'{platform}_max'] = max(highs) if highs else None
+        series.append(point)
+    return series
+
+
+def _load_rollups(product_id, resolution, start, end):
+    query = db.session.query(
+        PriceRollup.bucket_start,
+        PriceRollup.amazon_min,
+        PriceRollup.amazon_max,
+        PriceRollup.amazon_close,
+        PriceRollup.flipkart_min,
+        PriceRollup.flipkart_max,
+        PriceRollup.flipkart_close
+    ).filter(
+        PriceRollup.product_id == product_id,
+        PriceRollup.resolution == resolution
+    )
+    if start is not None:
+        query = query.filter(PriceRollup.bucket_start >= bucket_start(start, resolution))
+    if end is not None:
+        query = query.filter(PriceRollup.bucket_start < end)
+    return [row._mapping for row in query.order_by(PriceRollup.bucket_start)]
+
+
+def _rollups_behind(product_id):
+    """True when raw history predates the product's rollups, i.e. was written before they existed."""
+    first_sample = db.session.query(func.min(PriceHistory.recorded_at)).filter(
+        PriceHistory.product_id == product_id
+    ).scalar()
+    if first_sample is None:
+        return False
+    first_bucket = db.session.query(func.min(PriceRollup.bucket_start)).filter(
+        PriceRollup.product_id == product_id,
+        PriceRollup.resolution == 'day'
+    ).scalar()
+    return first_bucket is None or first_sample < first_bucket
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+
+class _HostState:
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_slot = 0.0
+        self.successes = 0
+        self.throttles = 0
+
+
+class AdaptiveRateLimiter:
+    """Per-host AIMD rate limiter shared by every scraper request.
+
+    Requests to a host are spaced ``1 / rate`` seconds apart across all threads
+    and coroutines. Each clean response raises the rate additively; a throttling
+    signal (HTTP 429/503 or a CAPTCHA page) cuts it multiplicatively and pushes
+    the next slot out, so the rate settles just below what the site tolerates.
+    """
+
+    def __init__(self, initial_rate=None, min_rate=None, max_rate=None, increase=None, decrease=None):
+        self.initial_rate = initial_rate or float(os.environ.get('SCRAPER_RATE_INITIAL', 1.0))
+        self.min_rate = min_rate or float(os.environ.get('SCRAPER_RATE_MIN', 0.05))
+        self.max_rate = max_rate or float(os.environ.get('SCRAPER_RATE_MAX', 5.0))
+        self.increase = increase or float(os.environ.get('SCRAPER_RATE_INCREASE', 0.1))
+        self.decrease = decrease or float(os.environ.get('SCRAPER_RATE_DECREASE', 0.5))
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.initial_rate)
+        return state
+
+    def reserve(self, host):
+        """Claim the next request slot for ``host`` and return how long to wait for it."""
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            slot = max(now, state.next_slot)
+            state.next_slot = slot + 1.0 / state.rate
+            return slot - now
+
+    def acquire(self, host):
+        """Block until the caller may send a request to ``host``."""
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    def record_success(self, host):
+        with self._lock:
+            state = self._state(host)
+            state.successes += 1
+            state.rate = min(self.max_rate, state.rate + self.increase)
+
+    def record_throttle(self, host):
+        with self._lock:
+            state = self._state(host)
+            state.throttles += 1
+            state.rate = max(self.min_rate, state.rate * self.decrease)
+            # Back off immediately rather than after the slots already handed out
+            state.next_slot = max(state.next_slot, time.monotonic() + 1.0 / state.rate)
+
+    def current_rate(self, host):
+        """Current allowed requests per second for ``host``."""
+        with self._lock:
+            return self._state(host).rate
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                host: {
+                    'rate': state.rate,
+                    'successes': state.successes,
+                    'throttles': state.throttles,
+                }
+                for host, state in self._hosts.items()
+            }
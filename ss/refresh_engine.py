@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RefreshEngine:
+    """Refresh prices for many products with bounded, per-platform concurrency.
+
+    Each platform gets its own worker pool so a slow or throttled site cannot
+    starve the other one. Scrape results are handed back to the thread that
+    called ``run``, which applies them to the database while the pools keep
+    scraping, so a full cycle scales with worker count rather than product count.
+    """
+
+    def __init__(self, scraper, amazon_workers=None, flipkart_workers=None):
+        self.scraper = scraper
+        self.workers = {
+            'amazon': amazon_workers or int(os.environ.get('REFRESH_AMAZON_WORKERS', 4)),
+            'flipkart': flipkart_workers or int(os.environ.get('REFRESH_FLIPKART_WORKERS', 4)),
+        }
+        # How many jobs per worker may be queued ahead of the pool. Keeps memory
+        # bounded for large catalogues while never letting a worker sit idle.
+        self.queue_depth = int(os.environ.get('REFRESH_QUEUE_DEPTH', 2))
+
+    def _scrape_func(self, platform):
+        if platform == 'amazon':
+            return self.scraper.scrape_amazon
+        return self.scraper.scrape_flipkart
+
+    def run(self, jobs, handle_result):
+        """Scrape every job and call ``handle_result`` once per finished job.
+
+        ``jobs`` is an iterable of ``(key, {platform: url})`` pairs. Once every
+        platform URL of a job has been scraped, ``handle_result(key, results)``
+        is called on the calling thread with ``results`` mapping platform to the
+        scraper's result dict. Returns a small summary dict.
+        """
+        started = time.monotonic()
+        per_platform = {platform: [] for platform in self.workers}
+        pending = {}
+
+        for key, urls in jobs:
+            urls = {p: u for p, u in urls.items() if u and p in per_platform}
+            if not urls:
+                continue
+            pending[key] = {'remaining': len(urls), 'results': {}}
+            for platform, url in urls.items():
+                per_platform[platform].append((key, url))
+
+        total = sum(len(items) for items in per_platform.values())
+        summary = {'jobs': len(pending), 'scrapes': total, 'failed': 0, 'elapsed': 0.0}
+        if not total:
+            return summary
+
+        results = queue.Queue()
+        pools = {}
+        feeders = []
+
+        def scrape(platform, slots, key, url):
+            try:
+                result = self._scrape_func(platform)(url)
+            except Exception as e:
+                print(f"Error scraping {platform} for {key}: {e}")
+                result = {'success': False, 'error': str(e)}
+            finally:
+                slots.release()
+            results.put((key, platform, result))
+
+        def feed(platform, items, pool, slots):
+            for key, url in items:
+                slots.acquire()
+                pool.submit(scrape, platform, slots, key, url)
+
+        try:
+            for platform, items in per_platform.items():
+                if not items:
+                    continue
+                workers = self.workers[platform]
+                pools[platform] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'refresh-{platform}')
+                slots = threading.BoundedSemaphore(workers * self.queue_depth)
+                feeder = threading.Thread(
+                    target=feed,
+                    args=(platform, items, pools[platform], slots),
+                    name=f'refresh-feed-{platform}',
+                    daemon=True,
+                )
+                feeder.start()
+                feeders.append(feeder)
+
+            for _ in range(total):
+                key, platform, result = results.get()
+                if not result.get('success'):
+                    summary['failed'] += 1
+
+                job = pending[key]
+                job['results'][platform] = result
+                job['remaining'] -= 1
+                if job['remaining'] == 0:
+                    del pending[key]
+                    try:
+                        handle_result(key, job['results'])
+                    except Exception as e:
+                        print(f"Error applying refresh result for {key}: {e}")
+        finally:
+            for feeder in feeders:
+                feeder.join()
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+        summary['elapsed'] = time.monotonic() - started
+        return summary
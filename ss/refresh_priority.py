@@ -0,0 +1,184 @@
+"""
+Priority-based refresh scheduling.
+
+Instead of scraping every listing every REFRESH_INTERVAL_HOURS, each listing
+gets its own interval: the base interval divided by a score built from
+
+- price volatility (``ProductStats``, from ``PriceHistory``): a flat price
+  scores REFRESH_FLAT_FACTOR, and every REFRESH_VOLATILITY_SCALE of typical
+  sample-to-sample change adds 1;
+- the nearest active alert target: within REFRESH_ALERT_BAND of the current
+  price the score is multiplied by up to 1 + REFRESH_ALERT_BOOST, the most
+  when the price is at the target;
+- how many users track the listing: 1 + log2(users) / 2.
+
+The interval is kept between REFRESH_MIN_INTERVAL_MINUTES and
+REFRESH_MAX_INTERVAL_HOURS, and a listing is due that long after it was
+last scraped (or handed out by this scheduler). Every tick, the due listings
+go into a heap ordered by how far past their interval they are, and at most
+REFRESH_BUDGET of them are popped. Under a backlog the scrape budget goes to
+listings that are likely to have changed, and a listing that keeps losing
+out becomes more overdue until it wins. Listings never scraped go first.
+"""
+import heapq
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from listings import ListingPlan
+from models import db, Listing, PriceAlert, ProductStats, TrackedProduct
+
+
+class RefreshPolicy:
+    def __init__(self, base_hours=None, min_minutes=None, max_hours=None, flat_factor=None,
+                 volatility_scale=None, alert_band=None, alert_boost=None):
+        self.base = timedelta(hours=base_hours or float(os.environ.get('REFRESH_INTERVAL_HOURS', 6)))
+        self.min_interval = timedelta(minutes=min_minutes or float(os.environ.get('REFRESH_MIN_INTERVAL_MINUTES', 30)))
+        self.max_interval = timedelta(hours=max_hours or float(os.environ.get('REFRESH_MAX_INTERVAL_HOURS', 48)))
+        self.flat_factor = flat_factor or float(os.environ.get('REFRESH_FLAT_FACTOR', 0.25))
+        self.volatility_scale = volatility_scale or float(os.environ.get('REFRESH_VOLATILITY_SCALE', 0.02))
+        self.alert_band = alert_band or float(os.environ.get('REFRESH_ALERT_BAND', 0.10))
+        self.alert_boost = alert_boost if alert_boost is not None else float(os.environ.get('REFRESH_ALERT_BOOST', 3))
+
+    def score(self, volatility=None, alert_gap=None, trackers=1):
+        """Relative refresh rate; 1 refreshes every base interval.
+
+        ``volatility`` is None when there is too little history to tell,
+        ``alert_gap`` is how far the price is above the nearest alert target,
+        as a fraction of the price (None without alerts).
+        """
+        score = 1.0
+        if volatility is not None and not math.isnan(volatility):
+            score = self.flat_factor + volatility / self.volatility_scale
+        if alert_gap is not None and alert_gap < self.alert_band:
+            score *= 1 + self.alert_boost * (1 - max(alert_gap, 0.0) / self.alert_band)
+        return score * (1 + math.log2(max(trackers, 1)) / 2)
+
+    def interval(self, score):
+        return min(max(self.base / max(score, 1e-6), self.min_interval), self.max_interval)
+
+
+class ListingPriority:
+    def __init__(self, key, platform, score, interval, last_refresh, next_refresh_at):
+        self.key = key
+        self.platform = platform
+        self.score = score
+        self.interval = interval
+        self.last_refresh = last_refresh
+        self.next_refresh_at = next_refresh_at
+
+    def urgency(self, now):
+        """How many intervals have passed since the last refresh; infinite if never scraped."""
+        if self.last_refresh is None:
+            return float('inf')
+        return (now - self.last_refresh) / self.interval
+
+
+class RefreshScheduler:
+    """Picks the listings to refresh on each scheduler tick; call inside an app context."""
+
+    def __init__(self, scraper, policy=None, budget=None):
+        self.scraper = scraper
+        self.policy = policy or RefreshPolicy()
+        self.budget = budget or int(os.environ.get('REFRESH_BUDGET', 200))
+        # Listings handed out, so a failed scrape waits an interval before it is retried
+        self._handed_out = {}
+        self._lock = threading.Lock()
+        self.last_due = 0
+        self.last_picked = 0
+
+    def priorities(self, now=None):
+        """A ``ListingPriority`` for every listing referenced by a tracked product."""
+        now = now or datetime.utcnow()
+        rows = db.session.query(
+            TrackedProduct.id,
+            TrackedProduct.user_id,
+            TrackedProduct.amazon_url,
+            TrackedProduct.flipkart_url,
+            TrackedProduct.amazon_price,
+            TrackedProduct.flipkart_price
+        ).all()
+        plan = ListingPlan(self.scraper)
+        products = {}
+        for product_id, user_id, amazon_url, flipkart_url, amazon_price, flipkart_price in rows:
+            plan.add_product(product_id, amazon_url, flipkart_url)
+            products[product_id] = (user_id, {'amazon': amazon_price, 'flipkart': flipkart_price})
+
+        volatility = {
+            product_id: {'amazon': amazon_volatility, 'flipkart': flipkart_volatility}
+            for product_id, amazon_volatility, flipkart_volatility in db.session.query(
+                ProductStats.product_id,
+                ProductStats.amazon_volatility,
+                ProductStats.flipkart_volatility
+            )
+        }
+
+        # An alert fires once the price drops to its target, so the nearest one is the highest
+        targets = {}
+        for product_id, platform, target in db.session.query(
+            PriceAlert.product_id,
+            PriceAlert.platform,
+            db.func.max(PriceAlert.target_price)
+        ).filter(PriceAlert.is_active == True).group_by(PriceAlert.product_id, PriceAlert.platform):
+            for alert_platform in (('amazon', 'flipkart') if platform == 'both' else (platform,)):
+                key = (product_id, alert_platform)
+                targets[key] = max(targets.get(key, target), target)
+
+        scraped = dict(db.session.query(Listing.listing_key, Listing.last_scraped_at))
+        with self._lock:
+            handed_out = dict(self._handed_out)
+
+        priorities = []
+        for key, listing in plan.listings.items():
+            platform = listing['platform']
+            users = set()
+            volatilities = []
+            gaps = []
+            for product_id in listing['product_ids']:
+                user_id, prices = products[product_id]
+                users.add(user_id)
+                value = volatility.get(product_id, {}).get(platform)
+                if value is not None:
+                    volatilities.append(value)
+                target = targets.get((product_id, platform))
+                if target is not None and prices[platform]:
+                    gaps.append((prices[platform] - target) / prices[platform])
+
+            score = self.policy.score(
+                max(volatilities) if volatilities else None,
+                min(gaps) if gaps else None,
+                len(users)
+            )
+            interval = self.policy.interval(score)
+            times = [moment for moment in (scraped.get(key), handed_out.get(key)) if moment is not None]
+            last_refresh = max(times) if times else None
+            next_refresh_at = last_refresh + interval if last_refresh else now
+            priorities.append(ListingPriority(key, platform, score, interval, last_refresh, next_refresh_at))
+        return priorities
+
+    def due(self, now=None):
+        """Listing keys to refresh now, most urgent first, at most ``budget`` of them."""
+        now = now or datetime.utcnow()
+        ready = [(-item.urgency(now), item.next_refresh_at, item.key)
+                 for item in self.priorities(now) if item.next_refresh_at <= now]
+        heapq.heapify(ready)
+        picked = [heapq.heappop(ready)[-1] for _ in range(min(self.budget, len(ready)))]
+
+        with self._lock:
+            for key in picked:
+                self._handed_out[key] = now
+            # Forget hand-outs old enough that the next scrape will have superseded them
+            cutoff = now - self.policy.max_interval
+            self._handed_out = {key: moment for key, moment in self._handed_out.items() if moment >= cutoff}
+            self.last_due = len(picked) + len(ready)
+            self.last_picked = len(picked)
+        return picked
+
+    def stats(self):
+        with self._lock:
+            return {
+                'budget': self.budget,
+                'due': self.last_due,
+                'picked': self.last_picked,
+                'backlog': self.last_due - self.last_picked,
+            }
@@ -1,12 +1,147 @@
 import re
-import time
+import json
+import hashlib
 import random
+import os
+import time
+import asyncio
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
 import requests
-from urllib.parse import urlparse, urljoin, quote_plus
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse, urljoin, quote_plus, parse_qs
+from rate_limiter import AdaptiveRateLimiter
+from extraction import ExtractionPlan, SelectorStats
+from html_parsers import make_soup, resolve_backend
+from http_cache import ResponseCache, cache_key
+from page_capture import PageCapture
+import metrics
+
+try:
+    import aiohttp
+except ImportError:  # The asyncio backend is optional
+    aiohttp = None
+
+
+class _Fetch:
+    """Step yielded by a scraping flow to request an HTTP GET."""
+
+    def __init__(self, url, headers, timeout=30, allow_redirects=True, raise_for_status=True):
+        self.url = url
+        self.headers = headers
+        self.timeout = timeout
+        self.allow_redirects = allow_redirects
+        self.raise_for_status = raise_for_status
+
+
+FetchResponse = namedtuple('FetchResponse', ['status_code', 'text', 'url'])
+
+# Markers of Amazon's CAPTCHA / robot check interstitial
+ROBOT_CHECK_MARKERS = ('api-services-support@amazon.com', 'Robot Check', 'Enter the characters you see below')
+
+# Status codes that mean the site wants us to slow down
+THROTTLE_STATUS_CODES = (429, 503)
+
+# Product ids used to build canonical listing keys
+ASIN_PATTERN = re.compile(r'/(?:dp|gp/product|gp/aw/d|product)/([A-Z0-9]{10})(?:[/?]|$)', re.I)
+FLIPKART_ITEM_PATTERN = re.compile(r'/p/(itm[0-9a-z]+)', re.I)
+
+
+# Single-pass extraction plans. Every selector the product page parsers may
+# need is registered here once, so each page is traversed a single time;
+# parse_amazon / parse_flipkart then walk the candidates in priority order.
+
+AMAZON_PLAN = ExtractionPlan()
+
+AMAZON_TITLE_SELECTORS = [AMAZON_PLAN.add(tag, attrs) for tag, attrs in [
+    ('span', {'id': 'productTitle'}),
+    ('h1', {'id': 'title'}),
+    ('span', {'class': 'product-title-word-break'}),
+    ('h1', {'class': 'a-size-large'}),
+    ('span', {'class': 'a-size-large product-title-word-break'}),
+    ('div', {'id': 'titleSection'}),
+    ('div', {'id': 'title_feature_div'}),
+]]
+AMAZON_H1 = AMAZON_PLAN.add('h1')
+AMAZON_META_TITLE = AMAZON_PLAN.add('meta', {'name': 'title'}, first_only=True)
+AMAZON_OG_TITLE = AMAZON_PLAN.add('meta', {'property': 'og:title'}, first_only=True)
+
+AMAZON_PRICE_DIV = AMAZON_PLAN.add('div', {'id': re.compile(r'price', re.I)})
+AMAZON_PRICE_DIV_SPAN = AMAZON_PLAN.add('span', {'class': re.compile(r'a-price-whole|a-offscreen')},
+                                        within=AMAZON_PRICE_DIV)
+AMAZON_PRICE_SELECTORS = [AMAZON_PLAN.add(tag, attrs) for tag, attrs in [
+    ('span', {'class': 'a-price-whole'}),
+    ('span', {'id': 'priceblock_ourprice'}),
+    ('span', {'id': 'priceblock_dealprice'}),
+    ('span', {'id': 'priceblock_saleprice'}),
+    ('span', {'class': 'a-offscreen'}),
+    ('span', {'class': 'a-price aok-align-center reinventPricePriceToPayMargin priceToPay'}),
+    ('span', {'id': 'tp_price_block_total_price_ww'}),
+    ('td', {'class': 'a-span12 a-color-price a-size-base'}),
+]]
+AMAZON_A_PRICE = AMAZON_PLAN.add('span', {'class': re.compile(r'a-price')})
+AMAZON_A_PRICE_WHOLE = AMAZON_PLAN.add('span', {'class': 'a-price-whole'}, within=AMAZON_A_PRICE, first_only=True)
+AMAZON_SPAN = AMAZON_PLAN.add('span')
+AMAZON_TEXT_PRICE = AMAZON_PLAN.add('span', {'class': re.compile(r'a-text-price')})
+AMAZON_TEXT_PRICE_OFFSCREEN = AMAZON_PLAN.add('span', {'class': 'a-offscreen'}, within=AMAZON_TEXT_PRICE,
+                                              first_only=True)
+
+AMAZON_IMAGE_SELECTORS = [AMAZON_PLAN.add(tag, attrs, first_only=True) for tag, attrs in [
+    ('img', {'id': 'landingImage'}),
+    ('img', {'id': 'imgBlkFront'}),
+    ('img', {'id': 'ebooksImgBlkFront'}),
+    ('img', {'class': re.compile(r'a-dynamic-image')}),
+    ('div', {'id': 'imgTagWrapperId'}),
+    ('div', {'id': 'main-image-container'}),
+]]
+AMAZON_OG_IMAGE = AMAZON_PLAN.add('meta', {'property': 'og:image'}, first_only=True)
+
+FLIPKART_PLAN = ExtractionPlan()
+
+FLIPKART_TITLE_SELECTORS = [FLIPKART_PLAN.add(tag, attrs, first_only=True) for tag, attrs in [
+    ('span', {'class': 'VU-ZEz'}),
+    ('span', {'class': 'B_NuCI'}),
+    ('h1', {'class': 'yhB1nd'}),
+    ('span', {'class': '_35KyD6'}),
+    ('h1', {'class': '_6EBuvT'}),
+]]
+FLIPKART_H1 = FLIPKART_PLAN.add('h1')
+
+FLIPKART_PRICE_SELECTORS = [FLIPKART_PLAN.add(tag, attrs, first_only=True) for tag, attrs in [
+    ('div', {'class': 'Nx9bqj CxhGGd'}),
+    ('div', {'class': '_30jeq3 _16Jk6d'}),
+    ('div', {'class': '_30jeq3'}),
+    ('div', {'class': '_25b18c'}),
+    ('div', {'class': 'CEmiEU'}),
+    ('div', {'class': 'hl05eU'}),
+    ('div', {'class': '_16Jk6d'}),
+]]
+FLIPKART_PRICE_CLASS_DIV = FLIPKART_PLAN.add('div', {'class': re.compile(r'Nx9bqj|_30jeq3|_25b18c|hl05eU|_16Jk6d')})
+FLIPKART_DIV = FLIPKART_PLAN.add('div')
+FLIPKART_META_PRICE = FLIPKART_PLAN.add('meta', {'property': 'product:price:amount'}, first_only=True)
+
+FLIPKART_ORIGINAL_PRICE_SELECTORS = [FLIPKART_PLAN.add(tag, attrs, first_only=True) for tag, attrs in [
+    ('div', {'class': 'yRaY8j A6+E6v'}),
+    ('div', {'class': '_3I9_wc _2p6lqe'}),
+    ('div', {'class': '_3I9_wc'}),
+]]
+
+FLIPKART_IMAGE_SELECTORS = [FLIPKART_PLAN.add(tag, attrs, first_only=True) for tag, attrs in [
+    ('img', {'class': 'DByuf4 IZexXJ jLEJ7H'}),
+    ('img', {'class': '_396cs4'}),
+    ('img', {'class': '_2r_T1I'}),
+    ('img', {'class': 'q6DClP'}),
+    ('img', {'class': '_53J4C-'}),
+]]
+FLIPKART_IMAGE_CONTAINER = FLIPKART_PLAN.add('div', {'class': re.compile(r'_3kidJX|_2SmCp5')})
+FLIPKART_CONTAINER_IMG = FLIPKART_PLAN.add('img', within=FLIPKART_IMAGE_CONTAINER, first_only=True)
+FLIPKART_IMG = FLIPKART_PLAN.add('img')
+
 
 class ProductScraper:
-    def __init__(self):
+    def __init__(self, rate_limiter=None, parser=None, response_cache=None, page_capture=None, selector_stats=None):
         self.user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -14,6 +149,28 @@ class ProductScraper:
             'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         ]
         self.session = requests.Session()
+        # Paces every request per host and adapts to throttling; shared by all
+        # threads and coroutines using this scraper.
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        # Recently fetched pages, shared by every caller of this scraper
+        self.response_cache = response_cache or ResponseCache()
+        # Opt-in store of failed or sampled pages (SCRAPER_CAPTURE_DIR)
+        self.page_capture = page_capture or PageCapture()
+        # Which title/price selectors currently work on each site (SCRAPER_SELECTOR_STATS_FILE)
+        self.selector_stats = selector_stats or SelectorStats()
+        # HTML parser backend name, see html_parsers.py (SCRAPER_HTML_PARSER)
+        self.parser_backend = resolve_backend(parser)
+        # The session is shared by the refresh worker pools, so size the
+        # connection pool to match instead of the requests default of 10.
+        pool_size = int(os.environ.get('SCRAPER_POOL_SIZE', 16))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # Shared aiohttp session for the async API, created lazily on first use
+        self.async_max_connections = int(os.environ.get('SCRAPER_ASYNC_MAX_CONNECTIONS', 200))
+        self._async_session = None
+        self._async_loop = None
     
     def get_headers(self):
         return {
@@ -26,6 +183,9 @@ class ProductScraper:
             'Cache-Control': 'max-age=0',
         }
     
+    def make_soup(self, html):
+        return make_soup(html, self.parser_backend)
+    
     def normalize_url(self, url):
         if not url:
             return None
@@ -62,7 +222,205 @@ class ProductScraper:
                 pass
         return None
     
+    # Every scraping flow below is written once as a generator that yields
+    # _Fetch steps and returns its result. The public methods only pick a
+    # driver: _run for the blocking requests session, _arun for asyncio.
+    
     def scrape_amazon(self, url):
+        return self._run(self._scrape_amazon_steps(url))
+    
+    def scrape_flipkart(self, url):
+        return self._run(self._scrape_flipkart_steps(url))
+    
+    def search_flipkart_for_product(self, product_name):
+        return self._run(self._search_flipkart_for_product_steps(product_name))
+    
+    def search_amazon_for_product(self, product_name):
+        return self._run(self._search_amazon_for_product_steps(product_name))
+    
+    def search_flipkart_products(self, product_name, max_results=24):
+        return self._run(self._search_flipkart_products_steps(product_name, max_results))
+    
+    def search_amazon_products(self, product_name, max_results=24):
+        return self._run(self._search_amazon_products_steps(product_name, max_results))
+    
+    async def ascrape_amazon(self, url):
+        return await self._arun(self._scrape_amazon_steps(url))
+    
+    async def ascrape_flipkart(self, url):
+        return await self._arun(self._scrape_flipkart_steps(url))
+    
+    async def ascrape_product(self, url):
+        url = self.normalize_url(url)
+        platform = self.identify_platform(url)
+        if platform == 'amazon':
+            return await self.ascrape_amazon(url), platform
+        elif platform == 'flipkart':
+            return await self.ascrape_flipkart(url), platform
+        return None, None
+    
+    async def asearch_flipkart_products(self, product_name, max_results=24):
+        return await self._arun(self._search_flipkart_products_steps(product_name, max_results))
+    
+    async def asearch_amazon_products(self, product_name, max_results=24):
+        return await self._arun(self._search_amazon_products_steps(product_name, max_results))
+    
+    def _run(self, steps):
+        """Drive a scraping flow with the blocking requests session."""
+        value, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error else steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            value, error = None, None
+            try:
+                entry, fresh = self.response_cache.lookup(step.url)
+                if fresh:
+                    metrics.CACHED_FETCHES.inc(platform=metrics.platform_for_host(self._rate_limit_host(step.url)))
+                    value = FetchResponse(200, entry.text, entry.url)
+                else:
+                    host = self._rate_limit_host(step.url)
+                    self.rate_limiter.acquire(host)
+                    started = time.perf_counter()
+                    try:
+                        response = self.session.get(step.url, headers=self._request_headers(step, entry),
+                                                    timeout=step.timeout, allow_redirects=step.allow_redirects)
+                    except Exception:
+                        self._record_fetch_error(host, time.perf_counter() - started)
+                        raise
+                    self._record_response(host, response.status_code, response.text,
+                                          time.perf_counter() - started, len(response.content))
+                    if step.raise_for_status:
+                        response.raise_for_status()
+                    value = self._cache_response(step, entry, response.status_code, response.text,
+                                                 response.headers, response.url)
+            except Exception as e:
+                error = e
+    
+    async def _arun(self, steps):
+        """Drive a scraping flow on the running event loop with the shared aiohttp session."""
+        session = await self._get_async_session()
+        value, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error else steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            value, error = None, None
+            try:
+                entry, fresh = self.response_cache.lookup(step.url)
+                if fresh:
+                    metrics.CACHED_FETCHES.inc(platform=metrics.platform_for_host(self._rate_limit_host(step.url)))
+                    value = FetchResponse(200, entry.text, entry.url)
+                else:
+                    value = await self._afetch(session, step, entry)
+            except Exception as e:
+                error = e
+    
+    def _request_headers(self, step, cached):
+        """Headers for a fetch, made conditional when a stale cached copy can be revalidated."""
+        if cached is None:
+            return step.headers
+        headers = dict(step.headers)
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+        return headers
+    
+    def _cache_response(self, step, cached, status_code, text, response_headers, final_url):
+        """Update the response cache from a fetch and return what the flow should see."""
+        if status_code == 304 and cached is not None:
+            self.response_cache.revalidated(cached)
+            return FetchResponse(200, cached.text, cached.url)
+        # Never cache block pages, or every caller would get the CAPTCHA for the whole TTL
+        if status_code == 200 and not self._is_robot_check(text):
+            self.response_cache.store(step.url, text, response_headers.get('ETag'),
+                                      response_headers.get('Last-Modified'))
+        return FetchResponse(status_code, text, final_url)
+    
+    def _rate_limit_host(self, url):
+        return (urlparse(url).netloc or '').lower()
+    
+    def _is_robot_check(self, text):
+        return any(marker in text for marker in ROBOT_CHECK_MARKERS)
+    
+    def _record_response(self, host, status_code, text, elapsed, size):
+        """Feed a response back into the rate limiter for its host, and into the metrics."""
+        platform = metrics.platform_for_host(host)
+        metrics.FETCH_SECONDS.observe(elapsed, platform=platform, status=metrics.status_class(status_code))
+        metrics.FETCH_BYTES.inc(size, platform=platform)
+        robot_check = self._is_robot_check(text)
+        if robot_check:
+            metrics.CAPTCHAS.inc(platform=platform)
+        if status_code in THROTTLE_STATUS_CODES or robot_check:
+            self.rate_limiter.record_throttle(host)
+        elif status_code < 400:
+            self.rate_limiter.record_success(host)
+    
+    def _record_fetch_error(self, host, elapsed):
+        metrics.FETCH_SECONDS.observe(elapsed, platform=metrics.platform_for_host(host), status='error')
+    
+    async def _afetch(self, session, step, cached):
+        host = self._rate_limit_host(step.url)
+        delay = self.rate_limiter.reserve(host)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        timeout = aiohttp.ClientTimeout(total=step.timeout)
+        started = time.perf_counter()
+        try:
+            async with session.get(step.url, headers=self._request_headers(step, cached), timeout=timeout,
+                                   allow_redirects=step.allow_redirects) as response:
+                body = await response.read()
+                text = body.decode(response.get_encoding(), errors='replace')
+        except Exception:
+            self._record_fetch_error(host, time.perf_counter() - started)
+            raise
+        self._record_response(host, response.status, text, time.perf_counter() - started, len(body))
+        if step.raise_for_status:
+            response.raise_for_status()
+        return self._cache_response(step, cached, response.status, text,
+                                    response.headers, str(response.url))
+    
+    async def _get_async_session(self):
+        if aiohttp is None:
+            raise RuntimeError("The async scraper API requires aiohttp (pip install aiohttp)")
+        
+        loop = asyncio.get_running_loop()
+        session = self._async_session
+        if session is None or session.closed or self._async_loop is not loop:
+            old_session, old_loop = session, self._async_loop
+            # One connector for every coroutine on this loop, so all in-flight
+            # fetches share a single bounded connection pool.
+            connector = aiohttp.TCPConnector(limit=self.async_max_connections, ttl_dns_cache=300)
+            session = self._async_session = aiohttp.ClientSession(connector=connector)
+            self._async_loop = loop
+            await self._close_old_session(old_session, old_loop)
+        return session
+    
+    async def _close_old_session(self, session, loop):
+        """Close a session left behind by an earlier event loop."""
+        if session is None or session.closed:
+            return
+        if loop is not None and not loop.is_closed():
+            # Its sockets belong to that loop, so close it there, now if the
+            # loop runs in another thread or else when it next runs
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        # With its loop closed aiohttp can only mark the session closed; the
+        # sockets go when it is collected. aclose() before the loop ends
+        # closes them cleanly.
+        await session.close()
+    
+    async def aclose(self):
+        """Close the shared aiohttp session; call before the event loop shuts down."""
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
+        self._async_loop = None
+    
+    def _scrape_amazon_steps(self, url):
         url = self.normalize_url(url)
         result = {
             'name': None,
@@ -97,206 +455,35 @@ class ProductScraper:
                 'Sec-Ch-Ua-Platform': '"Windows"',
             })
             
-            # Add delay to avoid rate limiting
-            time.sleep(random.uniform(2, 4))
-            
-            response = self.session.get(url, headers=headers, timeout=30, allow_redirects=True)
-            response.raise_for_status()
+            # Requests are paced per host by self.rate_limiter in the fetch driver
+            response = yield _Fetch(url, headers)
             
             # Check if Amazon is showing a CAPTCHA or robot check
-            if 'api-services-support@amazon.com' in response.text or 'Robot Check' in response.text or 'Enter the characters you see below' in response.text:
+            if self._is_robot_check(response.text):
                 print("WARNING: Amazon is showing a CAPTCHA/Robot Check page")
-                # Try one more time with different headers
-                time.sleep(random.uniform(3, 6))
+                # Try one more time with different headers. The rate limiter has
+                # already backed off for this host, which delays the retry.
                 headers['User-Agent'] = random.choice(self.user_agents)
-                response = self.session.get(url, headers=headers, timeout=30, allow_redirects=True)
+                metrics.RETRIES.inc(platform='amazon', reason='captcha')
+                response = yield _Fetch(url, headers, raise_for_status=False)
                 
                 # Check again
-                if 'api-services-support@amazon.com' in response.text or 'Robot Check' in response.text:
+                if self._is_robot_check(response.text):
                     result['error'] = 'Amazon blocked the request. Please try again in a few minutes.'
+                    metrics.PAGES.inc(platform='amazon', outcome='blocked')
+                    self.page_capture.capture('amazon', url, response.text, result)
                     return result
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Debug: Save HTML to check structure
-            # Uncomment this to see what Amazon is actually returning
-            with open('debug_amazon.html', 'w', encoding='utf-8') as f:
-                f.write(response.text)
-            print(f"Saved Amazon response to debug_amazon.html (first 500 chars): {response.text[:500]}")
-            
-            # Try multiple title selectors with more variations
-            title_selectors = [
-                ('span', {'id': 'productTitle'}),
-                ('h1', {'id': 'title'}),
-                ('span', {'class': 'product-title-word-break'}),
-                ('h1', {'class': 'a-size-large'}),
-                ('span', {'class': 'a-size-large product-title-word-break'}),
-                ('div', {'id': 'titleSection'}),
-                ('div', {'id': 'title_feature_div'}),
-            ]
-            
-            for tag, attrs in title_selectors:
-                if result['name']:
-                    break
-                elems = soup.find_all(tag, attrs)
-                for elem in elems:
-                    name = elem.get_text().strip()
-                    if name and len(name) > 5 and len(name) < 500:
-                        result['name'] = name
-                        print(f"Found title using {tag} {attrs}: {name[:50]}...")
-                        break
-            
-            # If still no name, try finding any h1 or span with product-like text
-            if not result['name']:
-                h1_tags = soup.find_all('h1')
-                for h1 in h1_tags:
-                    text = h1.get_text().strip()
-                    if text and len(text) > 10 and len(text) < 300:
-                        result['name'] = text
-                        print(f"Found title from h1 tag: {text[:50]}...")
-                        break
-            
-            # Try meta tags as fallback
-            if not result['name']:
-                meta_title = soup.find('meta', {'name': 'title'})
-                if meta_title and meta_title.get('content'):
-                    result['name'] = meta_title['content'].strip()
-                    print(f"Found title from meta tag: {result['name'][:50]}...")
-                else:
-                    og_title = soup.find('meta', {'property': 'og:title'})
-                    if og_title and og_title.get('content'):
-                        result['name'] = og_title['content'].strip()
-                        print(f"Found title from og:title: {result['name'][:50]}...")
-            
-            # Enhanced price extraction with more selectors
-            price_found = False
-            
-            # Try to find price in structured data
-            price_divs = soup.find_all('div', {'id': re.compile(r'price', re.I)})
-            for div in price_divs:
-                if price_found:
-                    break
-                price_spans = div.find_all('span', class_=re.compile(r'a-price-whole|a-offscreen'))
-                for span in price_spans:
-                    price_text = span.get_text()
-                    extracted = self.extract_price(price_text)
-                    if extracted and extracted > 0:
-                        result['price'] = extracted
-                        price_found = True
-                        print(f"Found price from price div: ₹{extracted}")
-                        break
+            started = time.perf_counter()
+            soup = self.make_soup(response.text)
             
-            # Try common price selectors
-            if not price_found:
-                price_selectors = [
-                    ('span', {'class': 'a-price-whole'}),
-                    ('span', {'id': 'priceblock_ourprice'}),
-                    ('span', {'id': 'priceblock_dealprice'}),
-                    ('span', {'id': 'priceblock_saleprice'}),
-                    ('span', {'class': 'a-offscreen'}),
-                    ('span', {'class': 'a-price aok-align-center reinventPricePriceToPayMargin priceToPay'}),
-                    ('span', {'id': 'tp_price_block_total_price_ww'}),
-                    ('td', {'class': 'a-span12 a-color-price a-size-base'}),
-                ]
-                
-                for tag, attrs in price_selectors:
-                    if price_found:
-                        break
-                    elems = soup.find_all(tag, attrs)
-                    for elem in elems:
-                        price_text = elem.get_text()
-                        extracted = self.extract_price(price_text)
-                        if extracted and extracted > 0:
-                            result['price'] = extracted
-                            price_found = True
-                            print(f"Found price using {tag} {attrs}: ₹{extracted}")
-                            break
+            self.parse_amazon(soup, result)
+            metrics.PARSE_SECONDS.observe(time.perf_counter() - started, platform='amazon')
+            metrics.PAGES.inc(platform='amazon', outcome='success' if result['success'] else 'failed')
+            # Failed (or sampled) pages go to SCRAPER_CAPTURE_DIR, when set
+            self.page_capture.capture('amazon', url, response.text, result)
             
-            # Try all a-price spans as fallback
-            if not price_found:
-                all_price_spans = soup.find_all('span', class_=re.compile(r'a-price'))
-                for span in all_price_spans:
-                    whole = span.find('span', class_='a-price-whole')
-                    if whole:
-                        extracted = self.extract_price(whole.get_text())
-                        if extracted and extracted > 0:
-                            result['price'] = extracted
-                            price_found = True
-                            print(f"Found price from a-price span: ₹{extracted}")
-                            break
-            
-            # Try finding price in any span with currency symbol
-            if not price_found:
-                all_spans = soup.find_all('span')
-                for span in all_spans:
-                    text = span.get_text()
-                    if '₹' in text or 'Rs' in text:
-                        extracted = self.extract_price(text)
-                        if extracted and extracted > 10:  # Sanity check for reasonable price
-                            result['price'] = extracted
-                            price_found = True
-                            print(f"Found price from span with currency: ₹{extracted}")
-                            break
-            
-            # Original price
-            orig_price_elems = soup.find_all('span', {'class': re.compile(r'a-text-price')})
-            for elem in orig_price_elems:
-                orig_span = elem.find('span', {'class': 'a-offscreen'})
-                if orig_span:
-                    extracted = self.extract_price(orig_span.get_text())
-                    if extracted and extracted > 0:
-                        result['original_price'] = extracted
-                        break
-            
-            # Image extraction with more methods
-            img_selectors = [
-                ('img', {'id': 'landingImage'}),
-                ('img', {'id': 'imgBlkFront'}),
-                ('img', {'id': 'ebooksImgBlkFront'}),
-                ('img', {'class': re.compile(r'a-dynamic-image')}),
-                ('div', {'id': 'imgTagWrapperId'}),
-                ('div', {'id': 'main-image-container'}),
-            ]
-            
-            for tag, attrs in img_selectors:
-                if result['image']:
-                    break
-                elem = soup.find(tag, attrs)
-                if elem:
-                    # Check if it's an img tag
-                    if elem.name == 'img':
-                        if elem.get('data-old-hires'):
-                            result['image'] = elem['data-old-hires']
-                        elif elem.get('data-a-dynamic-image'):
-                            # Parse JSON to get first image URL
-                            try:
-                                import json
-                                img_data = json.loads(elem.get('data-a-dynamic-image'))
-                                if img_data:
-                                    result['image'] = list(img_data.keys())[0]
-                            except:
-                                pass
-                        elif elem.get('src'):
-                            src = elem['src']
-                            if 'images-amazon' in src or 'ssl-images-amazon' in src:
-                                result['image'] = src
-                    # Check if it's a div containing img
-                    elif elem.name == 'div':
-                        img = elem.find('img')
-                        if img:
-                            if img.get('data-old-hires'):
-                                result['image'] = img['data-old-hires']
-                            elif img.get('src'):
-                                result['image'] = img['src']
-            
-            # Try meta og:image as fallback
-            if not result['image']:
-                og_image = soup.find('meta', {'property': 'og:image'})
-                if og_image and og_image.get('content'):
-                    result['image'] = og_image['content']
-            
-            if result['name'] and result['price']:
-                result['success'] = True
+            if result['success']:
                 print(f"Successfully scraped Amazon: {result['name'][:50]}... - ₹{result['price']}")
             else:
                 print(f"Failed to scrape Amazon - Name: {bool(result['name'])}, Price: {bool(result['price'])}")
@@ -306,6 +493,7 @@ class ProductScraper:
                     print("  Could not find product price")
                     
         except Exception as e:
+            metrics.PAGES.inc(platform='amazon', outcome='error')
             print(f"Amazon scraping error: {e}")
             import traceback
             traceback.print_exc()
@@ -313,7 +501,7 @@ class ProductScraper:
         
         return result
     
-    def scrape_flipkart(self, url):
+    def _scrape_flipkart_steps(self, url):
         url = self.normalize_url(url)
         result = {
             'name': None,
@@ -336,150 +524,17 @@ class ProductScraper:
             host = parsed.netloc or 'www.flipkart.com'
             headers['Host'] = host
             
-            response = self.session.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
+            response = yield _Fetch(url, headers)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            started = time.perf_counter()
+            soup = self.make_soup(response.text)
             
-            # Enhanced title extraction
-            title_selectors = [
-                ('span', {'class': 'VU-ZEz'}),
-                ('span', {'class': 'B_NuCI'}),
-                ('h1', {'class': 'yhB1nd'}),
-                ('span', {'class': '_35KyD6'}),
-                ('h1', {'class': '_6EBuvT'}),
-            ]
+            self.parse_flipkart(soup, result)
+            metrics.PARSE_SECONDS.observe(time.perf_counter() - started, platform='flipkart')
+            metrics.PAGES.inc(platform='flipkart', outcome='success' if result['success'] else 'failed')
+            self.page_capture.capture('flipkart', url, response.text, result)
             
-            for tag, attrs in title_selectors:
-                if result['name']:
-                    break
-                elem = soup.find(tag, attrs)
-                if elem:
-                    name = elem.get_text().strip()
-                    if name and len(name) > 5:
-                        result['name'] = name
-                        break
-            
-            if not result['name']:
-                h1_tags = soup.find_all('h1')
-                for h1 in h1_tags:
-                    text = h1.get_text().strip()
-                    if text and len(text) > 10 and len(text) < 300:
-                        result['name'] = text
-                        break
-            
-            # Enhanced price extraction with more selectors
-            price_selectors = [
-                ('div', {'class': 'Nx9bqj CxhGGd'}),
-                ('div', {'class': '_30jeq3 _16Jk6d'}),
-                ('div', {'class': '_30jeq3'}),
-                ('div', {'class': '_25b18c'}),
-                ('div', {'class': 'CEmiEU'}),
-                ('div', {'class': 'hl05eU'}),
-                ('div', {'class': '_16Jk6d'}),
-            ]
-            
-            for tag, attrs in price_selectors:
-                if result['price']:
-                    break
-                elem = soup.find(tag, attrs)
-                if elem:
-                    extracted = self.extract_price(elem.get_text())
-                    if extracted and extracted > 0:
-                        result['price'] = extracted
-                        print(f"Found Flipkart price using {tag} {attrs}: ₹{extracted}")
-                        break
-            
-            # Try finding divs with common price class patterns
-            if not result['price']:
-                price_divs = soup.find_all('div', class_=re.compile(r'Nx9bqj|_30jeq3|_25b18c|hl05eU|_16Jk6d'))
-                for div in price_divs:
-                    extracted = self.extract_price(div.get_text())
-                    if extracted and extracted > 0:
-                        result['price'] = extracted
-                        print(f"Found Flipkart price from regex match: ₹{extracted}")
-                        break
-            
-            # Try all divs containing rupee symbol (but be more selective)
-            if not result['price']:
-                all_divs = soup.find_all('div')
-                for div in all_divs:
-                    # Get only the direct text of this div, not nested children
-                    text = ''.join(div.find_all(text=True, recursive=False))
-                    if '₹' in text:
-                        # Skip if it's a very long text (likely not just price)
-                        if len(text.strip()) < 30:
-                            extracted = self.extract_price(text)
-                            if extracted and extracted > 10:  # Sanity check
-                                result['price'] = extracted
-                                print(f"Found Flipkart price from div with ₹: ₹{extracted}")
-                                break
-            
-            # Last resort: check meta tags
-            if not result['price']:
-                og_price = soup.find('meta', {'property': 'product:price:amount'})
-                if og_price and og_price.get('content'):
-                    extracted = self.extract_price(og_price['content'])
-                    if extracted and extracted > 0:
-                        result['price'] = extracted
-                        print(f"Found Flipkart price from meta tag: ₹{extracted}")
-            
-            # Original price
-            orig_price_selectors = [
-                ('div', {'class': 'yRaY8j A6+E6v'}),
-                ('div', {'class': '_3I9_wc _2p6lqe'}),
-                ('div', {'class': '_3I9_wc'}),
-            ]
-            
-            for tag, attrs in orig_price_selectors:
-                if result['original_price']:
-                    break
-                elem = soup.find(tag, attrs)
-                if elem:
-                    extracted = self.extract_price(elem.get_text())
-                    if extracted and extracted > 0:
-                        result['original_price'] = extracted
-                        break
-            
-            # Enhanced image extraction
-            img_selectors = [
-                ('img', {'class': 'DByuf4 IZexXJ jLEJ7H'}),
-                ('img', {'class': '_396cs4'}),
-                ('img', {'class': '_2r_T1I'}),
-                ('img', {'class': 'q6DClP'}),
-                ('img', {'class': '_53J4C-'}),
-            ]
-            
-            for tag, attrs in img_selectors:
-                if result['image']:
-                    break
-                elem = soup.find(tag, attrs)
-                if elem and elem.get('src'):
-                    src = elem['src']
-                    if 'rukminim' in src or 'static-assets' in src:
-                        result['image'] = src
-                        break
-            
-            if not result['image']:
-                img_containers = soup.find_all('div', class_=re.compile(r'_3kidJX|_2SmCp5'))
-                for container in img_containers:
-                    img = container.find('img')
-                    if img and img.get('src'):
-                        src = img['src']
-                        if 'rukminim' in src or 'static-assets' in src:
-                            result['image'] = src
-                            break
-            
-            if not result['image']:
-                all_imgs = soup.find_all('img')
-                for img in all_imgs:
-                    src = img.get('src', '')
-                    if 'rukminim' in src or 'static-assets' in src:
-                        result['image'] = src
-                        break
-            
-            if result['name'] and result['price']:
-                result['success'] = True
+            if result['success']:
                 print(f"Successfully scraped Flipkart: {result['name'][:50]}... - ₹{result['price']}")
             else:
                 print(f"Failed to scrape Flipkart - Name: {bool(result['name'])}, Price: {bool(result['price'])}")
@@ -489,6 +544,7 @@ class ProductScraper:
                     print("  Could not find product price")
                     
         except Exception as e:
+            metrics.PAGES.inc(platform='flipkart', outcome='error')
             print(f"Flipkart scraping error: {e}")
             import traceback
             traceback.print_exc()
@@ -496,6 +552,329 @@ class ProductScraper:
         
         return result
     
+    def selector_domain(self, url, platform):
+        """Key for selector stats: the page's host without 'www.', or the platform when unknown."""
+        host = (urlparse(url).netloc if url else '').lower()
+        return host[4:] if host.startswith('www.') else host or platform
+    
+    def parse_amazon(self, soup, result):
+        """Fill ``result`` with the title, prices and image found in an Amazon product page.
+
+        All candidates are gathered in one traversal by ``AMAZON_PLAN``; the
+        fallbacks below are then tried in the same priority order as before.
+        """
+        found = AMAZON_PLAN.collect(soup)
+        title_tier = price_tier = None
+        domain = self.selector_domain(result.get('url'), 'amazon')
+        
+        # Try multiple title selectors, skipping ahead of the ones that keep missing on this site
+        order = self.selector_stats.ordered(domain, 'title', AMAZON_TITLE_SELECTORS)
+        winner = None
+        for selector in order:
+            if result['name']:
+                break
+            for elem in found[selector]:
+                name = elem.get_text().strip()
+                if name and len(name) > 5 and len(name) < 500:
+                    result['name'] = name
+                    title_tier = 'selector_list'
+                    winner = selector
+                    print(f"Found title using {selector}: {name[:50]}...")
+                    break
+        self.selector_stats.record(domain, 'title', order, winner)
+        
+        # If still no name, try finding any h1 or span with product-like text
+        if not result['name']:
+            for h1 in found[AMAZON_H1]:
+                text = h1.get_text().strip()
+                if text and len(text) > 10 and len(text) < 300:
+                    result['name'] = text
+                    title_tier = 'h1_scan'
+                    print(f"Found title from h1 tag: {text[:50]}...")
+                    break
+        
+        # Try meta tags as fallback
+        if not result['name']:
+            meta_title = found.first(AMAZON_META_TITLE)
+            if meta_title and meta_title.get('content'):
+                result['name'] = meta_title['content'].strip()
+                title_tier = 'meta'
+                print(f"Found title from meta tag: {result['name'][:50]}...")
+            else:
+                og_title = found.first(AMAZON_OG_TITLE)
+                if og_title and og_title.get('content'):
+                    result['name'] = og_title['content'].strip()
+                    title_tier = 'meta'
+                    print(f"Found title from og:title: {result['name'][:50]}...")
+        
+        # Enhanced price extraction with more selectors
+        price_found = False
+        
+        # Try to find price in structured data
+        for div, price_spans in found.within(AMAZON_PRICE_DIV_SPAN):
+            if price_found:
+                break
+            for span in price_spans:
+                price_text = span.get_text()
+                extracted = self.extract_price(price_text)
+                if extracted and extracted > 0:
+                    result['price'] = extracted
+                    price_found = True
+                    price_tier = 'price_div'
+                    print(f"Found price from price div: ₹{extracted}")
+                    break
+        
+        # Try common price selectors
+        if not price_found:
+            order = self.selector_stats.ordered(domain, 'price', AMAZON_PRICE_SELECTORS)
+            winner = None
+            for selector in order:
+                if price_found:
+                    break
+                for elem in found[selector]:
+                    price_text = elem.get_text()
+                    extracted = self.extract_price(price_text)
+                    if extracted and extracted > 0:
+                        result['price'] = extracted
+                        price_found = True
+                        price_tier = 'selector_list'
+                        winner = selector
+                        print(f"Found price using {selector}: ₹{extracted}")
+                        break
+            self.selector_stats.record(domain, 'price', order, winner)
+        
+        # Try all a-price spans as fallback
+        if not price_found:
+            for span, (whole,) in found.within(AMAZON_A_PRICE_WHOLE):
+                extracted = self.extract_price(whole.get_text())
+                if extracted and extracted > 0:
+                    result['price'] = extracted
+                    price_found = True
+                    price_tier = 'a_price'
+                    print(f"Found price from a-price span: ₹{extracted}")
+                    break
+        
+        # Try finding price in any span with currency symbol
+        if not price_found:
+            for span in found[AMAZON_SPAN]:
+                text = span.get_text()
+                if '₹' in text or 'Rs' in text:
+                    extracted = self.extract_price(text)
+                    if extracted and extracted > 10:  # Sanity check for reasonable price
+                        result['price'] = extracted
+                        price_found = True
+                        price_tier = 'span_scan'
+                        print(f"Found price from span with currency: ₹{extracted}")
+                        break
+        
+        # Original price
+        for elem, (orig_span,) in found.within(AMAZON_TEXT_PRICE_OFFSCREEN):
+            extracted = self.extract_price(orig_span.get_text())
+            if extracted and extracted > 0:
+                result['original_price'] = extracted
+                break
+        
+        # Image extraction with more methods
+        for selector in AMAZON_IMAGE_SELECTORS:
+            if result['image']:
+                break
+            elem = found.first(selector)
+            if elem:
+                # Check if it's an img tag
+                if elem.name == 'img':
+                    if elem.get('data-old-hires'):
+                        result['image'] = elem['data-old-hires']
+                    elif elem.get('data-a-dynamic-image'):
+                        # Parse JSON to get first image URL
+                        try:
+                            img_data = json.loads(elem.get('data-a-dynamic-image'))
+                            if img_data:
+                                result['image'] = list(img_data.keys())[0]
+                        except:
+                            pass
+                    elif elem.get('src'):
+                        src = elem['src']
+                        if 'images-amazon' in src or 'ssl-images-amazon' in src:
+                            result['image'] = src
+                # Check if it's a div containing img
+                elif elem.name == 'div':
+                    img = elem.find('img')
+                    if img:
+                        if img.get('data-old-hires'):
+                            result['image'] = img['data-old-hires']
+                        elif img.get('src'):
+                            result['image'] = img['src']
+        
+        # Try meta og:image as fallback
+        if not result['image']:
+            og_image = found.first(AMAZON_OG_IMAGE)
+            if og_image and og_image.get('content'):
+                result['image'] = og_image['content']
+        
+        metrics.SELECTOR_TIERS.inc(platform='amazon', field='title', tier=title_tier or 'none')
+        metrics.SELECTOR_TIERS.inc(platform='amazon', field='price', tier=price_tier or 'none')
+        result['success'] = bool(result['name'] and result['price'])
+        return result
+    
+    def parse_flipkart(self, soup, result):
+        """Fill ``result`` with the title, prices and image found in a Flipkart product page.
+
+        All candidates are gathered in one traversal by ``FLIPKART_PLAN``; the
+        fallbacks below are then tried in the same priority order as before.
+        """
+        found = FLIPKART_PLAN.collect(soup)
+        title_tier = price_tier = None
+        domain = self.selector_domain(result.get('url'), 'flipkart')
+        
+        # Enhanced title extraction, skipping ahead of selectors that keep missing on this site
+        order = self.selector_stats.ordered(domain, 'title', FLIPKART_TITLE_SELECTORS)
+        winner = None
+        for selector in order:
+            if result['name']:
+                break
+            elem = found.first(selector)
+            if elem:
+                name = elem.get_text().strip()
+                if name and len(name) > 5:
+                    result['name'] = name
+                    title_tier = 'selector_list'
+                    winner = selector
+                    break
+        self.selector_stats.record(domain, 'title', order, winner)
+        
+        if not result['name']:
+            for h1 in found[FLIPKART_H1]:
+                text = h1.get_text().strip()
+                if text and len(text) > 10 and len(text) < 300:
+                    result['name'] = text
+                    title_tier = 'h1_scan'
+                    break
+        
+        # Enhanced price extraction with more selectors
+        order = self.selector_stats.ordered(domain, 'price', FLIPKART_PRICE_SELECTORS)
+        winner = None
+        for selector in order:
+            if result['price']:
+                break
+            elem = found.first(selector)
+            if elem:
+                extracted = self.extract_price(elem.get_text())
+                if extracted and extracted > 0:
+                    result['price'] = extracted
+                    price_tier = 'selector_list'
+                    winner = selector
+                    print(f"Found Flipkart price using {selector}: ₹{extracted}")
+                    break
+        self.selector_stats.record(domain, 'price', order, winner)
+        
+        # Try finding divs with common price class patterns
+        if not result['price']:
+            for div in found[FLIPKART_PRICE_CLASS_DIV]:
+                extracted = self.extract_price(div.get_text())
+                if extracted and extracted > 0:
+                    result['price'] = extracted
+                    price_tier = 'class_pattern'
+                    print(f"Found Flipkart price from regex match: ₹{extracted}")
+                    break
+        
+        # Try all divs containing rupee symbol (but be more selective)
+        if not result['price']:
+            for div in found[FLIPKART_DIV]:
+                # Get only the direct text of this div, not nested children
+                text = ''.join(div.find_all(text=True, recursive=False))
+                if '₹' in text:
+                    # Skip if it's a very long text (likely not just price)
+                    if len(text.strip()) < 30:
+                        extracted = self.extract_price(text)
+                        if extracted and extracted > 10:  # Sanity check
+                            result['price'] = extracted
+                            price_tier = 'div_scan'
+                            print(f"Found Flipkart price from div with ₹: ₹{extracted}")
+                            break
+        
+        # Last resort: check meta tags
+        if not result['price']:
+            og_price = found.first(FLIPKART_META_PRICE)
+            if og_price and og_price.get('content'):
+                extracted = self.extract_price(og_price['content'])
+                if extracted and extracted > 0:
+                    result['price'] = extracted
+                    price_tier = 'meta'
+                    print(f"Found Flipkart price from meta tag: ₹{extracted}")
+        
+        # Original price
+        for selector in FLIPKART_ORIGINAL_PRICE_SELECTORS:
+            if result['original_price']:
+                break
+            elem = found.first(selector)
+            if elem:
+                extracted = self.extract_price(elem.get_text())
+                if extracted and extracted > 0:
+                    result['original_price'] = extracted
+                    break
+        
+        # Enhanced image extraction
+        for selector in FLIPKART_IMAGE_SELECTORS:
+            if result['image']:
+                break
+            elem = found.first(selector)
+            if elem and elem.get('src'):
+                src = elem['src']
+                if 'rukminim' in src or 'static-assets' in src:
+                    result['image'] = src
+                    break
+        
+        if not result['image']:
+            for container, (img,) in found.within(FLIPKART_CONTAINER_IMG):
+                if img.get('src'):
+                    src = img['src']
+                    if 'rukminim' in src or 'static-assets' in src:
+                        result['image'] = src
+                        break
+        
+        if not result['image']:
+            for img in found[FLIPKART_IMG]:
+                src = img.get('src', '')
+                if 'rukminim' in src or 'static-assets' in src:
+                    result['image'] = src
+                    break
+        
+        metrics.SELECTOR_TIERS.inc(platform='flipkart', field='title', tier=title_tier or 'none')
+        metrics.SELECTOR_TIERS.inc(platform='flipkart', field='price', tier=price_tier or 'none')
+        result['success'] = bool(result['name'] and result['price'])
+        return result
+    
+    def listing_key(self, url):
+        """Return a canonical key for the product page behind ``url``.
+
+        Amazon pages are keyed by ASIN and Flipkart pages by ``pid`` (or the
+        ``itm`` id in the path), so links that differ only in slug, tracking
+        parameters or host alias map to the same listing. URLs without an id,
+        such as short links, fall back to their normalized form.
+        """
+        url = self.normalize_url(url)
+        if not url:
+            return None
+        
+        platform = self.identify_platform(url)
+        parsed = urlparse(url)
+        
+        if platform == 'amazon':
+            match = ASIN_PATTERN.search(parsed.path)
+            if match:
+                return f"amazon:{match.group(1).upper()}"
+        elif platform == 'flipkart':
+            pid = parse_qs(parsed.query).get('pid')
+            if pid and pid[0]:
+                return f"flipkart:{pid[0].upper()}"
+            match = FLIPKART_ITEM_PATTERN.search(parsed.path)
+            if match:
+                return f"flipkart:{match.group(1).lower()}"
+        
+        # Hashed so the key stays short enough for a unique index on every database
+        digest = hashlib.sha1(cache_key(url).encode('utf-8')).hexdigest()
+        return f"{platform or 'url'}:url:{digest}"
+    
     def identify_platform(self, url):
         """Return 'amazon' or 'flipkart' based on the URL.
 
@@ -528,7 +907,7 @@ class ProductScraper:
             return self.scrape_flipkart(url), platform
         return None, None
     
-    def search_flipkart_for_product(self, product_name):
+    def _search_flipkart_for_product_steps(self, product_name):
         search_query = quote_plus(' '.join(product_name.split()[:5]))
         search_url = f"https://www.flipkart.com/search?q={search_query}"
         
@@ -538,10 +917,9 @@ class ProductScraper:
             headers = self.get_headers()
             headers['Host'] = 'www.flipkart.com'
             
-            response = self.session.get(search_url, headers=headers, timeout=30)
-            response.raise_for_status()
+            response = yield _Fetch(search_url, headers)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = self.make_soup(response.text)
             
             link_selectors = [
                 ('a', {'class': 'CGtC98'}),
@@ -574,7 +952,7 @@ class ProductScraper:
                 else:
                     product_url = href
                 print(f"Found Flipkart product: {product_url[:80]}...")
-                return self.scrape_flipkart(product_url)
+                return (yield from self._scrape_flipkart_steps(product_url))
             
             print("No matching product found on Flipkart")
                 
@@ -583,7 +961,7 @@ class ProductScraper:
         
         return None
     
-    def search_amazon_for_product(self, product_name):
+    def _search_amazon_for_product_steps(self, product_name):
         search_query = quote_plus(' '.join(product_name.split()[:5]))
         search_url = f"https://www.amazon.in/s?k={search_query}"
         
@@ -593,10 +971,9 @@ class ProductScraper:
             headers = self.get_headers()
             headers['Host'] = 'www.amazon.in'
             
-            response = self.session.get(search_url, headers=headers, timeout=30)
-            response.raise_for_status()
+            response = yield _Fetch(search_url, headers)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = self.make_soup(response.text)
             
             product_link = None
             all_links = soup.find_all('a', href=True)
@@ -613,7 +990,7 @@ class ProductScraper:
                 else:
                     product_url = href
                 print(f"Found Amazon product: {product_url[:80]}...")
-                return self.scrape_amazon(product_url)
+                return (yield from self._scrape_amazon_steps(product_url))
             
             print("No matching product found on Amazon")
                 
@@ -622,7 +999,7 @@ class ProductScraper:
         
         return None
 
-    def search_flipkart_products(self, product_name, max_results=24):
+    def _search_flipkart_products_steps(self, product_name, max_results=24):
         """Search Flipkart by name and return a list of lightweight product dicts.
 
         This parses the listing cards directly instead of re-scraping each product
@@ -637,9 +1014,8 @@ class ProductScraper:
             headers = self.get_headers()
             headers['Host'] = 'www.flipkart.com'
             
-            response = self.session.get(search_url, headers=headers, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            response = yield _Fetch(search_url, headers)
+            soup = self.make_soup(response.text)
             
             # Start from all anchors; we'll filter by URL pattern so it works across categories
             product_cards = soup.find_all('a', href=True)
@@ -706,7 +1082,7 @@ class ProductScraper:
         # Filter out completely empty entries
         return [r for r in results if r.get('success')]
 
-    def search_amazon_products(self, product_name, max_results=24):
+    def _search_amazon_products_steps(self, product_name, max_results=24):
         """Search Amazon by name and return a list of lightweight product dicts.
 
         Parses the search results listing instead of scraping each product page.
@@ -720,9 +1096,8 @@ class ProductScraper:
             headers = self.get_headers()
             headers['Host'] = 'www.amazon.in'
             
-            response = self.session.get(search_url, headers=headers, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            response = yield _Fetch(search_url, headers)
+            soup = self.make_soup(response.text)
             
             # Each search result is usually in a div.s-result-item
             cards = soup.find_all('div', {'data-component-type': 's-search-result'})
@@ -773,24 +1148,62 @@ class ProductScraper:
         return [r for r in results if r.get('success')]
 
 
+# Mock series vary each platform's price by up to this fraction around the current price
+MOCK_VARIATION = 0.15
+
+
+def mock_price_variations(product_id, days):
+    """Daily relative price variations for (amazon, flipkart), shape ``(2, days)``.
+
+    Seeded by ``product_id``, so a product always gets the same series.
+    """
+    rng = np.random.default_rng(product_id)
+    return rng.uniform(-MOCK_VARIATION, MOCK_VARIATION, size=(2, days))
+
+
+@lru_cache(maxsize=int(os.environ.get('MOCK_HISTORY_CACHE_SIZE', 1024)))
+def _mock_price_history(product_id, amazon_price, flipkart_price, days, end_date):
+    dates = np.arange(np.datetime64(end_date, 'D') - days, np.datetime64(end_date, 'D')).astype(str).tolist()
+    variations = mock_price_variations(product_id, days)
+    columns = []
+    for base, variation in ((amazon_price, variations[0]), (flipkart_price, variations[1])):
+        if base:
+            columns.append(np.round(base * (1 + variation), 2).tolist())
+        else:
+            columns.append([None] * days)
+    return tuple(
+        {'date': date, 'amazon_price': amazon, 'flipkart_price': flipkart}
+        for date, amazon, flipkart in zip(dates, *columns)
+    )
+
+
 def generate_mock_price_history(product_id, amazon_price, flipkart_price, days=90):
-    import random
-    from datetime import datetime, timedelta
-    
-    history = []
-    base_amazon = amazon_price if amazon_price else 0
-    base_flipkart = flipkart_price if flipkart_price else 0
-    
-    for i in range(days):
-        date = datetime.utcnow() - timedelta(days=days - i)
-        
-        amazon_variation = random.uniform(-0.15, 0.15)
-        flipkart_variation = random.uniform(-0.15, 0.15)
-        
-        history.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'amazon_price': round(base_amazon * (1 + amazon_variation), 2) if base_amazon else None,
-            'flipkart_price': round(base_flipkart * (1 + flipkart_variation), 2) if base_flipkart else None
-        })
-    
-    return history
+    """A deterministic illustrative series for the ``days`` days before today.
+
+    Results are memoized per product, price and day; treat them as read-only.
+    """
+    end_date = datetime.utcnow().date().isoformat()
+    return list(_mock_price_history(product_id, amazon_price, flipkart_price, days, end_date))
+
+
+def generate_mock_history_rows(products, days, end=None, samples_per_day=1):
+    """``PriceHistory`` rows for many products at once, e.g. for load-testing fixtures.
+
+    ``products`` is a sequence of ``(product_id, amazon_price, flipkart_price)``.
+    Returns a list of dicts ready for ``db.session.execute(PriceHistory.__table__.insert(), rows)``.
+    """
+    end = np.datetime64(end or datetime.utcnow(), 's')
+    count = days * samples_per_day
+    step = np.timedelta64(86400 // samples_per_day, 's')
+    times = (end - step * np.arange(count, 0, -1)).astype('datetime64[us]').tolist()
+
+    rows = []
+    for product_id, amazon_price, flipkart_price in products:
+        variations = mock_price_variations(product_id, count)
+        amazon = np.round(amazon_price * (1 + variations[0]), 2).tolist() if amazon_price else [None] * count
+        flipkart = np.round(flipkart_price * (1 + variations[1]), 2).tolist() if flipkart_price else [None] * count
+        rows.extend(
+            {'product_id': product_id, 'recorded_at': recorded_at, 'amazon_price': a, 'flipkart_price': f}
+            for recorded_at, a, f in zip(times, amazon, flipkart)
+        )
+    return rows
@@ -0,0 +1,231 @@
+"""
+Shared cache for product search results.
+
+Searches only use the first five words of the query (see the search flows in
+scraper.py), so queries are normalized to those words, lowercased, and every
+query that normalizes the same way shares one entry. Entries younger than
+SEARCH_CACHE_TTL are served as is. Entries up to SEARCH_CACHE_STALE_TTL
+seconds older than that are still served, but trigger a background refresh
+(stale-while-revalidate). Concurrent misses for one key share a single fetch.
+
+Entries live in process memory, or in Redis (or anything speaking its
+protocol) when SEARCH_CACHE_URL is set, so several app processes can share
+them.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    import redis
+except ImportError:  # redis is optional
+    redis = None
+
+QUERY_TOKENS = 5
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split()[:QUERY_TOKENS])
+
+
+class MemorySearchStore:
+    """In-process LRU store of ``(stored_at, results)`` pairs."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, stored_at, results, expire):
+        with self._lock:
+            self._entries[key] = (stored_at, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisSearchStore:
+    """Redis-backed store; a sorted set of access times bounds it to ``max_entries``.
+
+    Entries expire on their own, so a second sorted set scored by expiry time
+    lets expired keys be dropped from the index before it is counted.
+    """
+
+    def __init__(self, client, max_entries, prefix='search:'):
+        self.client = client
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.index = prefix + 'index'
+        self.expiry = prefix + 'expiry'
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self._forget([key])
+            return None
+        self.client.zadd(self.index, {key: time.time()})
+        data = json.loads(raw)
+        return data['stored_at'], data['results']
+
+    def set(self, key, stored_at, results, expire):
+        now = time.time()
+        expire = max(1, int(expire))
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps({'stored_at': stored_at, 'results': results}), ex=expire)
+        pipe.zadd(self.index, {key: now})
+        pipe.zadd(self.expiry, {key: now + expire})
+        pipe.execute()
+
+        overflow = self._live_count(now) - self.max_entries
+        if overflow > 0:
+            evicted = [k.decode() if isinstance(k, bytes) else k
+                       for k, _ in self.client.zpopmin(self.index, overflow)]
+            if evicted:
+                self.client.delete(*[self.prefix + k for k in evicted])
+                self.client.zrem(self.expiry, *evicted)
+
+    def _forget(self, keys):
+        pipe = self.client.pipeline()
+        pipe.zrem(self.index, *keys)
+        pipe.zrem(self.expiry, *keys)
+        pipe.execute()
+
+    def _live_count(self, now):
+        """Drop expired keys from the index, then count the rest."""
+        expired = self.client.zrangebyscore(self.expiry, '-inf', now)
+        if expired:
+            self._forget([k.decode() if isinstance(k, bytes) else k for k in expired])
+        return self.client.zcard(self.index)
+
+    def __len__(self):
+        return self._live_count(time.time())
+
+
+class SearchCache:
+    def __init__(self, ttl=None, stale_ttl=None, max_entries=None, url=None, client=None):
+        self.ttl = ttl if ttl is not None else float(os.environ.get('SEARCH_CACHE_TTL', 900))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.environ.get('SEARCH_CACHE_STALE_TTL', 3600))
+        max_entries = max_entries or int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 1000))
+        url = url or os.environ.get('SEARCH_CACHE_URL')
+
+        if client is None and url:
+            if redis is None:
+                print("SEARCH_CACHE_URL is set but the redis package is not installed, using an in-process cache")
+            else:
+                client = redis.Redis.from_url(url)
+        self.store = RedisSearchStore(client, max_entries) if client is not None else MemorySearchStore(max_entries)
+
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='search-refresh')
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, platform, query, max_results, search):
+        """Return results for ``query``, calling ``search(normalized_query, max_results)`` on a miss."""
+        if not self.enabled:
+            return search(query, max_results)
+
+        normalized = normalize_query(query)
+        key = f"{platform}:{max_results}:{normalized}"
+        try:
+            entry = self.store.get(key)
+        except Exception as e:
+            print(f"Search cache read failed: {e}")
+            self._count('errors')
+            entry = None
+
+        if entry is not None:
+            stored_at, results = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._count('hits')
+                return results
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._fetch(key, normalized, max_results, search, background=True)
+                return results
+
+        self._count('misses')
+        return self._fetch(key, normalized, max_results, search).result()
+
+    def _fetch(self, key, query, max_results, search, background=False):
+        """Start (or join) the one fetch for ``key``; returns its Future."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._inflight[key] = future
+
+        def run():
+            try:
+                results = search(query, max_results)
+            except Exception as e:
+                print(f"Search failed for '{query}': {e}")
+                self._count('errors')
+                self._finish(key)
+                future.set_exception(e)
+                return
+
+            # An empty list is usually a blocked or failed search; don't pin it
+            if results:
+                try:
+                    self.store.set(key, time.time(), results, self.ttl + self.stale_ttl)
+                except Exception as e:
+                    print(f"Search cache write failed: {e}")
+                    self._count('errors')
+            self._finish(key)
+            future.set_result(results)
+
+        if background:
+            self._count('refreshes')
+            self._refresher.submit(run)
+        else:
+            run()
+        return future
+
+    def _finish(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'errors': self.errors,
+                'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            }
+        try:
+            stats['entries'] = len(self.store)
+        except Exception:
+            stats['entries'] = None
+        return stats
@@ -0,0 +1,29 @@
+from models import db, TrackedProduct, PriceHistory
+from batch_writer import PriceWriter
+
+
+def test_flush_skips_product_deleted_after_buffering(make_product):
+    kept = make_product('kept', amazon_price=100.0)
+    deleted = make_product('deleted', amazon_price=100.0)
+    kept_id, deleted_id = kept.id, deleted.id
+
+    writer = PriceWriter()
+    for product_id in (kept_id, deleted_id):
+        writer.update_product(product_id, amazon_price=90.0)
+        writer.add_history(product_id, 90.0, None)
+
+    db.session.delete(deleted)
+    db.session.commit()
+
+    assert writer.flush() == 2
+    assert writer.pending == 0
+    assert db.session.get(TrackedProduct, kept_id).amazon_price == 90.0
+    assert PriceHistory.query.filter_by(product_id=kept_id).count() == 1
+    assert PriceHistory.query.filter_by(product_id=deleted_id).count() == 0
+
+    # Later flushes are not held up by the deleted product
+    writer.update_product(kept_id, amazon_price=80.0)
+    writer.add_history(kept_id, 80.0, None)
+    assert writer.flush() == 2
+    assert db.session.get(TrackedProduct, kept_id).amazon_price == 80.0
+    assert PriceHistory.query.filter_by(product_id=kept_id).count() == 2
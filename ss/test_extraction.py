@@ -0,0 +1,25 @@
+from extraction import SelectorStats, Selector
+
+PREFERRED = Selector('span', {'id': 'price'})
+LOOSE = Selector('span', {'class': 'a-offscreen'})
+SELECTORS = [PREFERRED, LOOSE]
+
+
+def test_one_odd_page_keeps_the_default_order():
+    stats = SelectorStats('', probe_every=1000)
+    stats.record('amazon.in', 'price', SELECTORS, LOOSE)
+    assert stats.ordered('amazon.in', 'price', SELECTORS) == SELECTORS
+
+
+def test_selector_that_keeps_missing_is_tried_last_until_it_hits_again():
+    stats = SelectorStats('', probe_every=5)
+    for _ in range(4):
+        stats.record('amazon.in', 'price', SELECTORS, LOOSE)
+    assert stats.ordered('amazon.in', 'price', SELECTORS) == [LOOSE, PREFERRED]
+    assert stats.ordered('flipkart.com', 'price', SELECTORS) == SELECTORS
+
+    # Every probe_every-th page walks the default order; a hit there restores it
+    orders = [stats.ordered('amazon.in', 'price', SELECTORS) for _ in range(4)]
+    assert orders[-1] == SELECTORS
+    stats.record('amazon.in', 'price', orders[-1], PREFERRED)
+    assert stats.ordered('amazon.in', 'price', SELECTORS) == SELECTORS
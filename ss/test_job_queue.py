@@ -0,0 +1,26 @@
+from models import db, ScrapeJob
+from job_queue import SqlJobQueue
+
+
+def listing_jobs(*keys):
+    return [{'listing_key': key, 'platform': 'amazon', 'url': f'https://www.amazon.in/dp/{key}',
+             'product_ids': [1]} for key in keys]
+
+
+def test_enqueue_keeps_one_unfinished_job_per_listing(app):
+    queue = SqlJobQueue(max_attempts=1)
+    assert queue.enqueue(listing_jobs('A1', 'B2')) == 2
+    assert queue.enqueue(listing_jobs('A1', 'B2', 'C3')) == 1
+    assert ScrapeJob.query.count() == 3
+
+    # Leased jobs still block a duplicate; finished ones don't
+    jobs = {job.listing_key: job for job in queue.lease('test', 10)}
+    assert queue.enqueue(listing_jobs('A1')) == 0
+    assert queue.complete(jobs['A1'])
+    assert queue.fail(jobs['B2'], 'timeout') == 'dead'
+    assert queue.enqueue(listing_jobs('A1')) == 1
+
+    # A dead job is not requeued beside a fresh one
+    assert queue.enqueue(listing_jobs('B2')) == 1
+    assert queue.requeue_dead() == 0
+    assert ScrapeJob.query.filter(ScrapeJob.unfinished_key.isnot(None)).count() == 3
@@ -0,0 +1,87 @@
+import smtplib
+import socketserver
+import threading
+import pytest
+from mail_queue import EmailDeliveryQueue
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib; DATA fails with a 451 while ``fail_data`` is positive."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 stub ESMTP')
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                    body.append(data)
+                with server.lock:
+                    failing = server.fail_data > 0
+                    if failing:
+                        server.fail_data -= 1
+                    else:
+                        server.messages.append(b''.join(body))
+                self.reply('451 Try again later' if failing else '250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            elif command.startswith(('HELO', 'EHLO', 'MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Not implemented')
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StubSMTPHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.fail_data = 0
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_queue(server, **settings):
+    host, port = server.server_address
+    return EmailDeliveryQueue(lambda: smtplib.SMTP(host, port, timeout=5), **settings)
+
+
+def test_worker_reuses_its_connection(smtp_server):
+    delivery = make_queue(smtp_server, workers=1, retry_backoff=0.01)
+    for number in range(5):
+        delivery.enqueue('alerts@example.com', f'user{number}@example.com', f'Subject: {number}\r\n\r\nbody')
+    assert delivery.flush(timeout=10)
+    delivery.close(timeout=5)
+
+    assert len(smtp_server.messages) == 5
+    assert smtp_server.connections == 1
+    assert delivery.stats()['connections_opened'] == 1
+
+
+def test_failed_send_is_retried(smtp_server):
+    smtp_server.fail_data = 1
+    delivery = make_queue(smtp_server, workers=1, retry_backoff=0.01)
+    delivery.enqueue('alerts@example.com', 'user@example.com', 'Subject: retry\r\n\r\nbody')
+    assert delivery.flush(timeout=10)
+    delivery.close(timeout=5)
+
+    assert len(smtp_server.messages) == 1
+    stats = delivery.stats()
+    assert (stats['sent'], stats['failed'], stats['retried']) == (1, 0, 1)
+    # A 451 concerns the message, so the retry goes over the same connection
+    assert smtp_server.connections == 1
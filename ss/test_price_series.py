@@ -0,0 +1,32 @@
+from datetime import datetime
+from models import db, PriceRollup
+from price_series import record_prices, rebuild_rollups
+
+ROLLUP_FIELDS = ('resolution', 'bucket_start', 'samples', 'close_at', 'amazon_min', 'amazon_max',
+                 'amazon_close', 'flipkart_min', 'flipkart_max', 'flipkart_close')
+
+
+def rollups(product_id):
+    rows = PriceRollup.query.filter_by(product_id=product_id).order_by(
+        PriceRollup.resolution, PriceRollup.bucket_start)
+    return [tuple(getattr(row, field) for field in ROLLUP_FIELDS) for row in rows]
+
+
+def test_batches_into_the_same_bucket_merge_like_a_rebuild(make_product):
+    product = make_product('series')
+
+    # Separate writers touching the same hour and day buckets, out of order
+    record_prices([(product.id, 100.0, None, datetime(2024, 5, 1, 10, 20))])
+    db.session.commit()
+    record_prices([(product.id, 90.0, 120.0, datetime(2024, 5, 1, 10, 40)),
+                   (product.id, 110.0, None, datetime(2024, 5, 1, 11, 5))])
+    db.session.commit()
+    record_prices([(product.id, 80.0, 130.0, datetime(2024, 5, 1, 10, 10))])
+    db.session.commit()
+
+    merged = rollups(product.id)
+    rebuild_rollups(product.id)
+    db.session.commit()
+    assert merged == rollups(product.id)
+    day = [row for row in merged if row[0] == 'day'][0]
+    assert day[2:] == (4, datetime(2024, 5, 1, 11, 5), 80.0, 110.0, 110.0, 120.0, 130.0, None)
@@ -0,0 +1,91 @@
+import time
+from search_cache import RedisSearchStore
+
+
+class StubRedis:
+    """The few Redis commands RedisSearchStore uses, with expiry on ``time.time()``."""
+
+    def __init__(self):
+        self.values = {}
+        self.sorted_sets = {}
+
+    def get(self, name):
+        value, expires_at = self.values.get(name, (None, None))
+        if expires_at is not None and expires_at <= time.time():
+            del self.values[name]
+            return None
+        return value
+
+    def set(self, name, value, ex=None):
+        self.values[name] = (value.encode(), time.time() + ex if ex else None)
+
+    def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+
+    def zadd(self, name, mapping):
+        self.sorted_sets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, *members):
+        for member in members:
+            self.sorted_sets.get(name, {}).pop(member, None)
+
+    def zcard(self, name):
+        return len(self.sorted_sets.get(name, {}))
+
+    def zrangebyscore(self, name, low, high):
+        low = float(low)
+        return [member.encode() for member, score in sorted(self.sorted_sets.get(name, {}).items(),
+                                                              key=lambda item: item[1]) if low <= score <= high]
+
+    def zpopmin(self, name, count):
+        members = sorted(self.sorted_sets.get(name, {}).items(), key=lambda item: item[1])[:count]
+        for member, _ in members:
+            del self.sorted_sets[name][member]
+        return [(member.encode(), score) for member, score in members]
+
+    def pipeline(self):
+        return StubPipeline(self)
+
+
+class StubPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, command):
+        return lambda *args, **kwargs: self.commands.append((command, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, command)(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+def test_expired_entries_leave_the_index(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: clock[0])
+    client = StubRedis()
+    store = RedisSearchStore(client, max_entries=2)
+
+    store.set('old', 1000.0, ['a'], expire=10)
+    clock[0] += 5
+    store.set('new', 1005.0, ['b'], expire=100)
+    assert len(store) == 2
+
+    # A miss on an expired entry drops it from the index
+    clock[0] += 10
+    assert store.get('old') is None
+    assert client.zcard(store.index) == 1
+
+    # Expired entries don't count towards max_entries, so live ones aren't evicted for them
+    store.set('short', 1015.0, ['c'], expire=1)
+    clock[0] += 2
+    store.set('newest', 1017.0, ['d'], expire=100)
+    assert len(store) == 2
+    assert store.get('new') == (1005.0, ['b'])
+    clock[0] += 1
+    assert store.get('newest') == (1017.0, ['d'])
+
+    # Over the limit, the least recently read live entry goes
+    store.set('third', 1017.0, ['e'], expire=100)
+    assert store.get('new') is None
+    assert len(store) == 2
@@ -0,0 +1,61 @@
+"""
+Scrape worker: processes the listing refresh jobs queued by the web app.
+
+Usage:
+    python worker.py            # run until stopped (Ctrl-C / SIGTERM)
+    python worker.py --once     # process what is ready now, then exit
+    python worker.py --stats    # print the queue counters
+    python worker.py --requeue-dead
+
+Start as many workers as the sites tolerate, on any host that reaches the same
+database (DATABASE_URL) or JOB_QUEUE_URL. The web app must run with
+REFRESH_MODE=queue so its scheduler enqueues jobs instead of scraping itself.
+Each worker scrapes a leased batch with the usual per-platform pools
+(REFRESH_AMAZON_WORKERS / REFRESH_FLIPKART_WORKERS) and polls every
+JOB_POLL_SECONDS when the queue is empty. On SIGTERM it finishes its current
+batch before exiting.
+"""
+import os
+import signal
+import socket
+import sys
+import threading
+
+# Workers never run the refresh scheduler themselves
+os.environ['RUN_SCHEDULER'] = 'false'
+from app import app, job_queue, process_refresh_jobs
+
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 5))
+
+
+def main():
+    if '--stats' in sys.argv or '--requeue-dead' in sys.argv:
+        with app.app_context():
+            if '--requeue-dead' in sys.argv:
+                print(f"Requeued {job_queue.requeue_dead()} dead jobs")
+            for name, value in job_queue.stats().items():
+                print(f"{name:8} {value}")
+        return
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        print(f"Worker {worker} stopping after the current batch")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Worker {worker} started")
+    while not stopping.is_set():
+        if process_refresh_jobs(worker):
+            continue
+        if '--once' in sys.argv:
+            break
+        stopping.wait(JOB_POLL_SECONDS)
+    print(f"Worker {worker} stopped")
+
+
+if __name__ == '__main__':
+    main()